@@ -41,7 +41,7 @@ main() {
   fi
 
   warn "starting as $(id) in ${PWD}"
-  exec python3 etl/tools/merge.py -v "${VERBOSITY_LEVEL}"
+  exec python3 etl/tools/merge.py -v "${VERBOSITY_LEVEL}" -w "${NUM_WORKERS:-1}"
 }
 
 main "$@"; exit
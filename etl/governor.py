@@ -0,0 +1,222 @@
+"""Memory and thread budget of the transformations of a run"""
+
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Final, Generator, NamedTuple, Optional
+
+from sqlalchemy import text
+
+from .transform.base_operation import BaseOperation
+from .util.db import AbstractSession, get_dialect_name
+from .util.memory import get_memory_use, parse_memory_size
+
+logger = logging.getLogger("ETL.Core")
+
+# The share of the memory budget of an operation declaring no footprint
+DEFAULT_FOOTPRINT: Final[float] = 0.25
+
+SQL_DUCKDB_MEMORY: Final[str] = (
+    "SELECT COALESCE(SUM(memory_usage_bytes), 0) FROM duckdb_memory()"
+)
+
+
+class Allotment(NamedTuple):
+    """The memory (in bytes) and threads given to a running operation"""
+
+    memory: int
+    threads: int
+
+
+class MemoryPeak(NamedTuple):
+    """The highest memory use (in bytes) sampled while an operation ran"""
+
+    rss: int = 0
+    database: int = 0
+
+
+class ResourceGovernor:
+    """
+    Share a memory budget and a number of threads between the
+    transformations of a run.
+
+    Every operation declares the share of the budget it is expected to
+    need (its footprint). An operation is only started if its share fits
+    next to the operations already running, both as declared and as
+    measured, and it is given that share of the memory and threads.
+    An operation running on its own gets the whole budget.
+
+    While operations run, the memory of the process and of DuckDB is
+    sampled. The next operations are admitted on the measured use, and
+    the peak while every operation ran is logged.
+    """
+
+    def __init__(
+        self,
+        memory_budget: str,
+        threads: int,
+        sample_interval: float = 1.0,
+    ) -> None:
+        self.memory_budget = parse_memory_size(memory_budget)
+        self.threads = max(1, int(threads))
+        self.sample_interval = sample_interval
+        self.peaks: Dict[str, MemoryPeak] = {}
+        self._allotments: Dict[str, Allotment] = {}
+        self._usage = MemoryPeak()
+        self._lock = threading.Lock()
+
+    def footprint(self, operation: BaseOperation) -> float:
+        """The share of the budget the operation is expected to need"""
+        share = operation.footprint
+        return min(1.0, max(0.0, DEFAULT_FOOTPRINT if share is None else share))
+
+    def _allot(self, share: float) -> Allotment:
+        return Allotment(
+            int(self.memory_budget * share),
+            max(1, round(self.threads * share)),
+        )
+
+    def reserve(self, operation: BaseOperation) -> bool:
+        """
+        Reserve the footprint of an operation before starting it.
+        False if it does not fit next to the running operations,
+        an operation is always admitted if nothing else is running.
+        """
+        needed = self._allot(self.footprint(operation))
+        with self._lock:
+            if self._allotments:
+                reserved = sum(a.memory for a in self._allotments.values())
+                measured = max(self._usage.rss, self._usage.database)
+                if max(reserved, measured) + needed.memory > self.memory_budget:
+                    return False
+            self._allotments[operation.key] = needed
+            return True
+
+    def release(self, operation: BaseOperation) -> None:
+        """Release the footprint of a completed operation"""
+        with self._lock:
+            self._allotments.pop(operation.key, None)
+
+    def allotment(self, operation: BaseOperation) -> Allotment:
+        """The memory and threads given to a running operation"""
+        with self._lock:
+            if set(self._allotments) - {operation.key}:
+                return self._allotments.get(
+                    operation.key, self._allot(self.footprint(operation))
+                )
+        return Allotment(self.memory_budget, self.threads)
+
+    def apply(self, operation: BaseOperation, session: AbstractSession) -> None:
+        """
+        Configure the connection of an operation for its allotment.
+
+        DuckDB settings are shared by all connections to a database, so
+        its memory_limit is set to the budget less the memory the process
+        uses outside of DuckDB, and its threads to those allotted to the
+        operation starting. The connections to other databases are left
+        as they are, their server is tuned on its own.
+        """
+        if get_dialect_name(session) != "duckdb":
+            return
+        allotment = self.allotment(operation)
+        with self._lock:
+            outside = max(0, self._usage.rss - self._usage.database)
+        # the process memory also holds DuckDB allocations it does not
+        # report, so never take more than half of the budget away from it
+        memory = max(self.memory_budget - outside, self.memory_budget // 2)
+        session.execute(text(f"SET memory_limit = '{memory // 1024**2}MB'"))
+        session.execute(text(f"SET threads = {allotment.threads}"))
+
+    def sample(self, session: Optional[AbstractSession] = None) -> MemoryPeak:
+        """
+        Sample the memory of the process and of DuckDB, and update the
+        peaks of the running operations. The session is only used to
+        query DuckDB, without it the last DuckDB sample is kept.
+        """
+        database = self._usage.database
+        if session is not None:
+            database = session.execute(text(SQL_DUCKDB_MEMORY)).scalar() or 0
+        usage = MemoryPeak(rss=get_memory_use(), database=int(database))
+        with self._lock:
+            self._usage = usage
+            for key in self._allotments:
+                peak = self.peaks.get(key, MemoryPeak())
+                self.peaks[key] = MemoryPeak(
+                    rss=max(peak.rss, usage.rss),
+                    database=max(peak.database, usage.database),
+                )
+        return usage
+
+    @contextmanager
+    def sampling(
+        self, session_factory: Optional[Callable[[], AbstractSession]] = None
+    ) -> Generator[None, None, None]:
+        """
+        Sample the memory in the background. The DuckDB memory is read on
+        a session of its own, and not read if the database is not DuckDB.
+        Sampling stops at the first failure, which is logged.
+        """
+        stop = threading.Event()
+
+        def _sample() -> None:
+            session = None
+            if session_factory is not None:
+                session = session_factory()
+                if get_dialect_name(session) != "duckdb":
+                    session.close()
+                    session = None
+            try:
+                while not stop.is_set():
+                    try:
+                        self.sample(session)
+                    except Exception as e:  # pylint: disable=broad-except
+                        logger.warning(
+                            "Stopped sampling the memory of the run: %s", e
+                        )
+                        return
+                    stop.wait(self.sample_interval)
+            finally:
+                if session is not None:
+                    session.close()
+
+        sampler = threading.Thread(
+            target=_sample, name="etl-governor", daemon=True
+        )
+        sampler.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            sampler.join()
+
+    @contextmanager
+    def running(
+        self, operation: BaseOperation, session: AbstractSession
+    ) -> Generator[Allotment, None, None]:
+        """Run an operation within its allotment and log its peak memory"""
+        self.apply(operation, session)
+        allotment = self.allotment(operation)
+        with self._lock:
+            self.peaks.pop(operation.key, None)
+        try:
+            yield allotment
+        finally:
+            self.sample()
+            peak = self.peaks.get(operation.key, MemoryPeak())
+            logger.debug(
+                "\t%s peak memory: process %s MB, database %s MB "
+                "(allotted %s MB, %s thread(s))",
+                operation.key,
+                peak.rss // 1024**2,
+                peak.database // 1024**2,
+                allotment.memory // 1024**2,
+                allotment.threads,
+            )
+            if max(peak.rss, peak.database) > self.memory_budget:
+                logger.warning(
+                    "Memory use went over the budget (%s MB of %s MB) while "
+                    "running %s, consider raising its footprint",
+                    max(peak.rss, peak.database) // 1024**2,
+                    self.memory_budget // 1024**2,
+                    operation.key,
+                )
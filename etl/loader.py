@@ -1,16 +1,50 @@
 """Load source files into memory"""
 
+import hashlib
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from importlib.util import find_spec
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Final, List
 
 import pandas as pd
+from sqlalchemy import Float, Integer, String
 
-from .util.exceptions import ETLFatalErrorException
+from .util.exceptions import DependencyNotFoundException, ETLFatalErrorException
 
 logger = logging.getLogger("ETL.Core")
 
+# Arrow backed dtypes are used if pyarrow is installed
+HAS_PYARROW: Final[bool] = find_spec("pyarrow") is not None
+
+# The pandas dtypes of the column types, with and without pyarrow
+_DTYPES: Final[Dict[Any, str]] = {
+    Integer: "Int64",
+    Float: "Float64",
+    String: "string",
+}
+_ARROW_DTYPES: Final[Dict[Any, str]] = {
+    Integer: "int64[pyarrow]",
+    Float: "double[pyarrow]",
+    String: "string[pyarrow]",
+}
+
+
+def model_dtypes(model: Any, arrow: bool = HAS_PYARROW) -> Dict[str, str]:
+    """
+    The pandas dtypes of the columns of a model, so that files are read
+    with the types of the table they are loaded to, without inferring them
+    """
+    dtypes = _ARROW_DTYPES if arrow else _DTYPES
+    return {
+        column.key: dtype
+        for column in model.__table__.columns
+        for column_type, dtype in dtypes.items()
+        if isinstance(column.type, column_type)
+    }
+
 
 class Loader:
     """An empty loader to load in csv files"""
@@ -25,6 +59,16 @@ class Loader:
         """Does nothing"""
         return self
 
+    def content_hash(self) -> str:
+        """A hash of the content to load, the data is loaded to compute it"""
+        digest = hashlib.sha256()
+        for key, frame in sorted(self.load().data.items()):
+            digest.update(key.encode())
+            digest.update(
+                pd.util.hash_pandas_object(frame, index=False).values.tobytes()
+            )
+        return digest.hexdigest()
+
     def reset(self) -> None:
         """Reset the loaded data"""
         self._data = {}
@@ -45,7 +89,7 @@ EmptyLoader = Loader
 
 
 class CSVFileLoader(Loader):
-    """A source data loader for CSV inputs"""
+    """A source data loader for CSV inputs, or parquet by their extension"""
 
     def __init__(
         self,
@@ -61,29 +105,70 @@ class CSVFileLoader(Loader):
         self.extension = extension
         self.encoding = "utf-8"
 
-    def load(self) -> Loader:
-        """Load from source csv files"""
-        self.reset()
-        for model in self.models:
-            tablename = model.__tablename__
-            input_file = self.directory / f"{tablename}{self.extension}"
-            if not os.path.exists(input_file):
-                logger.error(
-                    "The following table is expected but is missing: %s, please check input data",
-                    tablename,
-                )
-                raise ETLFatalErrorException(
-                    f"Table: {tablename} missing. Expected file name: {input_file}."
-                )
-
-            self._update(
+    def _input_file(self, model: Any) -> Path:
+        tablename = model.__tablename__
+        input_file = self.directory / f"{tablename}{self.extension}"
+        if not os.path.exists(input_file):
+            logger.error(
+                "The following table is expected but is missing: %s, please check input data",
                 tablename,
-                pd.read_csv(
+            )
+            raise ETLFatalErrorException(
+                f"Table: {tablename} missing. Expected file name: {input_file}."
+            )
+        return input_file
+
+    def content_hash(self) -> str:
+        """A hash of the content of the files, without parsing them"""
+        digest = hashlib.sha256(self.delimiter.encode())
+        for model in self.models:
+            digest.update(model.__tablename__.encode())
+            with open(self._input_file(model), "rb") as input_file:
+                for block in iter(partial(input_file.read, 1 << 20), b""):
+                    digest.update(block)
+        return digest.hexdigest()
+
+    def _read(self, model: Any) -> pd.DataFrame:
+        input_file = self._input_file(model)
+        dtypes = model_dtypes(model)
+        if self.extension == ".parquet":
+            try:
+                frame = pd.read_parquet(
                     input_file,
-                    sep=self.delimiter,
-                    encoding=self.encoding,
-                    low_memory=False,
-                ),
+                    dtype_backend=(
+                        "pyarrow" if HAS_PYARROW else "numpy_nullable"
+                    ),
+                )
+            except ImportError as excep:
+                raise DependencyNotFoundException(
+                    "pyarrow is needed for parquet inputs! Please install it!"
+                ) from excep
+            return frame.astype(
+                {key: dtypes[key] for key in frame.columns if key in dtypes}
             )
+        # the dtypes of the columns missing from the file are left out
+        header = pd.read_csv(
+            input_file, sep=self.delimiter, encoding=self.encoding, nrows=0
+        )
+        return pd.read_csv(
+            input_file,
+            sep=self.delimiter,
+            encoding=self.encoding,
+            dtype={key: dtypes[key] for key in header.columns if key in dtypes},
+            engine="pyarrow" if HAS_PYARROW else "c",
+        )
+
+    def load(self) -> Loader:
+        """
+        Load from source csv or parquet files, with the column types of
+        their models. Several files are read in parallel.
+        """
+        self.reset()
+        models = list(self.models)
+        with ThreadPoolExecutor(
+            max(1, min(len(models), os.cpu_count() or 1))
+        ) as pool:
+            for model, frame in zip(models, pool.map(self._read, models)):
+                self._update(model.__tablename__, frame)
 
         return self
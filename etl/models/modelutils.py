@@ -222,13 +222,13 @@ def create_tables_sql(
 
     sql = []
     for table in tables:
+        # the IF NOT EXISTS of a sequence is not compiled by sqlalchemy 1.4
         sql.append(
             str(
                 CreateSequence(
                     Sequence(table.schema + "_" + table.name + "_id_seq"),
-                    if_not_exists=True,
                 ).compile(dialect=dialect)
-            )
+            ).replace("CREATE SEQUENCE", "CREATE SEQUENCE IF NOT EXISTS", 1)
         )
         sql.append(
             str(
@@ -9,6 +9,7 @@ from ..modelutils import (
     CharField,
     Column,
     DateTimeField,
+    IntField,
     PKIdMixin,
 )
 from .registry import OmopCdmModelBase as ModelBase
@@ -23,8 +24,90 @@ class CDMSummary(ModelBase, PKIdMixin):
     __tablename__: Final[str] = "cdm_summary"
 
     site: Final[Column] = CharField(255)
-    transform_name: Final[Column] = CharField(255, nullable=False)
+    transform_name: Final[Column] = CharField(255, nullable=False, unique=True)
     start_transform_datetime: Final[Column] = DateTimeField()
     end_transform_datetime: Final[Column] = DateTimeField()
     memory_used: Final[Column] = BigIntField()
     model_row_count: Final[Column] = BigIntField()
+
+
+@freeze_instance
+class RunManifest(ModelBase, PKIdMixin):
+    """
+    Completion record of each ETL step, used to resume a failed run
+    """
+
+    __tablename__: Final[str] = "run_manifest"
+
+    step_key: Final[Column] = CharField(255, nullable=False)
+    step: Final[Column] = IntField()
+    input_fingerprint: Final[Column] = CharField(64)
+    row_count: Final[Column] = BigIntField()
+    status: Final[Column] = CharField(20, nullable=False)
+    finish_datetime: Final[Column] = DateTimeField()
+
+
+@freeze_instance
+class SourceWatermark(ModelBase, PKIdMixin):
+    """
+    The highest source row processed per source table, used for incremental runs
+    """
+
+    __tablename__: Final[str] = "source_watermark"
+
+    source_table: Final[Column] = CharField(255, nullable=False)
+    max_id: Final[Column] = BigIntField()
+    updated_datetime: Final[Column] = DateTimeField()
+
+
+@freeze_instance
+class DeltaPerson(ModelBase, PKIdMixin):
+    """
+    The persons with new source data in an incremental run
+    """
+
+    __tablename__: Final[str] = "delta_person"
+
+    person_source_value: Final[Column] = CharField(50, nullable=False)
+
+
+@freeze_instance
+class LookupValidation(ModelBase, PKIdMixin):
+    """
+    The values replaced in the lookup tables when they were validated
+    """
+
+    __tablename__: Final[str] = "lookup_validation"
+
+    lookup_table: Final[Column] = CharField(255, nullable=False)
+    lookup_column: Final[Column] = CharField(255, nullable=False)
+    lookup_id: Final[Column] = BigIntField()
+    original_value: Final[Column] = CharField(255)
+    replacement_value: Final[Column] = CharField(255)
+    reason: Final[Column] = CharField(255)
+    validation_datetime: Final[Column] = DateTimeField()
+
+
+@freeze_instance
+class PersonMap(ModelBase, PKIdMixin):
+    """
+    The person_id of each cpr_enc of the sources
+    """
+
+    __tablename__: Final[str] = "person_map"
+
+    cpr_enc: Final[Column] = CharField(50, nullable=False, index=True)
+    person_id: Final[Column] = BigIntField(nullable=False)
+
+
+@freeze_instance
+class VisitMap(ModelBase, PKIdMixin):
+    """
+    The visit_occurrence_id and person_id of each courseid of the sources
+    """
+
+    __tablename__: Final[str] = "visit_map"
+
+    courseid: Final[Column] = BigIntField(nullable=False, index=True)
+    visit_occurrence_id: Final[Column] = BigIntField(nullable=False)
+    person_id: Final[Column] = BigIntField(nullable=False)
@@ -10,6 +10,7 @@ from ..util.freeze import freeze_instance
 from .modelutils import (
     FK,
     CharField,
+    DateTimeField,
     FloatField,
     IntField,
     PKIntField,
@@ -110,6 +111,20 @@ class ConceptLookupStem(TempModelBase):
     refills: Final[Column] = CharField(50)
 
 
+@freeze_instance
+class LookupCache(TempModelBase):
+    """
+    The key of the validated lookup tables, not registered as a lookup
+    table, so it is kept when they are recreated
+    """
+
+    __tablename__: Final = "lookup_cache"
+    __table_args__ = {"schema": LOOKUPS_SCHEMA}
+
+    cache_key: Final[Column] = CharField(64, primary_key=True)
+    created_datetime: Final[Column] = DateTimeField()
+
+
 TEMP_VERSION: Final[str] = "0.1"
 
 # pylint: disable=no-member
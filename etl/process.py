@@ -2,14 +2,31 @@
 
 import logging
 import os
-from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from contextlib import ExitStack, nullcontext
+from functools import partial
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Final,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
-from etl.sql.cdm_summary import log_transform_to_summary_table
+from sqlalchemy import func, select, text
 
+from .governor import ResourceGovernor
 from .loader import Loader
 from .models.omopcdm54 import (
     CareSite,
     CDMSource,
+    Concept,
+    ConceptAncestor,
+    ConceptRelationship,
     ConditionEra,
     ConditionOccurrence,
     Death,
@@ -26,11 +43,50 @@ from .models.omopcdm54 import (
     Specimen,
     Stem,
     VisitOccurrence,
+    Vocabulary,
 )
 from .models.omopcdm54.registry import TARGET_SCHEMA
+from .models.source import (
+    CourseIdCprMapping,
+    CourseMetadata,
+    Person as SourcePerson,
+    Prescriptions,
+)
 from .models.tempmodels import ConceptLookup, ConceptLookupStem
+from .scheduler import DependencyGraph, run_scheduled
+from .sql.cdm_summary import SummaryBuffer, write_summary
+from .sql.create_omopcdm_tables import get_models_for_tables
+from .sql.incremental import (
+    create_incremental_tables,
+    get_delta_person_select,
+    get_source_watermarks,
+    get_watermarks,
+    save_watermarks,
+    set_delta_persons,
+)
+from .sql.lookup_cache import (
+    clear_lookup_cache_key,
+    get_lookup_cache_key,
+    lookup_cache_key,
+    save_lookup_cache_key,
+)
+from .sql.run_manifest import (
+    STATUS_COMPLETED,
+    STATUS_FAILED,
+    clear_steps_from_manifest,
+    create_run_manifest_table,
+    get_completed_steps,
+    log_step_to_manifest,
+    run_fingerprint,
+    step_fingerprint,
+)
+from .sql.stem_fanout import StemFanout
+from .sql.stem_partitions import use_stem_partitions
 from .transform.care_site import transform as care_site_transform
-from .transform.cdm_source import transform as cdm_source_transform
+from .transform.cdm_source import (
+    get_vocabulary_version,
+    transform as cdm_source_transform,
+)
 from .transform.condition_era import transform as condition_era_transform
 from .transform.condition_occurrence import (
     transform as condition_occurrence_transform,
@@ -41,6 +97,7 @@ from .transform.death import transform as death_transform
 from .transform.device_exposure import transform as device_exposure_transform
 from .transform.drug_era import transform as drug_era_transform
 from .transform.drug_exposure import transform as drug_exposure_transform
+from .transform.incremental import transform as prepare_incremental
 from .transform.location import transform as location_transform
 from .transform.measurement import transform as measurement_transform
 from .transform.merge.care_site import transform as merge_care_site_transform
@@ -67,21 +124,59 @@ from .transform.session_operation import (
     SessionOperationDefaultMerge,
 )
 from .transform.specimen import transform as specimen_transform
-from .transform.stem import transform as stem_transform
+from .transform.stem import (
+    DRUG_MODELS,
+    LABORATORY_MODELS,
+    NONDRUG_MODELS,
+    REGISTRY_MODELS,
+    prepare_join_keys,
+    transform as stem_transform,
+)
+from .transform.stem_fanout import (
+    drop as drop_stem_fanout,
+    transform as stem_fanout_transform,
+)
 from .transform.visit_occurrence import transform as visit_occurrence_transform
-from .util.db import AbstractSession, session_context
+from .util.async_session import gather_scalars
+from .util.db import (
+    LOG_FULL_COUNTS,
+    AbstractSession,
+    FakeSession,
+    reported_row_count,
+    session_context,
+)
 from .util.exceptions import ETLFatalErrorException
+from .util.explain import PlanCapture
 from .util.logger import ErrorHandler
-from .util.preprocessing import (
-    validate_concept_ids,
-    validate_domain_ids,
-    validate_era_lookback_intervals,
-    validate_timezones,
-)
+from .util.preprocessing import validate_lookup_tables
 
 logger = logging.getLogger("ETL.Core")
 ETL_RUN_STEP = int(os.getenv("ETL_RUN_STEP", "0"))
 
+STEM_INPUTS: Final[List[Any]] = [
+    Person,
+    VisitOccurrence,
+    ConceptLookup,
+    ConceptLookupStem,
+    Concept,
+    ConceptRelationship,
+    Prescriptions,
+    *NONDRUG_MODELS,
+    *DRUG_MODELS,
+    *REGISTRY_MODELS,
+    *LABORATORY_MODELS,
+]
+OBSERVATION_PERIOD_INPUTS: Final[List[Any]] = [
+    Person,
+    Death,
+    VisitOccurrence,
+    ConditionOccurrence,
+    ProcedureOccurrence,
+    Measurement,
+    Observation,
+    DrugExposure,
+]
+
 
 class TransformationRegistry:
     """A simple class to manage the transformation state.
@@ -101,6 +196,10 @@ class TransformationRegistry:
             return None
         return self._state[key]
 
+    def items(self) -> List[Tuple[str, Any]]:
+        """All key value pairs, in the order they were first added"""
+        return list(self._state.items())
+
     def lazy_get(self, key: str) -> Callable[[str], Any]:
         """Returns a function to retrieve a value"""
 
@@ -114,6 +213,13 @@ def run_transformations(
     session: AbstractSession,
     transformations: Iterable[Tuple[int, SessionOperation]],
     registry: Optional[TransformationRegistry] = None,
+    workers: int = 1,
+    session_factory: Optional[Callable[[], AbstractSession]] = None,
+    on_complete: Optional[
+        Callable[[int, SessionOperation, AbstractSession, Any], None]
+    ] = None,
+    governor: Optional[ResourceGovernor] = None,
+    plan_capture: Optional[PlanCapture] = None,
 ) -> None:
     """
     Run a collections of transformations.
@@ -121,24 +227,83 @@ def run_transformations(
     Will attempt to run all transformations first,
     it will throw ETLFatalErrorException if any error
     was raised.
+
+    With more than one worker and a session factory, transformations
+    run as soon as the transformations they depend on have completed,
+    each on its own session.
+
+    on_complete is called with the step, transformation, session and
+    result after the transformation has run, whether or not it failed.
+
+    With a governor, transformations only run concurrently while their
+    footprints fit in its memory budget, and each connection is configured
+    for the memory and threads given to its transformation.
+
+    With a plan capture, the query plan of every statement of the
+    transformations is written to its report directory.
     """
 
     ehandler = ErrorHandler()
     ehandler.reset()
 
-    def log_and_call(j: int, trans: SessionOperation) -> Any:
+    def log_and_call(
+        j: int, trans: SessionOperation, trans_session: AbstractSession
+    ) -> Any:
         logger.info(
             "Step %s: Performing transformation %s",
             j,
             trans.description if trans.description else trans.key,
         )
-        return trans(session)
+        with ExitStack() as stack:
+            if governor is not None:
+                stack.enter_context(governor.running(trans, trans_session))
+            if plan_capture is not None:
+                stack.enter_context(
+                    plan_capture.capturing(trans.key, trans_session)
+                )
+            result = trans(trans_session)
+        if registry is not None:
+            registry.add_or_update(trans.key, result)
+        if on_complete is not None:
+            on_complete(j, trans, trans_session, result)
+        return result
+
+    def call_on_new_session(j: int, trans: SessionOperation) -> Any:
+        # the writes after the transformation, such as its summary and
+        # manifest rows, are committed before the session is closed
+        with session_context(session_factory()) as trans_session:
+            trans.session = trans_session
+            return log_and_call(j, trans, trans_session)
+
+    in_scope = [
+        (step, operation)
+        for step, operation in transformations
+        if step == -1 or ETL_RUN_STEP <= step
+    ]
+
+    # the metrics of all transformations are written once, after the run
+    summary = SummaryBuffer()
+    for _, operation in in_scope:
+        operation.summary = summary
 
-    for step, operation in transformations:
-        if step == -1 or ETL_RUN_STEP <= step:
-            result = log_and_call(step, operation)
-            if registry is not None:
-                registry.add_or_update(operation.key, result)
+    with governor.sampling(session_factory) if governor else nullcontext():
+        if workers > 1 and session_factory is not None:
+            run_scheduled(
+                in_scope,
+                call_on_new_session,
+                workers=workers,
+                governor=governor,
+            )
+        else:
+            for step, operation in in_scope:
+                if governor is not None:
+                    governor.reserve(operation)
+                log_and_call(step, operation, session)
+                if governor is not None:
+                    governor.release(operation)
+
+    with session_context(session) as ctx_session:
+        write_summary(ctx_session, summary)
 
     # check errors after all transformations have run
     # Raise an exception at the end
@@ -148,41 +313,233 @@ def run_transformations(
         )
 
 
-def run_etl(
-    session: AbstractSession, lookup_loader: Loader, reload_vocab: bool
+def record_to_manifest(
+    fingerprint: str,
+    step: int,
+    trans: SessionOperation,
+    session: AbstractSession,
+    result: Any = None,
 ) -> None:
-    """Run the full ETL and all transformations"""
-    lookup_loader.load()
+    """
+    Record the outcome of a declared transformation to the run manifest.
+    The row count is the number of rows the transformation reported to
+    have inserted, and the outputs are only counted when it reports none.
+    """
+    if isinstance(session, FakeSession) or not trans.is_declared:
+        return
+    with session_context(session) as ctx_session:
+        row_count = None
+        if not trans.has_failed:
+            row_count = reported_row_count(result)
+        if not trans.has_failed and row_count is None:
+            row_count = sum(
+                ctx_session.execute(
+                    text(f"SELECT COUNT(*) FROM {table}")
+                ).scalar()
+                for table in sorted(trans.outputs)
+            )
+        log_step_to_manifest(
+            ctx_session,
+            step_key=trans.key,
+            step=step,
+            input_fingerprint=step_fingerprint(
+                fingerprint, trans.key, trans.inputs
+            ),
+            row_count=row_count,
+            status=STATUS_FAILED if trans.has_failed else STATUS_COMPLETED,
+        )
 
-    validate_concept_ids(
-        lookup_loader.data.get(ConceptLookup.__tablename__),
-        session,
-        "concept_id",
-    )
-    validate_concept_ids(
-        lookup_loader.data.get(ConceptLookupStem.__tablename__),
-        session,
-        "mapped_standard_code",
+
+def plan_resume(
+    session: AbstractSession,
+    transformations: List[Tuple[int, SessionOperation]],
+    fingerprint: str,
+    transient: Iterable[str] = (),
+) -> List[Tuple[int, SessionOperation]]:
+    """
+    Select the transformations to rerun when resuming a run.
+
+    A transformation is rerun if it has not completed with the same input
+    fingerprint, or if a transformation it depends on is rerun. Transient
+    tables are dropped once read, so the transformation writing one is
+    rerun, without its dependents, if a transformation reading it is. The
+    create_omop transformation is replaced by one which only recreates the
+    tables written by the transformations to rerun.
+    """
+    completed = get_completed_steps(session)
+    steps = [(s, t) for s, t in transformations if t.key != "create_omop"]
+    graph = DependencyGraph(steps)
+
+    stale: Set[int] = set()
+    for j, (_, trans) in enumerate(steps):
+        fp = step_fingerprint(fingerprint, trans.key, trans.inputs)
+        if completed.get(trans.key) != fp or graph.dependencies(j) & stale:
+            stale.add(j)
+    rerun_inputs = set().union(*(steps[j][1].inputs or set() for j in stale))
+    for j, (_, trans) in enumerate(steps):
+        if (trans.outputs or set()) & set(transient) & rerun_inputs:
+            stale.add(j)
+
+    rerun = [steps[j] for j in sorted(stale)]
+    outputs = set().union(*(t.outputs or set() for _, t in rerun))
+    skipped = [t.key for j, (_, t) in enumerate(steps) if j not in stale]
+    logger.info(
+        "Resuming run: skipping %s completed transformation(s): %s",
+        len(skipped),
+        ", ".join(skipped),
     )
-    validate_domain_ids(
-        lookup_loader.data.get(ConceptLookupStem.__tablename__),
-        session,
-        "mapped_standard_code",
-        "std_code_domain",
+    clear_steps_from_manifest(session, [t.key for _, t in rerun])
+    session.commit()
+
+    create_omop = SessionOperation(
+        key="create_omop",
+        session=session,
+        func=partial(create_omop_tables, models=get_models_for_tables(outputs)),
+        description="Create OMOP tables to rerun",
+        inputs=[],
+        outputs=outputs,
     )
-    validate_timezones(
-        lookup_loader.data.get(ConceptLookupStem.__tablename__),
-        session,
-        "timezone",
+    return [(-1, create_omop), *rerun]
+
+
+def plan_incremental(
+    session: AbstractSession,
+    transformations: List[Tuple[int, SessionOperation]],
+) -> List[Tuple[int, SessionOperation]]:
+    """
+    Select the transformations to run in an incremental run.
+
+    The create_omop transformation is replaced by one which keeps the
+    existing tables and only deletes the rows of the persons with new
+    source data. Location and care site are not rebuilt.
+    """
+    prepare = SessionOperation(
+        key="create_omop",
+        session=session,
+        func=prepare_incremental,
+        description="Prepare OMOP tables for incremental run",
     )
-    validate_era_lookback_intervals(
-        lookup_loader.data.get(ConceptLookupStem.__tablename__),
-        "era_lookback_interval",
+    skipped = {str(Location.__table__), str(CareSite.__table__)}
+    return [(-1, prepare)] + [
+        (step, trans)
+        for step, trans in transformations
+        if trans.key != "create_omop" and trans.key not in skipped
+    ]
+
+
+def prepare_lookup_tables(
+    session: AbstractSession, lookup_loader: Loader, reload_vocab: bool
+) -> str:
+    """
+    Create and validate the lookup tables, unless the tables of an earlier
+    run were made from the same lookup files and vocabulary version, and
+    return their cache key. Reloading the vocabulary always recreates them.
+    """
+    cache_key = lookup_cache_key(
+        lookup_loader.content_hash(), get_vocabulary_version(session)
     )
+    if not reload_vocab and get_lookup_cache_key(session) == cache_key:
+        logger.info("Lookup tables unchanged, reusing the validated tables")
+        return cache_key
+
+    clear_lookup_cache_key(session)
+    create_lookup_tables(session, lookup_loader.load().data)
+    validate_lookup_tables(session)
+    save_lookup_cache_key(session, cache_key)
+    session.commit()
+    return cache_key
+
+
+def run_etl(
+    session: AbstractSession,
+    lookup_loader: Loader,
+    reload_vocab: bool,
+    workers: int = 1,
+    session_factory: Optional[Callable[[], AbstractSession]] = None,
+    resume: bool = False,
+    incremental: bool = False,
+    governor: Optional[ResourceGovernor] = None,
+    plan_capture: Optional[PlanCapture] = None,
+    prepare_shared: bool = True,
+) -> None:
+    """
+    Run the full ETL and all transformations.
+
+    Independent transformations run concurrently if more than one
+    worker and a session factory are given.
+
+    Each completed transformation is recorded to the run manifest.
+    With resume, transformations that completed in an earlier run with
+    the same inputs are skipped.
+
+    With incremental, only the persons with source rows added since the
+    last successful run are processed. Their rows are deleted and rebuilt,
+    including their eras and observation periods.
+
+    The Stem, Stem fan-out, observation period and era transformations
+    declare larger footprints, which a governor uses to run them with
+    fewer or no other transformations.
 
-    create_lookup_tables(session, lookup_loader.data)
+    Without prepare_shared, the lookup tables and the join key indexes of
+    the sources, shared by the runs of several sites, are not prepared
+    but must have been by an earlier run.
+    """
+    if resume and incremental:
+        raise ValueError("A run cannot both resume and be incremental")
 
     reload_vocab_files(session=session, reload_vocab=reload_vocab)
+    if prepare_shared:
+        lookup_key = prepare_lookup_tables(session, lookup_loader, reload_vocab)
+        prepare_join_keys(session)
+    else:
+        lookup_key = get_lookup_cache_key(session)
+        if lookup_key is None:
+            raise ETLFatalErrorException(
+                "The lookup tables have not been prepared"
+            )
+
+    create_incremental_tables(session)
+    watermarks = get_source_watermarks(session)
+    if incremental:
+        n_persons = set_delta_persons(
+            session,
+            get_delta_person_select(get_watermarks(session), watermarks),
+        )
+        session.commit()
+        if n_persons == 0:
+            logger.info("Incremental run: no new source data, nothing to do")
+            return
+        logger.info("Incremental run: processing %s person(s)", n_persons)
+
+    def scoped(func: Callable[..., Any]) -> Callable[..., Any]:
+        """Restrict a person transformation to the new persons if incremental"""
+        return partial(func, incremental=True) if incremental else func
+
+    # the domain transforms read a partitioned Stem directly,
+    # otherwise they read the Stem fan-out
+    last_domain_step = max(
+        model.__step__
+        for model in [
+            ConditionOccurrence,
+            ProcedureOccurrence,
+            Measurement,
+            DrugExposure,
+            Observation,
+            DeviceExposure,
+            Specimen,
+        ]
+    )
+    fanout = (
+        not use_stem_partitions(session) and ETL_RUN_STEP <= last_domain_step
+    )
+    # the fan-out is dropped after the domain transforms, so a run
+    # starting at one of them builds it again
+    fanout_step = max(Stem.__step__, ETL_RUN_STEP)
+    stem_domain_inputs = [str(StemFanout)] if fanout else [Stem]
+
+    def from_stem(func: Callable[..., Any]) -> Callable[..., Any]:
+        """A domain transformation reading the Stem"""
+        return scoped(partial(func, fanout=fanout))
 
     registry = TransformationRegistry()
 
@@ -203,6 +560,8 @@ def run_etl(
                 session=session,
                 func=cdm_source_transform,
                 description="CDMSource transform",
+                inputs=[Vocabulary],
+                outputs=[CDMSource],
             ),
         ),
         (
@@ -212,6 +571,8 @@ def run_etl(
                 session=session,
                 func=location_transform,
                 description="Location transform",
+                inputs=[],
+                outputs=[Location],
             ),
         ),
         (
@@ -221,6 +582,8 @@ def run_etl(
                 session=session,
                 func=care_site_transform,
                 description="Care site transform",
+                inputs=[Location],
+                outputs=[CareSite],
             ),
         ),
         (
@@ -228,8 +591,10 @@ def run_etl(
             SessionOperation(
                 key=str(Person.__table__),
                 session=session,
-                func=person_transform,
+                func=scoped(person_transform),
                 description="Person transform",
+                inputs=[SourcePerson],
+                outputs=[Person],
             ),
         ),
         (
@@ -237,8 +602,10 @@ def run_etl(
             SessionOperation(
                 key=str(Death.__table__),
                 session=session,
-                func=death_transform,
+                func=scoped(death_transform),
                 description="Death transform",
+                inputs=[Person, SourcePerson],
+                outputs=[Death],
             ),
         ),
         (
@@ -246,8 +613,16 @@ def run_etl(
             SessionOperation(
                 key=str(VisitOccurrence.__table__),
                 session=session,
-                func=visit_occurrence_transform,
+                func=scoped(visit_occurrence_transform),
                 description="Visit occurrence transform",
+                inputs=[
+                    Person,
+                    CareSite,
+                    CourseMetadata,
+                    CourseIdCprMapping,
+                    ConceptLookup,
+                ],
+                outputs=[VisitOccurrence],
             ),
         ),
         (
@@ -255,8 +630,23 @@ def run_etl(
             SessionOperation(
                 key=str(Stem.__table__),
                 session=session,
-                func=stem_transform,
+                func=scoped(stem_transform),
                 description="Stem transform",
+                inputs=STEM_INPUTS,
+                outputs=[Stem],
+                footprint=1.0,
+            ),
+        ),
+        (
+            fanout_step,
+            SessionOperation(
+                key=str(StemFanout),
+                session=session,
+                func=scoped(stem_fanout_transform),
+                description="Stem fan-out",
+                inputs=[Stem],
+                outputs=[str(StemFanout)],
+                footprint=1.0,
             ),
         ),
         (
@@ -264,8 +654,10 @@ def run_etl(
             SessionOperation(
                 key=str(ConditionOccurrence.__table__),
                 session=session,
-                func=condition_occurrence_transform,
+                func=from_stem(condition_occurrence_transform),
                 description="Condition Occurrence transform",
+                inputs=stem_domain_inputs,
+                outputs=[ConditionOccurrence],
             ),
         ),
         (
@@ -273,8 +665,10 @@ def run_etl(
             SessionOperation(
                 key=str(ProcedureOccurrence.__table__),
                 session=session,
-                func=procedure_occurrence_transform,
+                func=from_stem(procedure_occurrence_transform),
                 description="Procedure occurrence transform",
+                inputs=stem_domain_inputs,
+                outputs=[ProcedureOccurrence],
             ),
         ),
         (
@@ -282,8 +676,10 @@ def run_etl(
             SessionOperation(
                 key=str(Measurement.__table__),
                 session=session,
-                func=measurement_transform,
+                func=from_stem(measurement_transform),
                 description="Measurement transform",
+                inputs=stem_domain_inputs,
+                outputs=[Measurement],
             ),
         ),
         (
@@ -291,8 +687,10 @@ def run_etl(
             SessionOperation(
                 key=str(DrugExposure.__table__),
                 session=session,
-                func=drug_exposure_transform,
+                func=from_stem(drug_exposure_transform),
                 description="Drug exposure transform",
+                inputs=stem_domain_inputs,
+                outputs=[DrugExposure],
             ),
         ),
         (
@@ -300,8 +698,10 @@ def run_etl(
             SessionOperation(
                 key=str(Observation.__table__),
                 session=session,
-                func=observation_transform,
+                func=from_stem(observation_transform),
                 description="Observation transform",
+                inputs=stem_domain_inputs,
+                outputs=[Observation],
             ),
         ),
         (
@@ -309,8 +709,10 @@ def run_etl(
             SessionOperation(
                 key=str(DeviceExposure.__table__),
                 session=session,
-                func=device_exposure_transform,
+                func=from_stem(device_exposure_transform),
                 description="Device Exposure transform",
+                inputs=stem_domain_inputs,
+                outputs=[DeviceExposure],
             ),
         ),
         (
@@ -318,8 +720,22 @@ def run_etl(
             SessionOperation(
                 key=str(Specimen.__table__),
                 session=session,
-                func=specimen_transform,
+                func=from_stem(specimen_transform),
                 description="Specimen transform",
+                inputs=stem_domain_inputs,
+                outputs=[Specimen],
+            ),
+        ),
+        (
+            max(last_domain_step, ETL_RUN_STEP),
+            SessionOperation(
+                key=f"drop_{StemFanout.name}",
+                session=session,
+                func=drop_stem_fanout,
+                description="Drop the Stem fan-out",
+                # after every domain transformation has read the fan-out
+                inputs=[str(StemFanout)],
+                outputs=[str(StemFanout)],
             ),
         ),
         (
@@ -327,8 +743,11 @@ def run_etl(
             SessionOperation(
                 key=str(ObservationPeriod.__table__),
                 session=session,
-                func=observation_period_transform,
+                func=scoped(observation_period_transform),
                 description="Observation period transform",
+                inputs=OBSERVATION_PERIOD_INPUTS,
+                outputs=[ObservationPeriod],
+                footprint=0.5,
             ),
         ),
         (
@@ -336,8 +755,11 @@ def run_etl(
             SessionOperation(
                 key=str(DrugEra.__table__),
                 session=session,
-                func=drug_era_transform,
+                func=scoped(drug_era_transform),
                 description="Drug era transform",
+                inputs=[DrugExposure, Concept, ConceptAncestor],
+                outputs=[DrugEra],
+                footprint=0.5,
             ),
         ),
         (
@@ -345,13 +767,48 @@ def run_etl(
             SessionOperation(
                 key=str(ConditionEra.__table__),
                 session=session,
-                func=condition_era_transform,
+                func=scoped(condition_era_transform),
                 description="Condition era period transform",
+                inputs=[ConditionOccurrence],
+                outputs=[ConditionEra],
+                footprint=0.5,
             ),
         ),
     ]
+    if not fanout:
+        transformations = [
+            (step, trans)
+            for step, trans in transformations
+            if trans.key not in (str(StemFanout), f"drop_{StemFanout.name}")
+        ]
+
+    fingerprint = run_fingerprint(lookup_key=lookup_key)
+    create_run_manifest_table(session)
+    if resume:
+        transformations = plan_resume(
+            session, transformations, fingerprint, transient=[str(StemFanout)]
+        )
+    elif incremental:
+        transformations = plan_incremental(session, transformations)
+        clear_steps_from_manifest(session, [t.key for _, t in transformations])
+        session.commit()
+    else:
+        clear_steps_from_manifest(session, [t.key for _, t in transformations])
+        session.commit()
 
-    run_transformations(session, transformations, registry)
+    run_transformations(
+        session,
+        transformations,
+        registry,
+        workers=workers,
+        session_factory=session_factory,
+        on_complete=partial(record_to_manifest, fingerprint),
+        governor=governor,
+        plan_capture=plan_capture,
+    )
+
+    with session_context(session) as ctx_session:
+        save_watermarks(ctx_session, watermarks)
 
     logger.info("ETL completed")
     with session_context(session) as ctx_session:
@@ -376,10 +833,17 @@ def run_etl(
                 DrugEra,
                 ConditionEra,
             ],
+            registry,
         )
 
 
-def run_merge(session: AbstractSession) -> None:
+def run_merge(
+    session: AbstractSession,
+    workers: int = 1,
+    session_factory: Optional[Callable[[], AbstractSession]] = None,
+    governor: Optional[ResourceGovernor] = None,
+    plan_capture: Optional[PlanCapture] = None,
+) -> None:
     """Run the merge ETL"""
     registry = TransformationRegistry()
     transformations = [
@@ -407,6 +871,7 @@ def run_merge(session: AbstractSession) -> None:
                 cdm_table=Location,
                 session=session,
                 description="Merge Location transform",
+                inputs=[],
             ),
         ),
         (
@@ -416,6 +881,8 @@ def run_merge(session: AbstractSession) -> None:
                 session=session,
                 func=merge_care_site_transform,
                 description="Merge Care site transform",
+                inputs=[Location],
+                outputs=[CareSite],
             ),
         ),
         (
@@ -425,6 +892,8 @@ def run_merge(session: AbstractSession) -> None:
                 session=session,
                 func=merge_person_transform,
                 description="Merge Person transform",
+                inputs=[],
+                outputs=[Person],
             ),
         ),
         (
@@ -434,6 +903,8 @@ def run_merge(session: AbstractSession) -> None:
                 session=session,
                 func=merge_death_transform,
                 description="Merge Death transform",
+                inputs=[],
+                outputs=[Death],
             ),
         ),
         (
@@ -442,6 +913,7 @@ def run_merge(session: AbstractSession) -> None:
                 cdm_table=VisitOccurrence,
                 session=session,
                 description="Merge Visit Occurrence transform",
+                inputs=[CareSite],
             ),
         ),
         (
@@ -450,6 +922,7 @@ def run_merge(session: AbstractSession) -> None:
                 cdm_table=ConditionOccurrence,
                 session=session,
                 description="Condition Occurrence transform",
+                inputs=[],
             ),
         ),
         (
@@ -458,6 +931,7 @@ def run_merge(session: AbstractSession) -> None:
                 cdm_table=ProcedureOccurrence,
                 session=session,
                 description="Procedure occurrence transform",
+                inputs=[],
             ),
         ),
         (
@@ -466,6 +940,7 @@ def run_merge(session: AbstractSession) -> None:
                 cdm_table=Measurement,
                 session=session,
                 description="Measurement transform",
+                inputs=[],
             ),
         ),
         (
@@ -474,6 +949,7 @@ def run_merge(session: AbstractSession) -> None:
                 cdm_table=DrugExposure,
                 session=session,
                 description="Drug transform",
+                inputs=[],
             ),
         ),
         (
@@ -482,6 +958,7 @@ def run_merge(session: AbstractSession) -> None:
                 cdm_table=Observation,
                 session=session,
                 description="Observation transform",
+                inputs=[],
             ),
         ),
         (
@@ -490,6 +967,7 @@ def run_merge(session: AbstractSession) -> None:
                 cdm_table=DeviceExposure,
                 session=session,
                 description="Device Exposure transform",
+                inputs=[],
             ),
         ),
         (
@@ -498,6 +976,7 @@ def run_merge(session: AbstractSession) -> None:
                 cdm_table=Specimen,
                 session=session,
                 description="Specimen transform",
+                inputs=[],
             ),
         ),
         (
@@ -507,6 +986,8 @@ def run_merge(session: AbstractSession) -> None:
                 session=session,
                 func=merge_observation_period_transform,
                 description="Observation period transform",
+                inputs=[],
+                outputs=[ObservationPeriod],
             ),
         ),
         (
@@ -516,6 +997,8 @@ def run_merge(session: AbstractSession) -> None:
                 session=session,
                 func=merge_drug_era_transform,
                 description="Drug era transform",
+                inputs=[],
+                outputs=[DrugEra],
             ),
         ),
         (
@@ -525,10 +1008,20 @@ def run_merge(session: AbstractSession) -> None:
                 session=session,
                 func=merge_condition_era_transform,
                 description="Condition era transform",
+                inputs=[],
+                outputs=[ConditionEra],
             ),
         ),
     ]
-    run_transformations(session, transformations, registry)
+    run_transformations(
+        session,
+        transformations,
+        registry,
+        workers=workers,
+        session_factory=session_factory,
+        governor=governor,
+        plan_capture=plan_capture,
+    )
 
     logger.info("ETL Merge Complete")
     with session_context(session) as ctx_session:
@@ -551,21 +1044,32 @@ def run_merge(session: AbstractSession) -> None:
                 DrugEra,
                 ConditionEra,
             ],
+            registry,
         )
 
 
 def print_summary(
     session: AbstractSession,
     models: List[OmopCdmModelBase],  # type: ignore
+    registry: Optional[TransformationRegistry] = None,
 ) -> None:
-    """Print DB summary"""
+    """
+    Print DB summary. Unless LOG_FULL_COUNTS is set, the tables are not
+    counted and the rows inserted by each transformation are printed instead.
+    The summary table already holds the rows reported by each transformation,
+    so the counts are not written to it.
+    """
     output_str = f"\n{''.join([' ' for _ in range(10)])}--- ROWS TO {TARGET_SCHEMA} OMOPCDM ---\n"
-    for model in models:
-        model_row_count = session.query(model).count()
+    if not LOG_FULL_COUNTS:
+        for key, result in registry.items() if registry else []:
+            row_count = reported_row_count(result)
+            if row_count is not None:
+                output_str += f"{key:>22}: {row_count:<20}\n"
+        logger.info(output_str)
+        return
+    model_row_counts = gather_scalars(
+        session, [select(func.count()).select_from(model) for model in models]
+    )
+    for model, model_row_count in zip(models, model_row_counts):
         output_str += f"{model.__tablename__:>22}: {model_row_count:<20}\n"
-        log_transform_to_summary_table(
-            session,
-            transform_name=str(model.__table__),
-            model_row_count=model_row_count,
-        )
     logger.info(output_str)
@@ -0,0 +1,108 @@
+"""Dependency-aware scheduling of transformations"""
+
+import logging
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from .governor import ResourceGovernor
+from .transform.base_operation import BaseOperation
+
+logger = logging.getLogger("ETL.Core")
+
+
+def depends_on(later: BaseOperation, earlier: BaseOperation) -> bool:
+    """
+    Check if an operation has to wait for an operation listed before it.
+
+    Undeclared operations are barriers. Declared operations conflict if one
+    reads or writes a table the other writes, or writes a table the other reads.
+    """
+    if not later.is_declared or not earlier.is_declared:
+        return True
+    return bool(
+        earlier.outputs & (later.inputs | later.outputs)
+        or later.outputs & earlier.inputs
+    )
+
+
+class DependencyGraph:
+    """
+    The dependency graph of an ordered list of transformations.
+
+    Nodes are indices into the list. The listed order is used to break
+    conflicts, so running the graph gives the same result as running the
+    list serially.
+    """
+
+    def __init__(
+        self, transformations: Sequence[Tuple[int, BaseOperation]]
+    ) -> None:
+        self.transformations = list(transformations)
+        self._dependencies: Dict[int, Set[int]] = {}
+        for j, (_, later) in enumerate(self.transformations):
+            self._dependencies[j] = {
+                i
+                for i, (_, earlier) in enumerate(self.transformations[:j])
+                if depends_on(later, earlier)
+            }
+
+    def __len__(self) -> int:
+        return len(self.transformations)
+
+    def dependencies(self, node: int) -> Set[int]:
+        """The nodes that must complete before the given node can start"""
+        return set(self._dependencies[node])
+
+    def ready(self, done: Set[int], started: Set[int]) -> List[int]:
+        """The nodes that have not started and whose dependencies are done"""
+        return [
+            j
+            for j in range(len(self))
+            if j not in started and self._dependencies[j] <= done
+        ]
+
+
+def run_scheduled(
+    transformations: Sequence[Tuple[int, BaseOperation]],
+    run_operation: Callable[[int, BaseOperation], Any],
+    workers: int = 1,
+    governor: Optional[ResourceGovernor] = None,
+) -> None:
+    """
+    Run the transformations as soon as their dependencies have completed,
+    with at most `workers` transformations running at the same time.
+    With a governor, a transformation also waits until its footprint
+    fits in the memory budget next to the running ones.
+
+    run_operation is called from a worker thread and is responsible for
+    giving the operation its own session.
+    """
+    graph = DependencyGraph(transformations)
+    done: Set[int] = set()
+    started: Set[int] = set()
+    running: Dict[Future, int] = {}
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, workers), thread_name_prefix="etl-worker"
+    ) as executor:
+        while len(done) < len(graph):
+            for node in graph.ready(done, started):
+                # a queued operation would hold a reservation
+                if len(running) >= max(1, workers):
+                    break
+                step, operation = graph.transformations[node]
+                if governor is not None and not governor.reserve(operation):
+                    continue
+                started.add(node)
+                running[executor.submit(run_operation, step, operation)] = node
+                logger.debug(
+                    "\tScheduled %s (%s running)", operation.key, len(running)
+                )
+
+            completed, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in completed:
+                node = running.pop(future)
+                if governor is not None:
+                    governor.release(graph.transformations[node][1])
+                future.result()
+                done.add(node)
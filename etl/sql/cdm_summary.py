@@ -1,31 +1,125 @@
 "SQL for writing summary of transform to table."
+import threading
 import types
 from datetime import datetime
+from typing import Any, Dict, Final, List
 
-from sqlalchemy import insert, update
-from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql import Insert
+from sqlalchemy.sql.functions import coalesce
 
 from etl.models.omopcdm54 import CDMSummary
-from etl.util.db import AbstractSession, FakeSession
+from etl.util.db import (
+    AbstractSession,
+    FakeSession,
+    check_table_exists,
+    reported_row_count,
+    session_context,
+)
 from etl.util.memory import get_memory_use
 
+SUMMARY_METRICS: Final[List[str]] = [
+    CDMSummary.site.key,
+    CDMSummary.start_transform_datetime.key,
+    CDMSummary.end_transform_datetime.key,
+    CDMSummary.memory_used.key,
+    CDMSummary.model_row_count.key,
+]
+
+
+def get_summary_upsert(rows: List[Dict[str, Any]]) -> Insert:
+    """
+    Insert the summary of the given transformations, or update it if they
+    were logged before (transform_name is unique). A metric that is not
+    given keeps the value logged before.
+    """
+    stmt = insert(CDMSummary).values(
+        [
+            {
+                CDMSummary.transform_name.key: row[
+                    CDMSummary.transform_name.key
+                ],
+                **{metric: row.get(metric) for metric in SUMMARY_METRICS},
+            }
+            for row in rows
+        ]
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[CDMSummary.transform_name],
+        set_={
+            metric: coalesce(stmt.excluded[metric], getattr(CDMSummary, metric))
+            for metric in SUMMARY_METRICS
+        },
+    )
+
+
+class SummaryBuffer:
+    """
+    The metrics of transformations, written to the summary table in a
+    single upsert when flushed. The metrics of the same transformation
+    are merged, so it is written once.
+    """
+
+    def __init__(self) -> None:
+        self._rows: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, transform_name: str, **metrics) -> None:
+        """Add the metrics of a transformation"""
+        with self._lock:
+            row = self._rows.setdefault(
+                transform_name, {CDMSummary.transform_name.key: transform_name}
+            )
+            row.update(
+                {
+                    key: value
+                    for key, value in metrics.items()
+                    if value is not None
+                }
+            )
+
+    def flush(self, session: AbstractSession) -> None:
+        """Write the buffered metrics"""
+        with self._lock:
+            rows, self._rows = list(self._rows.values()), {}
+        if rows:
+            session.execute(get_summary_upsert(rows))
+
+
+def write_summary(session: AbstractSession, summary: SummaryBuffer) -> None:
+    """
+    Write the buffered metrics of a run, unless the summary table has not
+    been created
+    """
+    if isinstance(session, FakeSession) or not check_table_exists(
+        session.connection(),
+        CDMSummary.__tablename__,
+        schema=CDMSummary.metadata.schema,
+    ):
+        return
+    summary.flush(session)
+
 
 def with_log_to_summary_table(func) -> types.FunctionType:
+    """
+    Add the metrics of the operation to the summary buffer of its run. An
+    operation called outside of a run writes its own metrics.
+    """
+
     def wrapper(obj, *args, **kwargs):
-        start_datetime = datetime.now()
+        summary = obj.summary if obj.summary is not None else SummaryBuffer()
+        summary.add(obj.key, start_transform_datetime=datetime.now())
         result = func(obj, *args, **kwargs)
         if not isinstance(obj.session, FakeSession):
-            try:
-                log_transform_to_summary_table(
-                    obj.session,
-                    transform_name=obj.key,
-                    start_transform_datetime=start_datetime,
-                    end_transform_datetime=datetime.now(),
-                    memory_used=get_memory_use(),
-                )
-            except ProgrammingError as e:
-                if "cdm_summary does not exist" not in str(e):
-                    raise e
+            summary.add(
+                obj.key,
+                end_transform_datetime=datetime.now(),
+                memory_used=get_memory_use(),
+                model_row_count=reported_row_count(result),
+            )
+            if obj.summary is None:
+                with session_context(obj.session) as session:
+                    write_summary(session, summary)
         return result
 
     return wrapper
@@ -36,17 +130,6 @@ def log_transform_to_summary_table(
     transform_name: str,
     **kwargs,
 ) -> None:
-
-    transforms_already_logged = {
-        el[0] for el in session.query(CDMSummary.transform_name).all()
-    }
-    if transform_name in transforms_already_logged:
-        session.execute(
-            update(CDMSummary)
-            .where(CDMSummary.transform_name == transform_name)
-            .values(**kwargs)
-        )
-    else:
-        session.execute(
-            insert(CDMSummary).values(transform_name=transform_name, **kwargs)
-        )
+    summary = SummaryBuffer()
+    summary.add(transform_name, **kwargs)
+    summary.flush(session)
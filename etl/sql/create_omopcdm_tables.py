@@ -1,7 +1,7 @@
 """Create the omopcdm tables"""
 
 import os
-from typing import Final, List
+from typing import Final, Iterable, List, Optional, Tuple
 
 from ..models.modelutils import (
     DIALECT_POSTGRES,
@@ -43,7 +43,8 @@ from ..models.omopcdm54 import (
     VisitOccurrence,
 )
 from ..models.omopcdm54.registry import TARGET_SCHEMA
-from ..util.sql import clean_sql
+from ..util.sql import cached_statement, clean_sql
+from .stem_partitions import create_partitioned_stem_sql
 
 MODELS: Final[List] = [
     Person,
@@ -83,14 +84,26 @@ ETL_RUN_STEP: Final[int] = int(os.getenv("ETL_RUN_STEP", "0"))
 SQL_CREATE_SCHEMA: Final[str] = f"CREATE SCHEMA IF NOT EXISTS {TARGET_SCHEMA};"
 
 
+@cached_statement
 @clean_sql
-def _ddl_sql() -> str:
-    models_to_create = get_models_in_scope()
+def _ddl_sql(
+    models_to_create: Optional[Tuple[OmopCdmModelBase, ...]] = None,
+    partition_stem: bool = False,
+) -> str:
+    models_to_create = list(
+        get_models_in_scope() if models_to_create is None else models_to_create
+    )
+    partition_stem = partition_stem and Stem in models_to_create
     statements = [
         SQL_CREATE_SCHEMA,
         drop_tables_sql(models_to_create, cascade=True),
-        create_tables_sql(models_to_create, dialect=DIALECT_POSTGRES),
+        create_tables_sql(
+            [m for m in models_to_create if not (partition_stem and m is Stem)],
+            dialect=DIALECT_POSTGRES,
+        ),
     ]
+    if partition_stem:
+        statements.append(create_partitioned_stem_sql())
     return " ".join(statements)
 
 
@@ -102,4 +115,20 @@ def get_models_in_scope() -> List[OmopCdmModelBase]:
     return models
 
 
-SQL: Final[str] = _ddl_sql()
+def get_models_for_tables(tables: Iterable[str]) -> List[OmopCdmModelBase]:
+    """The OMOP models (in step order) with one of the given table names"""
+    tables = set(tables)
+    models = [m for m in MODELS if str(m.__table__) in tables]
+    return sorted(models, key=lambda m: m.__step__)
+
+
+def get_ddl_sql(
+    models: Optional[List[OmopCdmModelBase]] = None,
+    partition_stem: bool = False,
+) -> str:
+    """
+    Drop and recreate the given models, or those in scope if not given.
+    With partition_stem, the Stem is created as a partitioned table.
+    The DDL is only compiled the first time it is needed.
+    """
+    return _ddl_sql(None if models is None else tuple(models), partition_stem)
@@ -5,12 +5,10 @@ from typing import Final
 from sqlalchemy import TIMESTAMP, and_, cast, insert, literal, select
 from sqlalchemy.orm import aliased
 from sqlalchemy.sql import Insert
-from sqlalchemy.sql.functions import concat, count
+from sqlalchemy.sql.functions import count
 
-from etl.models.omopcdm54.clinical import (
-    Death as OmopDeath,
-    Person as OmopPerson,
-)
+from etl.models.omopcdm54 import PersonMap
+from etl.models.omopcdm54.clinical import Death as OmopDeath
 from etl.models.source import Person as SourcePerson
 
 REGISTRY_DEATH_TYPE_CONCEPT_ID: Final[int] = 32879
@@ -19,7 +17,7 @@ SourcePersonAlias = aliased(SourcePerson, name="SourcePerson")
 
 MergedOmopSourcePerson = (
     select(
-        OmopPerson.person_id,
+        PersonMap.person_id,
         SourcePersonAlias.d_foddato,
         SourcePersonAlias.c_status,
         SourcePersonAlias.d_status_hen_start,
@@ -28,11 +26,10 @@ MergedOmopSourcePerson = (
         ),
         literal(REGISTRY_DEATH_TYPE_CONCEPT_ID).label("death_type_concept_id"),
     )
-    .select_from(OmopPerson)
+    .select_from(PersonMap)
     .join(
         SourcePersonAlias,
-        concat(SourcePersonAlias.cpr_enc.key, "|", SourcePersonAlias.cpr_enc)
-        == OmopPerson.person_source_value,
+        SourcePersonAlias.cpr_enc == PersonMap.cpr_enc,
     )
 )
 
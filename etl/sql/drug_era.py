@@ -1,6 +1,8 @@
 "Drug era logic."
 
-from sqlalchemy import and_, insert, literal, select
+from typing import Final
+
+from sqlalchemy import INT, and_, bindparam, insert, select
 from sqlalchemy.sql import Insert
 
 from ..models.omopcdm54.clinical import DrugExposure as OmopDrugExposure
@@ -13,6 +15,10 @@ from ..models.omopcdm54.vocabulary import (
 )
 from ..sql.utils import get_era_select
 from ..util.db import AbstractSession
+from ..util.sql import cached_statement
+
+# The bound parameter of the ingredient of the drug era insert
+INGREDIENT_CONCEPT_ID: Final[str] = "ingredient_concept_id"
 
 
 def get_ingredients_with_data(session: AbstractSession) -> list:
@@ -39,14 +45,18 @@ def get_ingredients_with_data(session: AbstractSession) -> list:
     ).all()
 
 
-def get_ingredient_era_insert(
-    session: AbstractSession = None, ingredient_concept_id: int = None
-) -> Insert:
+@cached_statement
+def get_ingredient_era_insert() -> Insert:
+    """
+    Insert the drug eras of one ingredient, given as the
+    INGREDIENT_CONCEPT_ID parameter when executing.
+    """
+    ingredient_concept_id = bindparam(INGREDIENT_CONCEPT_ID, type_=INT)
 
     CteIngredientExposure = (
         select(
             OmopDrugExposure.person_id,
-            literal(ingredient_concept_id).label("drug_concept_id"),
+            ingredient_concept_id.label("drug_concept_id"),
             OmopDrugExposure.drug_exposure_start_datetime,
             OmopDrugExposure.drug_exposure_end_datetime,
             OmopDrugExposure.era_lookback_interval,
@@ -83,10 +93,8 @@ def get_ingredient_era_insert(
             OmopDrugEra.drug_exposure_count,
             OmopDrugEra.drug_concept_id,
         ],
-        select=session.query(
-            select(
-                *DrugEraSelect.columns, literal(ingredient_concept_id)
-            ).subquery()
+        select=select(
+            select(*DrugEraSelect.columns, ingredient_concept_id).subquery()
         ),
         include_defaults=False,
     )
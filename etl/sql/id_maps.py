@@ -0,0 +1,95 @@
+"""
+SQL for the maps of the source identifiers to the ids of the OMOP CDM.
+
+The sources name their persons by cpr_enc and their visits by courseid,
+which the Person and VisitOccurrence tables hold as prefixed strings in
+their source values. The maps hold the ids of each source identifier, so
+that the transformations reading the sources join on the identifiers as
+they are, instead of prefixing the identifier of every source row.
+"""
+
+from typing import Final
+
+from sqlalchemy import BigInteger, cast, delete, func, insert, select
+from sqlalchemy.sql import Insert
+
+from ..models.modelutils import (
+    DIALECT_POSTGRES,
+    create_tables_sql,
+    set_indexes_sql,
+)
+from ..models.omopcdm54 import (
+    Person as OmopPerson,
+    PersonMap,
+    VisitMap,
+    VisitOccurrence as OmopVisitOccurrence,
+)
+from ..models.omopcdm54.registry import TARGET_SCHEMA
+from ..util.db import AbstractSession
+from ..util.sql import clean_sql
+
+PERSON_SOURCE_PREFIX: Final[str] = "cpr_enc|"
+VISIT_SOURCE_PREFIX: Final[str] = "courseid|"
+
+
+@clean_sql
+def _create_sql() -> str:
+    return " ".join(
+        [
+            f"CREATE SCHEMA IF NOT EXISTS {TARGET_SCHEMA};",
+            create_tables_sql([PersonMap, VisitMap], dialect=DIALECT_POSTGRES),
+            set_indexes_sql([PersonMap, VisitMap], dialect=DIALECT_POSTGRES),
+        ]
+    )
+
+
+SQL_CREATE_ID_MAPS: Final[str] = _create_sql()
+
+
+def _unprefixed(source_value, prefix: str):
+    return func.substr(source_value, len(prefix) + 1)
+
+
+PersonMapInsert: Final[Insert] = insert(PersonMap).from_select(
+    names=[PersonMap.cpr_enc, PersonMap.person_id],
+    select=select(
+        _unprefixed(OmopPerson.person_source_value, PERSON_SOURCE_PREFIX),
+        OmopPerson.person_id,
+    ).where(
+        OmopPerson.person_source_value.startswith(
+            PERSON_SOURCE_PREFIX, autoescape=True
+        )
+    ),
+)
+
+VisitMapInsert: Final[Insert] = insert(VisitMap).from_select(
+    names=[VisitMap.courseid, VisitMap.visit_occurrence_id, VisitMap.person_id],
+    select=select(
+        cast(
+            _unprefixed(
+                OmopVisitOccurrence.visit_source_value, VISIT_SOURCE_PREFIX
+            ),
+            BigInteger,
+        ),
+        OmopVisitOccurrence.visit_occurrence_id,
+        OmopVisitOccurrence.person_id,
+    ).where(
+        OmopVisitOccurrence.visit_source_value.startswith(
+            VISIT_SOURCE_PREFIX, autoescape=True
+        )
+    ),
+)
+
+
+def refresh_person_map(session: AbstractSession) -> int:
+    """Map every cpr_enc of the Person table to its person_id"""
+    session.execute(SQL_CREATE_ID_MAPS)
+    session.execute(delete(PersonMap))
+    return session.execute(PersonMapInsert).inserted
+
+
+def refresh_visit_map(session: AbstractSession) -> int:
+    """Map every courseid of the VisitOccurrence table to its ids"""
+    session.execute(SQL_CREATE_ID_MAPS)
+    session.execute(delete(VisitMap))
+    return session.execute(VisitMapInsert).inserted
@@ -0,0 +1,273 @@
+"SQL for incremental runs driven by source watermarks."
+from datetime import datetime
+from typing import Any, Dict, Final, List, Tuple
+
+from sqlalchemy import Table, delete, func, insert, literal, select, union
+from sqlalchemy.sql import Insert, Select
+from sqlalchemy.sql.functions import concat
+from sqlalchemy.sql.util import ClauseAdapter
+
+from etl.models.modelutils import DIALECT_POSTGRES, create_tables_sql
+from etl.models.omopcdm54 import (
+    CDMSource,
+    ConditionEra,
+    ConditionOccurrence,
+    Death,
+    DeltaPerson,
+    DeviceExposure,
+    DrugEra,
+    DrugExposure,
+    Measurement,
+    Observation,
+    ObservationPeriod,
+    Person,
+    PersonMap,
+    ProcedureOccurrence,
+    SourceWatermark,
+    Specimen,
+    Stem,
+    VisitMap,
+    VisitOccurrence,
+)
+from etl.models.omopcdm54.registry import TARGET_SCHEMA
+from etl.models.source import (
+    Administrations,
+    CourseIdCprMapping,
+    CourseMetadata,
+    DiagnosesProcedures,
+    LabkaBccLaboratory,
+    LprDiagnoses,
+    LprOperations,
+    LprProcedures,
+    Observations,
+    Person as SourcePerson,
+    Prescriptions,
+)
+from etl.sql.id_maps import PERSON_SOURCE_PREFIX
+from etl.sql.stem_fanout import StemFanout
+from etl.util.db import AbstractSession
+from etl.util.sql import clean_sql
+
+# Source tables keyed by course, mapped to persons through courseid_cpr_mapping
+COURSE_SOURCE_MODELS: Final[List[Any]] = [
+    CourseMetadata,
+    Administrations,
+    Prescriptions,
+    DiagnosesProcedures,
+    Observations,
+]
+# Source tables keyed by person
+PERSON_SOURCE_MODELS: Final[List[Any]] = [
+    SourcePerson,
+    CourseIdCprMapping,
+    LprDiagnoses,
+    LprProcedures,
+    LprOperations,
+    LabkaBccLaboratory,
+]
+WATERMARKED_MODELS: Final[List[Any]] = (
+    COURSE_SOURCE_MODELS + PERSON_SOURCE_MODELS
+)
+
+# OMOP tables holding rows per person, in the order they are purged
+PERSON_SCOPED_MODELS: Final[List[Any]] = [
+    ConditionEra,
+    DrugEra,
+    ObservationPeriod,
+    Specimen,
+    DeviceExposure,
+    Observation,
+    DrugExposure,
+    Measurement,
+    ProcedureOccurrence,
+    ConditionOccurrence,
+    Stem,
+    VisitOccurrence,
+    Death,
+]
+
+
+@clean_sql
+def _create_sql() -> str:
+    return " ".join(
+        [
+            f"CREATE SCHEMA IF NOT EXISTS {TARGET_SCHEMA};",
+            create_tables_sql(
+                [SourceWatermark, DeltaPerson], dialect=DIALECT_POSTGRES
+            ),
+        ]
+    )
+
+
+SQL_CREATE_INCREMENTAL: Final[str] = _create_sql()
+
+
+def create_incremental_tables(session: AbstractSession) -> None:
+    """Create the watermark and delta tables if they do not already exist"""
+    session.execute(SQL_CREATE_INCREMENTAL)
+    session.commit()
+
+
+def get_watermarks(session: AbstractSession) -> Dict[str, int]:
+    """The highest _id processed per source table in an earlier run"""
+    rows = session.execute(
+        select(SourceWatermark.source_table, SourceWatermark.max_id)
+    ).all()
+    return {source_table: max_id for source_table, max_id in rows}
+
+
+def get_source_watermarks(session: AbstractSession) -> Dict[str, int]:
+    """The current highest _id per source table"""
+    return {
+        str(model.__table__): session.execute(
+            select(func.coalesce(func.max(model._id), 0))
+        ).scalar()
+        for model in WATERMARKED_MODELS
+    }
+
+
+def save_watermarks(
+    session: AbstractSession, watermarks: Dict[str, int]
+) -> None:
+    """Replace the stored watermarks"""
+    session.execute(delete(SourceWatermark))
+    if watermarks:
+        session.execute(
+            insert(SourceWatermark),
+            [
+                {
+                    "source_table": source_table,
+                    "max_id": max_id,
+                    "updated_datetime": datetime.now(),
+                }
+                for source_table, max_id in watermarks.items()
+            ],
+        )
+
+
+def get_delta_person_select(
+    previous: Dict[str, int], current: Dict[str, int]
+) -> Select:
+    """
+    Select the person_source_value of every person with source rows
+    added between the previous and the current watermarks
+    """
+
+    def _new_rows(model: Any) -> Any:
+        table = str(model.__table__)
+        return model._id.between(previous.get(table, 0) + 1, current[table])
+
+    selects = [
+        select(CourseIdCprMapping.cpr_enc)
+        .join(model, model.courseid == CourseIdCprMapping.courseid)
+        .where(_new_rows(model))
+        for model in COURSE_SOURCE_MODELS
+    ] + [
+        select(model.cpr_enc).where(_new_rows(model))
+        for model in PERSON_SOURCE_MODELS
+    ]
+    cpr = union(*selects).subquery()
+    return select(
+        concat(literal(PERSON_SOURCE_PREFIX), cpr.c.cpr_enc)
+    ).distinct()
+
+
+def set_delta_persons(session: AbstractSession, delta: Select) -> int:
+    """Store the persons to process in this run and return their count"""
+    session.execute(delete(DeltaPerson))
+    return session.execute(
+        insert(DeltaPerson).from_select(
+            [DeltaPerson.person_source_value], delta
+        )
+    ).inserted
+
+
+def delta_person_source_values() -> Select:
+    """The person_source_value of the persons to process"""
+    return select(DeltaPerson.person_source_value)
+
+
+def delta_person_ids() -> Select:
+    """The person_id of the persons to process"""
+    return select(Person.person_id).where(
+        Person.person_source_value.in_(delta_person_source_values())
+    )
+
+
+def purge_delta_persons(session: AbstractSession) -> None:
+    """Delete all OMOP rows of the persons to process, and the CDM source"""
+    for model in PERSON_SCOPED_MODELS:
+        session.execute(
+            delete(model)
+            .where(model.person_id.in_(delta_person_ids()))
+            .execution_options(synchronize_session=False)
+        )
+    session.execute(
+        delete(Person)
+        .where(Person.person_source_value.in_(delta_person_source_values()))
+        .execution_options(synchronize_session=False)
+    )
+    session.execute(delete(CDMSource))
+
+
+def delta_cpr_encs() -> Select:
+    """The cpr_enc of the persons to process"""
+    return select(
+        func.substr(
+            DeltaPerson.person_source_value, len(PERSON_SOURCE_PREFIX) + 1
+        )
+    )
+
+
+def delta_courseids() -> Select:
+    """The courseid of the courses of the persons to process"""
+    return select(CourseIdCprMapping.courseid).where(
+        CourseIdCprMapping.cpr_enc.in_(delta_cpr_encs())
+    )
+
+
+def _delta_restrictions() -> List[Tuple[Table, Any]]:
+    # the tables holding rows per person, with the condition selecting the
+    # rows of the persons to process. The mapping of the courses to the
+    # persons is restricted before the tables keyed by course, so that the
+    # courses of those are read from the mapping table itself.
+    person_tables = [
+        *(model.__table__ for model in PERSON_SCOPED_MODELS),
+        StemFanout,
+        VisitMap.__table__,
+    ]
+    return [
+        *(
+            (table, table.c.person_id.in_(delta_person_ids()))
+            for table in person_tables
+        ),
+        *(
+            (model.__table__, model.cpr_enc.in_(delta_cpr_encs()))
+            for model in [*PERSON_SOURCE_MODELS, PersonMap]
+        ),
+        *(
+            (model.__table__, model.courseid.in_(delta_courseids()))
+            for model in COURSE_SOURCE_MODELS
+        ),
+    ]
+
+
+def restrict_to_delta_persons(stmt: Insert) -> Insert:
+    """
+    Restrict an INSERT ... SELECT to the persons to process. Every table
+    read holding rows per person is read through a subquery of the rows of
+    those persons, so the restriction applies to the scans of the tables
+    rather than to the rows inserted.
+    """
+    source = stmt.select
+    for table, condition in _delta_restrictions():
+        restricted = (
+            select(table).where(condition).subquery(f"delta_{table.name}")
+        )
+        source = ClauseAdapter(restricted).traverse(source)
+    # pylint: disable=protected-access
+    return insert(stmt.table).from_select(
+        stmt._select_names,
+        source,
+        include_defaults=stmt.include_insert_from_select_defaults,
+    )
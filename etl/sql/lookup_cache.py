@@ -0,0 +1,55 @@
+"SQL for reusing the validated lookup tables of an earlier run."
+import hashlib
+from datetime import datetime
+from typing import Final, Optional
+
+from sqlalchemy import delete, insert, select
+
+from etl.models.modelutils import DIALECT_POSTGRES, create_tables_sql
+from etl.models.tempmodels import LOOKUPS_SCHEMA, TEMP_VERSION, LookupCache
+from etl.util.db import AbstractSession
+from etl.util.sql import clean_sql
+
+
+@clean_sql
+def _create_sql() -> str:
+    return " ".join(
+        [
+            f"CREATE SCHEMA IF NOT EXISTS {LOOKUPS_SCHEMA};",
+            create_tables_sql([LookupCache], dialect=DIALECT_POSTGRES),
+        ]
+    )
+
+
+SQL_CREATE_LOOKUP_CACHE: Final[str] = _create_sql()
+
+
+def lookup_cache_key(content_hash: str, vocabulary_version: str) -> str:
+    """
+    The key of the validated lookup tables: the content of the lookup
+    files and the vocabulary they were validated against
+    """
+    return hashlib.sha256(
+        f"{TEMP_VERSION}|{content_hash}|{vocabulary_version}".encode()
+    ).hexdigest()
+
+
+def get_lookup_cache_key(session: AbstractSession) -> Optional[str]:
+    """The key of the lookup tables in the database, if any"""
+    session.execute(SQL_CREATE_LOOKUP_CACHE)
+    return session.execute(select(LookupCache.cache_key)).scalar()
+
+
+def clear_lookup_cache_key(session: AbstractSession) -> None:
+    """Forget the key of the lookup tables, before they are recreated"""
+    session.execute(delete(LookupCache))
+
+
+def save_lookup_cache_key(session: AbstractSession, cache_key: str) -> None:
+    """Record the key of the lookup tables just created and validated"""
+    clear_lookup_cache_key(session)
+    session.execute(
+        insert(LookupCache).values(
+            cache_key=cache_key, created_datetime=datetime.now()
+        )
+    )
@@ -0,0 +1,185 @@
+"SQL for validating the lookup tables against the vocabulary in bulk."
+from datetime import datetime
+from typing import Any, Final, Iterable, List
+
+from sqlalchemy import (
+    String,
+    and_,
+    cast,
+    column,
+    delete,
+    exists,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    update,
+)
+from sqlalchemy.sql import ColumnElement, Executable
+
+from etl.models.modelutils import DIALECT_POSTGRES, create_tables_sql
+from etl.models.omopcdm54 import Concept, LookupValidation
+from etl.models.omopcdm54.registry import TARGET_SCHEMA
+from etl.models.tempmodels import ConceptLookup, ConceptLookupStem
+from etl.util.sql import clean_sql
+
+REASON_CONCEPT_ID: Final[str] = "not a standard concept"
+REASON_DOMAIN_ID: Final[str] = "not the domain of the concept"
+REASON_TIMEZONE: Final[str] = "not a time zone"
+REASON_ERA_LOOKBACK_INTERVAL: Final[str] = "not an interval"
+
+# The types of the lookup columns are inferred from the loaded files, so
+# the text columns are cast before they are compared.
+
+
+@clean_sql
+def _create_sql() -> str:
+    return " ".join(
+        [
+            f"CREATE SCHEMA IF NOT EXISTS {TARGET_SCHEMA};",
+            create_tables_sql([LookupValidation], dialect=DIALECT_POSTGRES),
+        ]
+    )
+
+
+SQL_CREATE_LOOKUP_VALIDATION: Final[str] = _create_sql()
+
+
+def _replace_values(
+    model: Any,
+    lookup_column: Any,
+    replacement: Any,
+    invalid: ColumnElement,
+    reason: str,
+) -> List[Executable]:
+    """
+    Report the values of a lookup column that are invalid, then replace
+    them, each in a single statement for all the rows of the lookup table.
+    """
+    lookup_id = list(model.__table__.primary_key.columns)[0]
+    report = insert(LookupValidation).from_select(
+        [
+            LookupValidation.lookup_table,
+            LookupValidation.lookup_column,
+            LookupValidation.lookup_id,
+            LookupValidation.original_value,
+            LookupValidation.replacement_value,
+            LookupValidation.reason,
+            LookupValidation.validation_datetime,
+        ],
+        select(
+            literal(model.__tablename__),
+            literal(lookup_column.key),
+            lookup_id,
+            cast(lookup_column, String),
+            cast(replacement, String),
+            literal(reason),
+            literal(datetime.now()),
+        ).where(invalid),
+    )
+    return [
+        report,
+        update(model)
+        .where(invalid)
+        .values({lookup_column: replacement})
+        .execution_options(synchronize_session=False),
+    ]
+
+
+def _standard_concept_ids(model: Any, lookup_column: Any) -> List[Executable]:
+    # a missing concept id is replaced by 0 too
+    return _replace_values(
+        model,
+        lookup_column,
+        literal(0),
+        or_(
+            lookup_column.is_(None),
+            and_(
+                lookup_column != 0,
+                ~exists().where(
+                    Concept.concept_id == lookup_column,
+                    Concept.standard_concept == "S",
+                ),
+            ),
+        ),
+        REASON_CONCEPT_ID,
+    )
+
+
+def _concept_domain_ids() -> List[Executable]:
+    concept_domain = (
+        select(Concept.domain_id)
+        .where(Concept.concept_id == ConceptLookupStem.mapped_standard_code)
+        .scalar_subquery()
+    )
+    return _replace_values(
+        ConceptLookupStem,
+        ConceptLookupStem.std_code_domain,
+        concept_domain,
+        and_(
+            ConceptLookupStem.mapped_standard_code != 0,
+            exists().where(
+                Concept.concept_id == ConceptLookupStem.mapped_standard_code,
+                or_(
+                    ConceptLookupStem.std_code_domain.is_(None),
+                    Concept.domain_id
+                    != cast(ConceptLookupStem.std_code_domain, String),
+                ),
+            ),
+        ),
+        REASON_DOMAIN_ID,
+    )
+
+
+def _timezones() -> List[Executable]:
+    timezone_names = select(column("name")).select_from(
+        func.pg_timezone_names()
+    )
+    return _replace_values(
+        ConceptLookupStem,
+        ConceptLookupStem.timezone,
+        literal(None, String),
+        and_(
+            ConceptLookupStem.timezone.is_not(None),
+            cast(ConceptLookupStem.timezone, String).not_in(timezone_names),
+        ),
+        REASON_TIMEZONE,
+    )
+
+
+def get_lookup_validation_statements() -> List[Executable]:
+    """
+    Validate the lookup tables against the vocabulary:
+    concept ids that are not standard concepts are set to 0, the domains
+    of the stem lookup are set to the domains of their concepts and time
+    zones unknown to the database are set to NULL. Every value replaced
+    is reported to the lookup validation table first.
+    """
+    return [
+        delete(LookupValidation),
+        *_standard_concept_ids(ConceptLookup, ConceptLookup.concept_id),
+        *_standard_concept_ids(
+            ConceptLookupStem, ConceptLookupStem.mapped_standard_code
+        ),
+        *_concept_domain_ids(),
+        *_timezones(),
+    ]
+
+
+def get_era_lookback_interval_statements(
+    invalid_intervals: Iterable[str],
+) -> List[Executable]:
+    """Set the given era lookback intervals of the stem lookup to NULL"""
+    invalid_intervals = sorted(invalid_intervals)
+    if not invalid_intervals:
+        return []
+    return _replace_values(
+        ConceptLookupStem,
+        ConceptLookupStem.era_lookback_interval,
+        literal(None, String),
+        cast(ConceptLookupStem.era_lookback_interval, String).in_(
+            invalid_intervals
+        ),
+        REASON_ERA_LOOKBACK_INTERVAL,
+    )
@@ -49,9 +49,10 @@ def merge_cdm_table(
     session: AbstractSession,
     cdm_table: OmopCdmModelBase,
     logger: Logger = getLogger(),
-) -> None:
+) -> int:
     """
-    Merge (union) a CDM table based on a list of columns.
+    Merge (union) a CDM table based on a list of columns
+    and return the number of rows inserted.
     Skip person mapping should be used when all persons
     are the same across the different sites
     For example when they are pulled from a national registry
@@ -79,15 +80,18 @@ def merge_cdm_table(
     if is_person_from_registry and (merging_person or merging_death):
         schemas = schemas[0:1]
 
+    inserted = 0
     for schema in schemas:
         merge_sql = _sql_merge_cdm_table(schema, cdm_table, cdm_columns)
-        session.execute(merge_sql)
+        rowcount = session.execute(merge_sql).inserted
+        inserted += rowcount
         logger.debug(
             "\tIntermediate merge step. Merged %s records into %s from %s",
-            session.query(cdm_table).count(),
+            rowcount,
             cdm_table.__table__,
             schema,
         )
+    return inserted
 
 
 @clean_sql
@@ -7,6 +7,7 @@ from typing import Final, List
 from ..models.omopcdm54 import (
     ConditionOccurrence,
     Death,
+    DeltaPerson,
     DrugExposure,
     Measurement,
     Observation,
@@ -259,8 +260,40 @@ def _obs_period_ehr_sql() -> str:
 """
 
 
+def _delta_person_filter_sql() -> str:
+    return f"""
+    WHERE
+        {Person.person_id.key} IN (
+            SELECT
+                {Person.person_id.key}
+            FROM
+                {str(Person.__table__)}
+            WHERE
+                {Person.person_source_value.key} IN (
+                    SELECT
+                        {DeltaPerson.person_source_value.key}
+                    FROM
+                        {str(DeltaPerson.__table__)}
+                )
+        )
+"""
+
+
 @clean_sql
-def _insert_observation_periods_sql() -> str:
+def _insert_observation_periods_sql(incremental: bool = False) -> str:
+    periods = f"""
+    {_obs_period_registries_sql()}
+    union all
+    {_obs_period_ehr_sql()}
+"""
+    if incremental:
+        periods = f"""
+    SELECT
+        *
+    FROM
+        ({periods}) all_periods
+    {_delta_person_filter_sql()}
+"""
     return f"""
 INSERT INTO
         {TARGET_TABLENAME} (
@@ -269,9 +302,7 @@ INSERT INTO
             {ObservationPeriod.observation_period_end_date.key},
             {ObservationPeriod.period_type_concept_id.key}
 ) WITH temp_observation_period as (
-    {_obs_period_registries_sql()}
-    union all
-    {_obs_period_ehr_sql()}
+    {periods}
 ), ordered_times AS (
     SELECT person_id, observation_period_start_date AS timepoint
     FROM temp_observation_period
@@ -325,5 +356,9 @@ expanded_periods AS (
 """
 
 
-def insert_observation_periods_sql() -> str:
-    return _insert_observation_periods_sql()
+def insert_observation_periods_sql(incremental: bool = False) -> str:
+    """
+    The observation period insert. In incremental runs, only the
+    periods of the persons with new source data are inserted.
+    """
+    return _insert_observation_periods_sql(incremental)
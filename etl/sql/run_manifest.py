@@ -0,0 +1,116 @@
+"SQL for recording completed transformations to the run manifest table."
+import hashlib
+import os
+from datetime import datetime
+from typing import Dict, Final, Iterable, List, Mapping, Optional
+
+import pandas as pd
+from sqlalchemy import delete, insert, select
+
+from etl.models.modelutils import DIALECT_POSTGRES, create_tables_sql
+from etl.models.omopcdm54 import RunManifest
+from etl.models.omopcdm54.registry import TARGET_SCHEMA
+from etl.util.db import AbstractSession
+from etl.util.sql import clean_sql
+
+STATUS_COMPLETED: Final[str] = "completed"
+STATUS_FAILED: Final[str] = "failed"
+
+# Settings that change the output of a run without changing its inputs
+FINGERPRINT_ENVIRONMENT_VARIABLES: Final[List[str]] = [
+    "DEPARTMENT_SHAK_CODE",
+    "SOURCE_SCHEMA",
+    "REGISTRY_SCHEMA",
+    "TARGET_SCHEMA",
+    "INCLUDE_UNMAPPED_CODES",
+    "PERSON_FROM_REGISTRY",
+    "REGISTRY_START_DATE",
+    "REGISTRY_END_DATE",
+    "DRUG_ERA_LOOKBACK",
+    "STEM_TRANSFORMS",
+]
+
+
+@clean_sql
+def _create_sql() -> str:
+    return " ".join(
+        [
+            f"CREATE SCHEMA IF NOT EXISTS {TARGET_SCHEMA};",
+            create_tables_sql([RunManifest], dialect=DIALECT_POSTGRES),
+        ]
+    )
+
+
+SQL_CREATE_RUN_MANIFEST: Final[str] = _create_sql()
+
+
+def create_run_manifest_table(session: AbstractSession) -> None:
+    """Create the run manifest table if it does not already exist"""
+    session.execute(SQL_CREATE_RUN_MANIFEST)
+    session.commit()
+
+
+def get_completed_steps(session: AbstractSession) -> Dict[str, str]:
+    """The input fingerprint of each step completed in an earlier run"""
+    rows = session.execute(
+        select(RunManifest.step_key, RunManifest.input_fingerprint).where(
+            RunManifest.status == STATUS_COMPLETED
+        )
+    ).all()
+    return {step_key: fingerprint for step_key, fingerprint in rows}
+
+
+def log_step_to_manifest(
+    session: AbstractSession,
+    step_key: str,
+    **kwargs,
+) -> None:
+    """Replace the manifest entry of a step"""
+    session.execute(delete(RunManifest).where(RunManifest.step_key == step_key))
+    session.execute(
+        insert(RunManifest).values(
+            step_key=step_key, finish_datetime=datetime.now(), **kwargs
+        )
+    )
+
+
+def clear_steps_from_manifest(
+    session: AbstractSession, step_keys: Iterable[str]
+) -> None:
+    """Remove the manifest entries of the steps about to run"""
+    session.execute(
+        delete(RunManifest).where(RunManifest.step_key.in_(list(step_keys)))
+    )
+
+
+def run_fingerprint(
+    lookup_data: Optional[Mapping[str, pd.DataFrame]] = None,
+    environment_variables: Iterable[str] = FINGERPRINT_ENVIRONMENT_VARIABLES,
+    lookup_key: Optional[str] = None,
+) -> str:
+    """
+    Fingerprint the inputs shared by all steps of a run:
+    the lookup tables and the settings read from the environment.
+    The cache key of the validated lookup tables stands in for their data.
+    """
+    digest = hashlib.sha256()
+    if lookup_key is not None:
+        digest.update(f"lookups={lookup_key};".encode())
+    for name in environment_variables:
+        digest.update(f"{name}={os.getenv(name, '')};".encode())
+    for name, frame in sorted((lookup_data or {}).items()):
+        digest.update(name.encode())
+        digest.update(
+            pd.util.hash_pandas_object(frame, index=False).values.tobytes()
+        )
+    return digest.hexdigest()
+
+
+def step_fingerprint(
+    fingerprint: str, step_key: str, inputs: Optional[Iterable[str]]
+) -> str:
+    """Fingerprint a single step from the run fingerprint and its inputs"""
+    tables = ",".join(sorted(inputs)) if inputs is not None else "*"
+    return hashlib.sha256(
+        f"{fingerprint}|{step_key}|{tables}".encode()
+    ).hexdigest()
@@ -0,0 +1,152 @@
+"""
+The quantity recipes of the drug mappings, as a table joined to the
+administrations.
+
+Every drug mapping of the ConceptLookupStem names how the quantity of its
+administrations is computed, a column or a recipe, and how it is converted,
+a recipe or a factor. Instead of a CASE with a branch per mapping, the
+mappings are given the id of their quantity and conversion recipes and
+their factor in a small table, joined on the uid of the mapping, and only
+the few distinct recipes are CASE branches keyed by those ids.
+"""
+
+from fractions import Fraction
+from typing import Any, Dict, Hashable, Iterable, List, NamedTuple
+
+from sqlalchemy import (
+    FLOAT,
+    INT,
+    BigInteger,
+    Numeric,
+    case,
+    cast,
+    column,
+    select,
+    values,
+)
+from sqlalchemy.sql import ClauseElement
+from sqlalchemy.sql.elements import Null
+from sqlalchemy.sql.expression import Subquery, null
+
+from .conversions import get_conversion_factor
+from .recipes import get_quantity_recipe
+from .utils import get_case_statement
+
+
+class DrugRecipes(NamedTuple):
+    """
+    The recipe ids of the drug mappings, with the quantity and conversion
+    they stand for, computed from the columns of the table
+    """
+
+    table: Subquery
+    quantity: Any
+    conversion: Any
+
+
+class _Recipes:
+    """The distinct recipes, each with an id, built once per recipe"""
+
+    def __init__(self) -> None:
+        self.ids: Dict[Hashable, int] = {}
+        self.expressions: List[Any] = []
+
+    def get_id(self, key: Hashable, build: Any) -> int:
+        if key not in self.ids:
+            self.ids[key] = len(self.expressions)
+            self.expressions.append(build())
+        return self.ids[key]
+
+    def case(self, recipe_id: Any, else_: Any) -> Any:
+        if not self.expressions:
+            return else_
+        return case(
+            *(
+                (recipe_id == i, expression)
+                for i, expression in enumerate(self.expressions)
+            ),
+            else_=else_,
+        )
+
+
+def get_drug_recipes(
+    drug_mappings: Iterable[Dict[str, Any]],
+    Administrations: Any = None,
+    Prescriptions: Any = None,
+    logger: Any = None,
+) -> DrugRecipes:
+    """
+    The recipes of the given drug mappings, with their uid, drug exposure
+    type, quantity_or_value_as_number and conversion. The table is to be
+    outer joined on the uid of the ConceptLookupStem, the quantity and the
+    conversion are NULL for the rows of other mappings.
+    """
+    quantities = _Recipes()
+    conversions = _Recipes()
+    rows = []
+    for mapping in drug_mappings:
+        administration_type = mapping["drug_exposure_type"]
+        quantity_name = mapping["quantity_or_value_as_number"]
+        conversion_name = mapping["conversion"]
+
+        if str(quantity_name).startswith("recipe__"):
+            quantity_id = quantities.get_id(
+                (administration_type, quantity_name),
+                lambda: get_quantity_recipe(
+                    Administrations,
+                    Prescriptions,
+                    administration_type,
+                    quantity_name,
+                    logger,
+                ),
+            )
+        else:
+            quantity_id = quantities.get_id(
+                (None, quantity_name),
+                lambda: get_case_statement(
+                    quantity_name, Administrations, FLOAT
+                ),
+            )
+
+        conversion_id = None
+        factor = get_conversion_factor(
+            Administrations, Prescriptions, conversion_name, logger
+        )
+        if isinstance(factor, (int, float, Fraction)):
+            factor = float(factor)
+        elif isinstance(factor, ClauseElement) and not isinstance(factor, Null):
+            conversion_id = conversions.get_id(conversion_name, lambda: factor)
+            factor = None
+        else:
+            factor = None
+
+        rows.append((mapping["uid"], quantity_id, conversion_id, factor))
+
+    recipe_values = values(
+        column("uid", BigInteger),
+        column("quantity_recipe_id", INT),
+        column("conversion_recipe_id", INT),
+        column("conversion_factor", Numeric),
+        name="drug_recipe_values",
+    ).data(rows or [(None, None, None, None)])
+    # the types of columns of NULLs are not inferred from a VALUES list
+    table = select(
+        cast(recipe_values.c.uid, BigInteger).label("uid"),
+        cast(recipe_values.c.quantity_recipe_id, INT).label(
+            "quantity_recipe_id"
+        ),
+        cast(recipe_values.c.conversion_recipe_id, INT).label(
+            "conversion_recipe_id"
+        ),
+        cast(recipe_values.c.conversion_factor, FLOAT).label(
+            "conversion_factor"
+        ),
+    ).subquery("drug_recipes")
+
+    return DrugRecipes(
+        table,
+        quantities.case(table.c.quantity_recipe_id, null()),
+        conversions.case(
+            table.c.conversion_recipe_id, table.c.conversion_factor
+        ),
+    )
@@ -1,6 +1,6 @@
 """ SQL query string definition for the stem functions"""
 
-from typing import Any
+from typing import Any, List, Optional
 
 from sqlalchemy import (
     DATE,
@@ -13,19 +13,22 @@ from sqlalchemy import (
     cast,
     insert,
     literal,
-    or_,
     select,
+    union_all,
 )
 from sqlalchemy.orm import aliased
 from sqlalchemy.sql import Insert, func
 from sqlalchemy.sql.functions import concat
 
-from ...models.omopcdm54.clinical import Stem as OmopStem, VisitOccurrence
+from ...models.omopcdm54 import VisitMap
+from ...models.omopcdm54.clinical import Stem as OmopStem
 from ...models.tempmodels import ConceptLookup, ConceptLookupStem
 from ...util.db import AbstractSession
+from ...util.sql import cached_statement
 from .utils import (
     find_unique_column_names,
     get_case_statement,
+    get_source_join_conditions,
     harmonise_timezones,
     toggle_stem_transform,
 )
@@ -33,6 +36,7 @@ from .utils import (
 ASSUMED_TIMEZONE_FOR_UNMAPPED_DATA = "Europe/Copenhagen"
 
 
+@cached_statement
 def _get_mapped_nondrug_stem_insert(
     model: Any = None,
     concept_lookup_stem_cte: Any = None,
@@ -104,87 +108,70 @@ def _get_mapped_nondrug_stem_insert(
         concept_lookup_stem_cte.c.timezone,
     )
 
-    StemSelectMapped = (
-        select(
-            concept_lookup_stem_cte.c.std_code_domain.label("domain_id"),
-            VisitOccurrence.person_id,
-            cast(concept_lookup_stem_cte.c.mapped_standard_code, INT).label(
-                "concept_id"
-            ),
-            cast(start_datetime, DATE).label("start_date"),
-            start_datetime,
-            cast(end_datetime, DATE).label("end_date"),
-            end_datetime,
-            cast(concept_lookup_stem_cte.c.type_concept_id, INT),
-            VisitOccurrence.visit_occurrence_id,
-            concat(model.variable, "__", value_source_value),
-            value_source_value,
-            concept_lookup_stem_cte.c.uid,
-            (conversion * quantity_or_value_as_number).label(
-                "quantity_or_value_as_number"
-            ),
-            value_as_string.label("value_as_string"),
-            func.coalesce(
-                cast(concept_lookup_stem_cte.c.value_as_concept_id, INT),
-                value_as_concept_id_from_lookup,
-            ),
-            cast(concept_lookup_stem_cte.c.unit_concept_id, INT),
-            concept_lookup_stem_cte.c.unit_source_value,
-            concept_lookup_stem_cte.c.unit_source_concept_id,
-            cast(concept_lookup_stem_cte.c.modifier_concept_id, INT),
-            cast(concept_lookup_stem_cte.c.operator_concept_id, INT),
-            (conversion * concept_lookup_stem_cte.c.range_low).label(
-                "range_low"
-            ),
-            (conversion * concept_lookup_stem_cte.c.range_high).label(
-                "range_high"
-            ),
-            concept_lookup_stem_cte.c.stop_reason,
-            func.coalesce(
-                cast(concept_lookup_stem_cte.c.route_concept_id, INT),
-                ConceptLookupRoute.concept_id.label("route_concept_id"),
-            ),
-            concept_lookup_stem_cte.c.route_source_value,
-            literal(model.__tablename__).label("datasource"),
-        )
-        .select_from(model)
-        .join(
-            VisitOccurrence,
-            VisitOccurrence.visit_source_value
-            == concat("courseid|", model.courseid),
-        )
-        .join(
-            concept_lookup_stem_cte,
-            or_(
-                and_(
-                    concept_lookup_stem_cte.c.value_type == "categorical",
-                    func.lower(concept_lookup_stem_cte.c.source_concept_code)
-                    == func.lower(concat(model.variable, "__", model.value)),
-                    concept_lookup_stem_cte.c.datasource == model.__tablename__,
-                ),
-                and_(
-                    concept_lookup_stem_cte.c.value_type == "numerical",
-                    func.lower(concept_lookup_stem_cte.c.source_variable)
-                    == func.lower(model.variable),
-                    concept_lookup_stem_cte.c.datasource == model.__tablename__,
-                ),
+    StemColumnsMapped = [
+        concept_lookup_stem_cte.c.std_code_domain.label("domain_id"),
+        VisitMap.person_id,
+        cast(concept_lookup_stem_cte.c.mapped_standard_code, INT).label(
+            "concept_id"
+        ),
+        cast(start_datetime, DATE).label("start_date"),
+        start_datetime,
+        cast(end_datetime, DATE).label("end_date"),
+        end_datetime,
+        cast(concept_lookup_stem_cte.c.type_concept_id, INT),
+        VisitMap.visit_occurrence_id,
+        concat(model.variable, "__", value_source_value),
+        value_source_value,
+        concept_lookup_stem_cte.c.uid,
+        (conversion * quantity_or_value_as_number).label(
+            "quantity_or_value_as_number"
+        ),
+        value_as_string.label("value_as_string"),
+        func.coalesce(
+            cast(concept_lookup_stem_cte.c.value_as_concept_id, INT),
+            value_as_concept_id_from_lookup,
+        ),
+        cast(concept_lookup_stem_cte.c.unit_concept_id, INT),
+        concept_lookup_stem_cte.c.unit_source_value,
+        concept_lookup_stem_cte.c.unit_source_concept_id,
+        cast(concept_lookup_stem_cte.c.modifier_concept_id, INT),
+        cast(concept_lookup_stem_cte.c.operator_concept_id, INT),
+        (conversion * concept_lookup_stem_cte.c.range_low).label("range_low"),
+        (conversion * concept_lookup_stem_cte.c.range_high).label("range_high"),
+        concept_lookup_stem_cte.c.stop_reason,
+        func.coalesce(
+            cast(concept_lookup_stem_cte.c.route_concept_id, INT),
+            ConceptLookupRoute.concept_id.label("route_concept_id"),
+        ),
+        concept_lookup_stem_cte.c.route_source_value,
+        literal(model.__tablename__).label("datasource"),
+    ]
+
+    # the lookup rows of each join kind are joined on their own key, so
+    # that every join is a plain equality on an indexed column
+    StemRowsMapped = union_all(
+        *(
+            select(*StemColumnsMapped)
+            .select_from(model)
+            .join(
+                VisitMap,
+                VisitMap.courseid == model.courseid,
+            )
+            .join(concept_lookup_stem_cte, join_condition)
+            .outerjoin(
+                ConceptLookupRoute,
                 and_(
-                    concept_lookup_stem_cte.c.value_type == "free_text",
-                    func.lower(concept_lookup_stem_cte.c.source_variable)
-                    == func.lower(model.variable),
-                    concept_lookup_stem_cte.c.datasource == model.__tablename__,
+                    concept_lookup_stem_cte.c.route_source_value
+                    == ConceptLookupRoute.concept_string,
+                    ConceptLookupRoute.filter == "administration_route",
                 ),
-            ),
-        )
-        .outerjoin(
-            ConceptLookupRoute,
-            and_(
-                concept_lookup_stem_cte.c.route_source_value
-                == ConceptLookupRoute.concept_string,
-                ConceptLookupRoute.filter == "administration_route",
-            ),
+            )
+            for join_condition in get_source_join_conditions(
+                model, concept_lookup_stem_cte
+            )
         )
     )
+    StemSelectMapped = select(StemRowsMapped.subquery("stem_mapped"))
 
     return insert(OmopStem).from_select(
         names=[
@@ -242,8 +229,8 @@ def get_unmapped_nondrug_stem_insert(
 
     StemSelectUnmapped = (
         select(
-            VisitOccurrence.person_id,
-            VisitOccurrence.visit_occurrence_id,
+            VisitMap.person_id,
+            VisitMap.visit_occurrence_id,
             cast(start_datetime, DATE).label("start_date"),
             start_datetime,
             concat(model.variable, "__", value_source_value),
@@ -252,9 +239,8 @@ def get_unmapped_nondrug_stem_insert(
         )
         .select_from(model)
         .join(
-            VisitOccurrence,
-            VisitOccurrence.visit_source_value
-            == concat("courseid|", model.courseid),
+            VisitMap,
+            VisitMap.courseid == model.courseid,
         )
         .where(
             case(
@@ -301,22 +287,37 @@ def get_mapped_nondrug_stem_insert(
     session: AbstractSession = None,
     model: Any = None,
     concept_lookup_stem_cte: Any = None,
+    batch: Optional[List[int]] = None,
 ) -> Insert:
+    """
+    Insert the mapped rows of the given batch of the ConceptLookupStem, or
+    of all its rows of the model without a batch. The statement is only
+    built once for the same source columns, so a batch must be given as
+    the BATCH_UIDS parameter of the cte.
+    """
+    batch_lookup = (
+        select(ConceptLookupStem)
+        .where(ConceptLookupStem.uid.in_(batch))
+        .subquery()
+        .c
+        if batch is not None
+        else ConceptLookupStem
+    )
 
     unique_start_date_columns = find_unique_column_names(
-        session, model, concept_lookup_stem_cte.c, "start_date"
+        session, model, batch_lookup, "start_date"
     )
 
     unique_end_date_columns = find_unique_column_names(
-        session, model, concept_lookup_stem_cte.c, "end_date"
+        session, model, batch_lookup, "end_date"
     )
 
     unique_quantity_or_value_as_number_columns = find_unique_column_names(
-        session, model, concept_lookup_stem_cte.c, "quantity_or_value_as_number"
+        session, model, batch_lookup, "quantity_or_value_as_number"
     )
 
     unique_value_as_string_columns = find_unique_column_names(
-        session, model, concept_lookup_stem_cte.c, "value_as_string"
+        session, model, batch_lookup, "value_as_string"
     )
 
     return _get_mapped_nondrug_stem_insert(
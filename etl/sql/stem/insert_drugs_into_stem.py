@@ -6,7 +6,6 @@ from typing import Any, Final
 import pandas as pd
 from sqlalchemy import (
     DATE,
-    FLOAT,
     INT,
     TEXT,
     TIMESTAMP,
@@ -25,7 +24,8 @@ from sqlalchemy.sql import Insert, text
 from sqlalchemy.sql.expression import null
 from sqlalchemy.sql.functions import concat
 
-from ...models.omopcdm54.clinical import Stem as OmopStem, VisitOccurrence
+from ...models.omopcdm54 import VisitMap
+from ...models.omopcdm54.clinical import Stem as OmopStem
 from ...models.omopcdm54.vocabulary import (
     Concept as OmopConcept,
     ConceptRelationship as OmopConceptRelationship,
@@ -33,8 +33,7 @@ from ...models.omopcdm54.vocabulary import (
 from ...models.source import Administrations, Prescriptions
 from ...models.tempmodels import ConceptLookup, ConceptLookupStem
 from ...util.db import get_environment_variable
-from .conversions import get_conversion_factor
-from .recipes import get_quantity_recipe
+from .drug_recipes import get_drug_recipes
 from .utils import (
     find_unique_column_names,
     get_case_statement,
@@ -59,50 +58,34 @@ def get_drug_stem_insert(session: Any = None, logger: Any = None) -> Insert:
     else:
         criterion = ConceptLookupStem.datasource == "administrations"
 
-    drug_mappings = session.query(ConceptLookupStem).where(criterion).all()
-    drug_mappings = [row.__dict__ for row in drug_mappings]
-
     drugs_with_data = set(
         session.scalars(select(Administrations.drug_name).distinct())
     )
-    drugs_with_mappings = set(d["source_variable"] for d in drug_mappings)
+
+    # only the mappings of drugs with data are kept
+    drugs_with_mappings = set()
+    drug_mappings_with_data = []
+    for drug_mappings in session.stream(
+        select(
+            ConceptLookupStem.uid,
+            ConceptLookupStem.source_variable,
+            ConceptLookupStem.drug_exposure_type,
+            ConceptLookupStem.quantity_or_value_as_number,
+            ConceptLookupStem.conversion,
+        ).where(criterion)
+    ):
+        for dm in drug_mappings:
+            drugs_with_mappings.add(dm.source_variable)
+            if dm.source_variable in drugs_with_data:
+                drug_mappings_with_data.append(dm._asdict())
+
     drugs_without_mappings = set(
         d for d in drugs_with_data if d not in drugs_with_mappings
     )
 
-    drug_mappings_with_data = [
-        dm for dm in drug_mappings if dm["source_variable"] in drugs_with_data
-    ]
-
-    quantity = []
-    source_quantity = []
-    for dmwd in drug_mappings_with_data:
-        criterion = and_(
-            Administrations.drug_name == dmwd["source_variable"],
-            Administrations.administration_type == dmwd["drug_exposure_type"],
-        )
-
-        if str(dmwd["quantity_or_value_as_number"]).startswith("recipe__"):
-            this_quantity = get_quantity_recipe(
-                Administrations,
-                Prescriptions,
-                dmwd["drug_exposure_type"],
-                dmwd["quantity_or_value_as_number"],
-                logger,
-            )
-        else:
-            this_quantity = get_case_statement(
-                dmwd["quantity_or_value_as_number"],
-                Administrations,
-                FLOAT,
-            )
-
-        this_conversion_factor = get_conversion_factor(
-            Administrations, Prescriptions, dmwd["conversion"], logger
-        )
-
-        quantity.append((criterion, this_quantity * this_conversion_factor))
-        source_quantity.append((criterion, this_quantity))
+    recipes = get_drug_recipes(
+        drug_mappings_with_data, Administrations, Prescriptions, logger
+    )
 
     unique_end_datetime = find_unique_column_names(
         session, Administrations, ConceptLookupStem, "end_date"
@@ -138,7 +121,7 @@ def get_drug_stem_insert(session: Any = None, logger: Any = None) -> Insert:
     CustomMappedSelectSql = (
         select(
             ConceptLookupStem.std_code_domain.label("domain_id"),
-            VisitOccurrence.person_id,
+            VisitMap.person_id,
             cast(ConceptLookupStem.mapped_standard_code, INT).label(
                 "concept_id"
             ),
@@ -147,7 +130,7 @@ def get_drug_stem_insert(session: Any = None, logger: Any = None) -> Insert:
             cast(end_datetime, DATE).label("end_date"),
             end_datetime,
             cast(ConceptLookupStem.type_concept_id, INT),
-            VisitOccurrence.visit_occurrence_id,
+            VisitMap.visit_occurrence_id,
             concat(
                 Administrations.drug_name,
                 "__",
@@ -156,8 +139,10 @@ def get_drug_stem_insert(session: Any = None, logger: Any = None) -> Insert:
             func.coalesce(OmopConcept.concept_id, ConceptLookupStem.uid).label(
                 "source_concept_id"
             ),
-            case(*quantity, else_=null()).label("quantity_or_value_as_number"),
-            case(*source_quantity, else_=null()).label("value_source_value"),
+            (recipes.quantity * recipes.conversion).label(
+                "quantity_or_value_as_number"
+            ),
+            recipes.quantity.label("value_source_value"),
             ConceptLookup.concept_id.label("route_concept_id"),
             administration_route.label("route_source_value"),
             func.coalesce(
@@ -183,9 +168,8 @@ def get_drug_stem_insert(session: Any = None, logger: Any = None) -> Insert:
             Prescriptions.epaspresdrugatc == OmopConcept.concept_code,
         )
         .join(
-            VisitOccurrence,
-            VisitOccurrence.visit_source_value
-            == concat("courseid|", Administrations.courseid),
+            VisitMap,
+            VisitMap.courseid == Administrations.courseid,
         )
         .join(
             ConceptLookupStem,
@@ -197,6 +181,7 @@ def get_drug_stem_insert(session: Any = None, logger: Any = None) -> Insert:
             ),
             isouter=INCLUDE_UNMAPPED_CODES,
         )
+        .outerjoin(recipes.table, recipes.table.c.uid == ConceptLookupStem.uid)
         .outerjoin(
             ConceptLookup,
             and_(
@@ -260,14 +245,14 @@ def get_drug_stem_insert(session: Any = None, logger: Any = None) -> Insert:
     AutoMappedSelectSql = (
         select(
             literal("Drug").label("domain_id"),
-            VisitOccurrence.person_id,
+            VisitMap.person_id,
             OmopConceptRelationship.concept_id_2.label("concept_id"),
             cast(start_datetime, DATE).label("start_date"),
             start_datetime,
             cast(end_datetime, DATE).label("end_date"),
             end_datetime,
             literal(CONCEPT_ID_EHR).label("type_concept_id"),
-            VisitOccurrence.visit_occurrence_id,
+            VisitMap.visit_occurrence_id,
             concat(
                 Administrations.drug_name,
                 "__",
@@ -293,9 +278,8 @@ def get_drug_stem_insert(session: Any = None, logger: Any = None) -> Insert:
         )
         .select_from(Administrations)
         .join(
-            VisitOccurrence,
-            VisitOccurrence.visit_source_value
-            == concat("courseid|", Administrations.courseid),
+            VisitMap,
+            VisitMap.courseid == Administrations.courseid,
         )
         .join(
             Prescriptions,
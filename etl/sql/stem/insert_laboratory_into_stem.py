@@ -19,10 +19,11 @@ from sqlalchemy import (
 )
 from sqlalchemy.sql import Insert, func
 from sqlalchemy.sql.expression import null
-from sqlalchemy.sql.functions import concat
 
-from ...models.omopcdm54.clinical import Person as OmopPerson, Stem as OmopStem
+from ...models.omopcdm54 import PersonMap
+from ...models.omopcdm54.clinical import Stem as OmopStem
 from ...models.tempmodels import ConceptLookup, ConceptLookupStem
+from .join_keys import lab_test_id_key
 from .utils import (
     find_unique_column_names,
     get_case_statement,
@@ -84,7 +85,7 @@ def get_laboratory_stem_insert(
     StemSelectMeasurement = (
         select(
             ConceptLookupStem.std_code_domain.label("domain_id"),
-            OmopPerson.person_id,
+            PersonMap.person_id,
             cast(ConceptLookupStem.mapped_standard_code, INT).label(
                 "concept_id"
             ),
@@ -112,14 +113,14 @@ def get_laboratory_stem_insert(
         )
         .select_from(model)
         .join(
-            OmopPerson,
-            OmopPerson.person_source_value == concat("cpr_enc|", model.cpr_enc),
+            PersonMap,
+            PersonMap.cpr_enc == model.cpr_enc,
         )
         .join(
             ConceptLookupStem,
             and_(
                 func.lower(ConceptLookupStem.source_variable)
-                == func.lower(model.lab_test_id),
+                == lab_test_id_key(model),
                 ConceptLookupStem.datasource == model.__tablename__,
             ),
             isouter=os.getenv("INCLUDE_UNMAPPED_CODES", "TRUE") == "TRUE",
@@ -143,7 +144,7 @@ def get_laboratory_stem_insert(
     StemSelectSpecimen = (
         select(
             literal_column("'Specimen'").label("domain_id"),
-            OmopPerson.person_id,
+            PersonMap.person_id,
             ConceptLookup.concept_id,
             cast(start_datetime, DATE).label("start_date"),
             start_datetime,
@@ -166,14 +167,14 @@ def get_laboratory_stem_insert(
         )
         .select_from(model)
         .join(
-            OmopPerson,
-            OmopPerson.person_source_value == concat("cpr_enc|", model.cpr_enc),
+            PersonMap,
+            PersonMap.cpr_enc == model.cpr_enc,
         )
         .join(
             ConceptLookupStem,
             and_(
                 func.lower(ConceptLookupStem.source_variable)
-                == func.lower(model.lab_test_id),
+                == lab_test_id_key(model),
                 ConceptLookupStem.datasource == model.__tablename__,
             ),
             isouter=os.getenv("INCLUDE_UNMAPPED_CODES", "TRUE") == "TRUE",
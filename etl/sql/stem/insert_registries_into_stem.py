@@ -17,13 +17,14 @@ from sqlalchemy import (
     select,
 )
 from sqlalchemy.sql import Insert, func
-from sqlalchemy.sql.functions import concat
 
-from ...models.omopcdm54.clinical import Person as OmopPerson, Stem as OmopStem
+from ...models.omopcdm54 import PersonMap
+from ...models.omopcdm54.clinical import Stem as OmopStem
 from ...models.omopcdm54.vocabulary import Concept, ConceptRelationship
 from ...models.tempmodels import ConceptLookupStem
 from ...sql.observation_period import CONCEPT_ID_REGISTRY
 from ...util.db import get_environment_variable as get_era_lookback_interval
+from .join_keys import sks_code_key
 from .utils import (
     find_unique_column_names,
     get_case_statement,
@@ -68,7 +69,7 @@ def get_registry_stem_insert(session: Any = None, model: Any = None) -> Insert:
                 ConceptLookupStem.std_code_domain,
                 Concept.domain_id,
             ).label("domain_id"),
-            OmopPerson.person_id,
+            PersonMap.person_id,
             func.coalesce(
                 cast(ConceptLookupStem.mapped_standard_code, INT),
                 ConceptRelationship.concept_id_2,
@@ -91,15 +92,15 @@ def get_registry_stem_insert(session: Any = None, model: Any = None) -> Insert:
         )
         .select_from(model)
         .join(
-            OmopPerson,
-            OmopPerson.person_source_value == concat("cpr_enc|", model.cpr_enc),
+            PersonMap,
+            PersonMap.cpr_enc == model.cpr_enc,
         )
         .join(
             ConceptLookupStem,
             and_(
                 ConceptLookupStem.value_type == "categorical",
                 func.lower(ConceptLookupStem.source_variable)
-                == func.lower(model.sks_code),
+                == sks_code_key(model),
                 ConceptLookupStem.datasource == model.__tablename__,
             ),
             isouter=True,
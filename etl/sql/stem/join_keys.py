@@ -0,0 +1,87 @@
+"""
+SQL for the normalized join keys of the mapping of the sources to the Stem.
+
+The sources are joined to the ConceptLookupStem on lower cased variables
+and values. The keys of the source rows are not materialized, as the source
+tables are not owned by the ETL. Instead, on PostgreSQL, each key is indexed
+as an expression on its source table, so that the mapping joins can look
+the source rows up by key, and the tables are left as they are loaded.
+"""
+
+from typing import Any, Callable, Dict, Final, List, Optional
+
+from sqlalchemy import String, cast, func
+from sqlalchemy.sql import ColumnElement
+
+from ...models.modelutils import DIALECT_POSTGRES
+from ...models.source import (
+    CourseMetadata,
+    DiagnosesProcedures,
+    LabkaBccLaboratory,
+    LprDiagnoses,
+    LprOperations,
+    LprProcedures,
+    Observations,
+)
+
+
+def variable_key(model: Any) -> ColumnElement:
+    """The key of the source rows of a model joined on their variable"""
+    return func.lower(model.variable)
+
+
+def variable_value_key(model: Any) -> ColumnElement:
+    """
+    The key of the source rows of a model joined on their variable and
+    value. The value is cast, as an index expression cannot call concat().
+    """
+    return func.lower(
+        model.variable + "__" + func.coalesce(cast(model.value, String), "")
+    )
+
+
+def lab_test_id_key(model: Any) -> ColumnElement:
+    """The key of the laboratory rows joined on their test id"""
+    return func.lower(model.lab_test_id)
+
+
+def sks_code_key(model: Any) -> ColumnElement:
+    """The key of the registry rows joined on their SKS code"""
+    return func.lower(model.sks_code)
+
+
+# The keys each source model is joined on
+JOIN_KEYS: Final[Dict[Any, List[Callable[[Any], ColumnElement]]]] = {
+    CourseMetadata: [variable_key, variable_value_key],
+    DiagnosesProcedures: [variable_key, variable_value_key],
+    Observations: [variable_key, variable_value_key],
+    LabkaBccLaboratory: [lab_test_id_key],
+    **{
+        model: [sks_code_key]
+        for model in (LprDiagnoses, LprProcedures, LprOperations)
+    },
+}
+
+
+def get_join_key_index_statements(
+    models: List[Any], schema: Optional[str] = None
+) -> List[str]:
+    """
+    Index the join keys of the given source models as expressions on their
+    tables, unless already indexed, in the given schema instead of theirs
+    if any. The statements are for PostgreSQL.
+    """
+    statements = []
+    for model in models:
+        table = f"{schema or model.__table__.schema}.{model.__tablename__}"
+        for key in JOIN_KEYS[model]:
+            expression = key(model).compile(
+                dialect=DIALECT_POSTGRES,
+                compile_kwargs={"include_table": False, "literal_binds": True},
+            )
+            statements.append(
+                "CREATE INDEX IF NOT EXISTS "
+                f"ix_{model.__tablename__}_{key.__name__} "
+                f"ON {table} (({expression}));"
+            )
+    return statements
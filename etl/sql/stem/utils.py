@@ -3,7 +3,7 @@
 import inspect
 import os
 from itertools import batched, chain
-from typing import Any, List, Union
+from typing import Any, Dict, Final, Iterator, List, Union
 
 from sqlalchemy import (
     FLOAT,
@@ -11,6 +11,7 @@ from sqlalchemy import (
     DateTime,
     String,
     and_,
+    bindparam,
     case,
     cast,
     func,
@@ -24,9 +25,94 @@ from sqlalchemy.sql.expression import CTE, Case
 from ...models.source import SourceModelBase
 from ...models.tempmodels import ConceptLookupStem
 from ...util.db import AbstractSession
+from ...util.sql import cached_statement
+from .join_keys import variable_key, variable_value_key
 
 CDM_TIMEZONE: str = "Europe/Copenhagen"
 
+# The bound parameter with the uids of a batch of the ConceptLookupStem
+BATCH_UIDS: Final[str] = "batch_uids"
+
+# What the source rows are joined on for each value type of the
+# ConceptLookupStem: their variable and value, or their variable alone
+JOIN_KIND_CATEGORICAL: Final[str] = "categorical"
+JOIN_KIND_VARIABLE: Final[str] = "variable"
+STEM_JOIN_KINDS: Final[Dict[str, str]] = {
+    "categorical": JOIN_KIND_CATEGORICAL,
+    "numerical": JOIN_KIND_VARIABLE,
+    "free_text": JOIN_KIND_VARIABLE,
+}
+
+# The columns of the ConceptLookupStem naming the source column to read
+STEM_NAMED_COLUMNS: Final[List[str]] = [
+    "start_date",
+    "end_date",
+    "quantity_or_value_as_number",
+    "value_as_string",
+]
+
+
+@cached_statement
+def get_concept_lookup_stem_cte(
+    model: SourceModelBase, batched: bool = False
+) -> CTE:
+    """
+    The rows of the ConceptLookupStem of a source model, with the kind and
+    the key of the join to its source rows, so that the rows of each kind
+    are joined with an equality on the keys. If batched, only the rows
+    with the uids given as the BATCH_UIDS parameter.
+    """
+    join_kind = case(
+        *(
+            (ConceptLookupStem.value_type == value_type, kind)
+            for value_type, kind in STEM_JOIN_KINDS.items()
+        )
+    )
+    join_key = func.lower(
+        case(
+            (
+                ConceptLookupStem.value_type == "categorical",
+                ConceptLookupStem.source_concept_code,
+            ),
+            else_=ConceptLookupStem.source_variable,
+        )
+    )
+    stmt = select(
+        ConceptLookupStem,
+        join_kind.label("join_kind"),
+        join_key.label("join_key"),
+    ).where(
+        ConceptLookupStem.datasource == model.__tablename__,
+        ConceptLookupStem.value_type.in_(list(STEM_JOIN_KINDS)),
+    )
+    if not batched:
+        return stmt.cte(name="cls")
+    return stmt.where(
+        ConceptLookupStem.uid.in_(bindparam(BATCH_UIDS, expanding=True))
+    ).cte(name="cls_batch")
+
+
+def get_source_join_conditions(
+    model: SourceModelBase, concept_lookup_stem_cte: CTE
+) -> List[Any]:
+    """
+    The conditions joining the source rows of a model to the rows of
+    get_concept_lookup_stem_cte, one per join kind. Each is an equality on
+    a key indexed on the source table, the rows joined on each to be
+    combined with UNION ALL.
+    """
+    source_keys = {
+        JOIN_KIND_CATEGORICAL: variable_value_key(model),
+        JOIN_KIND_VARIABLE: variable_key(model),
+    }
+    return [
+        and_(
+            concept_lookup_stem_cte.c.join_kind == join_kind,
+            concept_lookup_stem_cte.c.join_key == source_key,
+        )
+        for join_kind, source_key in source_keys.items()
+    ]
+
 
 def validate_source_variables(
     session: AbstractSession, model: Any, logger: Any
@@ -41,7 +127,7 @@ def validate_source_variables(
     else:
         return
 
-    missing_vars = session.scalars(
+    missing_vars = (
         select(ConceptLookupStem.source_variable)
         .outerjoin(
             model,
@@ -54,24 +140,77 @@ def validate_source_variables(
             )
         )
         .distinct()
-    ).all()
+    )
 
-    missing_vars_batches = batched(missing_vars, 2)
-    for vars_to_print in missing_vars_batches:
+    for vars_to_print in session.stream(missing_vars, chunk_size=2):
         logger.debug(
             "\tMISSING %s source data variables: %s...",
             model.__tablename__.upper(),
-            vars_to_print,
+            tuple(var for var, in vars_to_print),
         )
 
 
+def get_source_rows_per_uid(
+    model: SourceModelBase, session: AbstractSession
+) -> Dict[int, int]:
+    """
+    Estimate the number of source rows of each uid of the ConceptLookupStem
+    of a model as the number of rows of its source variable, counted in a
+    single grouped scan of the source.
+    """
+    variable_rows = (
+        select(
+            variable_key(model).label("variable_key"),
+            func.count().label("n_rows"),
+        )
+        .group_by(variable_key(model))
+        .subquery()
+    )
+    rows = session.execute(
+        select(
+            ConceptLookupStem.uid,
+            func.coalesce(variable_rows.c.n_rows, 0),
+        )
+        .outerjoin(
+            variable_rows,
+            func.lower(ConceptLookupStem.source_variable)
+            == variable_rows.c.variable_key,
+        )
+        .where(ConceptLookupStem.datasource == model.__tablename__)
+    ).all()
+    return {uid: n_rows for uid, n_rows in rows}
+
+
+def _batched_by_rows(
+    uids: List[int], rows_per_uid: Dict[int, int], batch_rows: int
+) -> Iterator[List[int]]:
+    batch: List[int] = []
+    n_rows = 0
+    for uid in uids:
+        uid_rows = rows_per_uid.get(uid, 0)
+        if batch and n_rows + uid_rows > batch_rows:
+            yield batch
+            batch, n_rows = [], 0
+        batch.append(uid)
+        n_rows += uid_rows
+    if batch:
+        yield batch
+
+
 def get_batches_from_concept_loopkup_stem(
     model: SourceModelBase,
     session: AbstractSession,
     batch_size: int = None,
     logger: Any = None,
-) -> List[int]:
-    """Get batches from the ConceptLookupStem table"""
+    batch_rows: int = None,
+) -> Iterator[List[int]]:
+    """
+    Get batches of uids from the ConceptLookupStem table, to be given as
+    the BATCH_UIDS parameter of a statement on a batched
+    get_concept_lookup_stem_cte. With batch_rows, the batches are sized
+    to hold about that many source rows each, otherwise batch_size uids.
+    Without either, all the uids are a single batch.
+    """
     uids = session.scalars(
         select(ConceptLookupStem.uid).where(
             ConceptLookupStem.datasource == model.__tablename__
@@ -84,8 +223,14 @@ def get_batches_from_concept_loopkup_stem(
             model.__tablename__.upper(),
         )
 
-    batch_size = batch_size or len(uids)
-    batches = list(batched(uids, batch_size))
+    if batch_rows:
+        batches = list(
+            _batched_by_rows(
+                uids, get_source_rows_per_uid(model, session), batch_rows
+            )
+        )
+    else:
+        batches = [list(b) for b in batched(uids, batch_size or len(uids) or 1)]
     total_batches = sum(len(batch) for batch in batches if batch)
 
     for batch_count, batch in enumerate(batches):
@@ -95,9 +240,7 @@ def get_batches_from_concept_loopkup_stem(
             total_batches,
             batch,
         )
-        yield select(ConceptLookupStem).where(
-            ConceptLookupStem.uid.in_(batch)
-        ).cte(name="cls_batch")
+        yield batch
 
 
 def try_cast_to_float(
@@ -172,6 +315,39 @@ def get_case_statement(
     return exp
 
 
+def split_batches_by_column_names(
+    model: SourceModelBase,
+    session: AbstractSession,
+    batches: List[List[int]],
+) -> List[List[int]]:
+    """
+    Split the batches of uids of a model so that the ConceptLookupStem rows
+    of each batch name a single source column for each of the columns a
+    mapped insert reads by name, as find_unique_column_names requires. The
+    batches are left as they are if the model names a single column each.
+    """
+    rows = session.execute(
+        select(
+            ConceptLookupStem.uid,
+            *(getattr(ConceptLookupStem, name) for name in STEM_NAMED_COLUMNS),
+        ).where(ConceptLookupStem.datasource == model.__tablename__)
+    ).all()
+    if all(
+        len({row[i] for row in rows} - {None}) <= 1
+        for i in range(1, len(STEM_NAMED_COLUMNS) + 1)
+    ):
+        return batches
+
+    column_names = {row[0]: tuple(row[1:]) for row in rows}
+    split: List[List[int]] = []
+    for batch in batches:
+        groups: Dict[Any, List[int]] = {}
+        for uid in batch:
+            groups.setdefault(column_names.get(uid), []).append(uid)
+        split.extend(groups.values())
+    return split
+
+
 def find_unique_column_names(
     session: Any = None,
     model: Any = None,
@@ -0,0 +1,96 @@
+"""
+SQL for the fan-out of the Stem table into the clinical domain tables.
+
+The Stem is read once into a table holding only the rows which can go to
+a domain table, ordered by domain. The domain inserts then read their own
+contiguous slice of that table instead of each scanning the whole Stem.
+The table is dropped once the domain tables are filled.
+"""
+
+from typing import Final, List
+
+from sqlalchemy import MetaData, Table, and_, insert, or_, select
+from sqlalchemy.sql import Insert
+from sqlalchemy.sql.schema import Column
+from sqlalchemy.sql.visitors import replacement_traverse
+
+from ..models.omopcdm54.clinical import Stem as OmopStem
+from ..util.sql import clean_sql
+
+# The domains with a table filled from the Stem
+FANOUT_DOMAINS: Final[List[str]] = [
+    "Condition",
+    "Procedure",
+    "Measurement",
+    "Drug",
+    "Observation",
+    "Device",
+    "Specimen",
+]
+
+StemFanout: Final[Table] = OmopStem.__table__.to_metadata(
+    MetaData(), name="stem_fanout"
+)
+
+
+@clean_sql
+def _create_sql() -> str:
+    return f"""
+    DROP TABLE IF EXISTS {StemFanout};
+    CREATE TABLE {StemFanout} AS SELECT * FROM {OmopStem.__table__} LIMIT 0;
+    """
+
+
+SQL_CREATE_STEM_FANOUT: Final[str] = _create_sql()
+
+
+@clean_sql
+def _index_sql() -> str:
+    # the rows are written ordered by domain, so a block range index finds
+    # the slice of a domain at a fraction of the size of a B-tree index
+    return f"""
+    CREATE INDEX IF NOT EXISTS {StemFanout.name}_domain_id_brin
+        ON {StemFanout} USING brin ({OmopStem.domain_id.key});
+    ANALYZE {StemFanout};
+    """
+
+
+# Postgres only, DuckDB skips the row groups of other domains by itself
+SQL_INDEX_STEM_FANOUT: Final[str] = _index_sql()
+
+SQL_DROP_STEM_FANOUT: Final[str] = f"DROP TABLE IF EXISTS {StemFanout};"
+
+# The conditions shared by all domain inserts
+StemFanoutInsert: Final[Insert] = insert(StemFanout).from_select(
+    names=[c.key for c in OmopStem.__table__.columns],
+    select=select(*OmopStem.__table__.columns)
+    .where(
+        and_(
+            OmopStem.domain_id.in_(FANOUT_DOMAINS),
+            OmopStem.concept_id.is_not(None),
+            OmopStem.type_concept_id.is_not(None),
+            or_(
+                OmopStem.start_date.is_not(None),
+                OmopStem.end_date.is_not(None),
+            ),
+        )
+    )
+    .order_by(OmopStem.domain_id),
+)
+
+
+def from_stem_fanout(stmt: Insert) -> Insert:
+    """Make an INSERT ... SELECT from the Stem read from the fan-out instead"""
+
+    def _replace(element):
+        if element is OmopStem.__table__:
+            return StemFanout
+        if isinstance(element, Column) and element.table is OmopStem.__table__:
+            return StemFanout.c[element.key]
+        return None
+
+    # pylint: disable=protected-access
+    return insert(stmt.table).from_select(
+        stmt._select_names,
+        replacement_traverse(stmt.select, {}, _replace),
+    )
@@ -0,0 +1,138 @@
+"""
+SQL for storing the Stem table as physical partitions.
+
+With STEM_PARTITIONING=TRUE, the Stem is created on Postgres as a table
+partitioned by domain_id, with each domain partitioned by datasource.
+Filters on either column then only read the matching partitions, and a
+partition can be truncated or dropped on its own.
+"""
+
+from typing import Final, List, Optional
+
+from sqlalchemy import Column, MetaData, Table
+from sqlalchemy.schema import CreateTable
+
+from ..models.modelutils import DIALECT_POSTGRES
+from ..models.omopcdm54.clinical import Stem as OmopStem
+from ..models.source import (
+    CourseMetadata,
+    DiagnosesProcedures,
+    LabkaBccLaboratory,
+    LprDiagnoses,
+    LprOperations,
+    LprProcedures,
+    Observations,
+)
+from ..util.db import AbstractSession, get_environment_variable
+from ..util.sql import clean_sql
+from .stem_fanout import FANOUT_DOMAINS
+
+STEM_PARTITIONING: Final[bool] = (
+    get_environment_variable("STEM_PARTITIONING", "FALSE") == "TRUE"
+)
+
+# The datasources with their own partition, other (drug) datasources go
+# to the default partition of the domain
+STEM_PARTITION_DATASOURCES: Final[List[str]] = [
+    model.__tablename__
+    for model in [
+        CourseMetadata,
+        DiagnosesProcedures,
+        Observations,
+        LprDiagnoses,
+        LprProcedures,
+        LprOperations,
+        LabkaBccLaboratory,
+    ]
+]
+DEFAULT_PARTITION: Final[str] = "other"
+
+
+def use_stem_partitions(session: AbstractSession) -> bool:
+    """True if the Stem is to be partitioned, only supported on Postgres"""
+    if not STEM_PARTITIONING or not hasattr(session, "connection"):
+        return False
+    return session.connection().dialect.name == DIALECT_POSTGRES.name
+
+
+def stem_partition_name(
+    domain_id: Optional[str] = None, datasource: Optional[str] = None
+) -> str:
+    """
+    The fully qualified name of the partition of the Stem holding the
+    given domain (and datasource). None is the default partition.
+    """
+    parts = [
+        OmopStem.__tablename__,
+        (domain_id or DEFAULT_PARTITION).lower(),
+    ]
+    if datasource is not None:
+        parts.append(datasource.lower())
+    return f"{OmopStem.metadata.schema}.{'_'.join(parts)}"
+
+
+def _partitioned_stem_table() -> Table:
+    # the primary key of a partitioned table must hold the partition keys,
+    # which can be null, so the partitioned Stem has none
+    return Table(
+        OmopStem.__tablename__,
+        MetaData(),
+        *[
+            Column(
+                c.name,
+                c.type,
+                nullable=c.nullable,
+                server_default=(
+                    c.server_default.arg if c.server_default else None
+                ),
+            )
+            for c in OmopStem.__table__.columns
+        ],
+        schema=OmopStem.metadata.schema,
+        postgresql_partition_by=f"LIST ({OmopStem.domain_id.key})",
+    )
+
+
+@clean_sql
+def create_partitioned_stem_sql() -> str:
+    """Create the Stem partitioned by domain_id, then datasource"""
+    sql = [
+        f"CREATE SEQUENCE IF NOT EXISTS "
+        f"{OmopStem.metadata.schema}_{OmopStem.__tablename__}_id_seq;",
+        str(
+            CreateTable(_partitioned_stem_table()).compile(
+                dialect=DIALECT_POSTGRES
+            )
+        )
+        + ";",
+    ]
+    for domain_id in FANOUT_DOMAINS + [None]:
+        domain_partition = stem_partition_name(domain_id)
+        bounds = f"FOR VALUES IN ('{domain_id}')" if domain_id else "DEFAULT"
+        sql.append(
+            f"""CREATE TABLE {domain_partition}
+            PARTITION OF {OmopStem.__table__} {bounds}
+            PARTITION BY LIST ({OmopStem.datasource.key});"""
+        )
+        for datasource in STEM_PARTITION_DATASOURCES:
+            sql.append(
+                f"""CREATE TABLE {stem_partition_name(domain_id, datasource)}
+                PARTITION OF {domain_partition}
+                FOR VALUES IN ('{datasource}');"""
+            )
+        sql.append(
+            f"""CREATE TABLE {stem_partition_name(domain_id, DEFAULT_PARTITION)}
+            PARTITION OF {domain_partition} DEFAULT;"""
+        )
+    return " ".join(sql)
+
+
+def truncate_stem_partition(
+    session: AbstractSession,
+    domain_id: Optional[str] = None,
+    datasource: Optional[str] = None,
+) -> None:
+    """Delete all rows of one partition of the Stem"""
+    session.execute(
+        f"TRUNCATE TABLE {stem_partition_name(domain_id, datasource)};"
+    )
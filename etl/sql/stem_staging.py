@@ -0,0 +1,74 @@
+"""
+SQL for building the Stem table in parallel.
+
+Every insert into the Stem writes to a staging table of its own, so the
+inserts can run concurrently on their own connections. The staging tables
+are then appended to the Stem in a single ordered insert, which assigns
+the stem ids in bulk.
+"""
+
+from typing import Final, List
+
+from sqlalchemy import MetaData, Table, insert, literal, select, union_all
+from sqlalchemy.sql import Insert
+
+from ..models.omopcdm54.clinical import Stem as OmopStem
+from ..util.sql import clean_sql
+
+# The columns of the Stem which are staged, the stem id is assigned later
+STAGED_COLUMNS: Final[List[str]] = [
+    c.key for c in OmopStem.__table__.columns if c.key != OmopStem.stem_id.key
+]
+
+
+def stem_staging_table(index: int) -> Table:
+    """The staging table of the insert at the given index"""
+    return OmopStem.__table__.to_metadata(
+        MetaData(), name=f"{OmopStem.__tablename__}_staging_{index}"
+    )
+
+
+@clean_sql
+def create_stem_staging_sql(tables: List[Table]) -> str:
+    """Create empty staging tables, with the columns of the Stem"""
+    return " ".join(
+        f"DROP TABLE IF EXISTS {table}; "
+        f"CREATE TABLE {table} AS SELECT * FROM {OmopStem.__table__} LIMIT 0;"
+        for table in tables
+    )
+
+
+@clean_sql
+def drop_stem_staging_sql(tables: List[Table]) -> str:
+    """Drop the staging tables"""
+    return " ".join(f"DROP TABLE IF EXISTS {table};" for table in tables)
+
+
+def to_stem_staging(stmt: Insert, table: Table) -> Insert:
+    """Make an INSERT ... SELECT into the Stem insert into a staging table"""
+    # pylint: disable=protected-access
+    return insert(table).from_select(
+        stmt._select_names, stmt.select, include_defaults=False
+    )
+
+
+def get_stem_append_insert(tables: List[Table]) -> Insert:
+    """
+    Append the rows of the staging tables to the Stem, in the order of the
+    tables, in a single insert
+    """
+    staged = union_all(
+        *(
+            select(
+                *(table.c[key] for key in STAGED_COLUMNS),
+                literal(index).label("staging_order"),
+            )
+            for index, table in enumerate(tables)
+        )
+    ).subquery()
+    return insert(OmopStem).from_select(
+        STAGED_COLUMNS,
+        select(*(staged.c[key] for key in STAGED_COLUMNS)).order_by(
+            staged.c.staging_order
+        ),
+    )
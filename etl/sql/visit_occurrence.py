@@ -19,14 +19,15 @@ from sqlalchemy.sql.expression import Case
 from sqlalchemy.sql.functions import concat, count
 
 from ..csv.lookups import SHAK_LOOKUP_DF, get_concept_lookup_dict
+from ..models.omopcdm54 import PersonMap
 from ..models.omopcdm54.clinical import (
     CareSite as OmopCareSite,
-    Person as OmopPerson,
     VisitOccurrence as OmopVisitOccurrence,
 )
 from ..models.source import CourseIdCprMapping, CourseMetadata
 from ..models.tempmodels import ConceptLookup
 from ..sql.care_site import get_department_info
+from ..util.sql import cached_statement
 
 CONCEPT_ID_EHR: Final[int] = 32817
 cl1 = aliased(ConceptLookup)
@@ -89,20 +90,17 @@ CourseIdMapped = (
         metadata_subquery_alias.c.dischdt,
         metadata_subquery_alias.c.transfromid,
         metadata_subquery_alias.c.chkouttoid,
-        OmopPerson.person_id,
+        PersonMap.person_id,
     )
     .join(
         metadata_subquery_alias,
         metadata_subquery_alias.c.courseid == CourseIdCprMapping.courseid,
     )
-    .join(
-        OmopPerson,
-        concat("cpr_enc|", CourseIdCprMapping.cpr_enc)
-        == OmopPerson.person_source_value,
-    )
+    .join(PersonMap, PersonMap.cpr_enc == CourseIdCprMapping.cpr_enc)
 )
 
 
+@cached_statement
 def get_visit_occurrence_select(shak_code: str) -> Select:
     department_info = get_department_info(
         SHAK_LOOKUP_DF, shak_code, "department_type"
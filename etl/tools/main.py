@@ -7,17 +7,19 @@ from argparse import ArgumentParser
 from pathlib import Path
 from typing import Any, Final
 
+from etl.governor import ResourceGovernor
 from etl.loader import CSVFileLoader
 from etl.models.tempmodels import TEMP_MODELS
 from etl.process import run_etl
 from etl.util.connection import get_connection_details
 from etl.util.db import (
+    EngineOptions,
     is_db_connected,
     make_db_session,
-    make_engine_duckdb,
-    make_engine_postgres,
+    make_engine,
 )
 from etl.util.exceptions import DBConnectionException
+from etl.util.explain import PlanCapture
 from etl.util.files import load_config_from_file
 from etl.util.logger import set_logger_verbosity
 
@@ -57,7 +59,8 @@ def process_args() -> Any:
         dest="mem_limit",
         required=False,
         default="150gb",
-        help="Str with the max amount of memory for the DB.",
+        help="Str with the max amount of memory for the DB, shared "
+        "between the transformations running at the same time.",
     )
     parser.add_argument(
         "-t",
@@ -67,6 +70,55 @@ def process_args() -> Any:
         default=40,
         help="Number of threads to use for the DB.",
     )
+    parser.add_argument(
+        "--temp_dir",
+        dest="temp_dir",
+        required=False,
+        default=None,
+        help="Directory DuckDB spills to when over the memory limit.",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        dest="workers",
+        required=False,
+        default=1,
+        help="Number of independent transformations to run concurrently, "
+        "each on its own connection. Requires a file-based or server DB.",
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--resume",
+        dest="resume",
+        required=False,
+        action="store_true",
+        help="Skip the transformations completed in the previous run "
+        "and only rerun the failed ones and those depending on them.",
+    )
+    mode.add_argument(
+        "--incremental",
+        dest="incremental",
+        required=False,
+        action="store_true",
+        help="Only process the persons with source data added since the "
+        "last successful run, keeping the rest of the OMOP tables.",
+    )
+    parser.add_argument(
+        "--explain",
+        dest="explain",
+        required=False,
+        action="store_true",
+        help="Write the query plan of every statement to a report "
+        "directory next to the log.",
+    )
+    parser.add_argument(
+        "--analyze",
+        dest="analyze",
+        required=False,
+        action="store_true",
+        help="Like --explain, but with the timings and actual rows of "
+        "EXPLAIN ANALYZE. Row counts are then not logged.",
+    )
     args = parser.parse_args()
     return args
 
@@ -88,13 +140,15 @@ def main() -> None:
     set_logger_verbosity(logger, verbosity)
 
     logger.info("Connecting to database...")
-    engine = None
-    if cnxn.dbms == "postgresql":
-        engine = make_engine_postgres(cnxn, implicit_returning=False)
-    elif cnxn.dbms == "duckdb":
-        engine = make_engine_duckdb(
-            cnxn, memory_limit=args.mem_limit, threads=args.num_threads
-        )
+    engine = make_engine(
+        cnxn,
+        EngineOptions.for_workers(
+            args.workers,
+            memory_limit=args.mem_limit,
+            threads=int(args.num_threads),
+            temp_directory=args.temp_dir,
+        ),
+    )
 
     if not is_db_connected(engine):
         raise DBConnectionException(
@@ -109,6 +163,16 @@ def main() -> None:
                 Path(csv_dir), TEMP_MODELS, delimiter=";"
             ),
             reload_vocab=reload_vocab,
+            workers=int(args.workers),
+            session_factory=lambda: make_db_session(engine),
+            resume=args.resume,
+            incremental=args.incremental,
+            governor=ResourceGovernor(args.mem_limit, int(args.num_threads)),
+            plan_capture=(
+                PlanCapture(analyze=args.analyze)
+                if args.explain or args.analyze
+                else None
+            ),
         )
     except KeyboardInterrupt:
         print("\n")
@@ -116,6 +180,8 @@ def main() -> None:
     # Exceptions will be logged
     except:  # noqa: E722
         logger.critical("Uncaught exception: %s", traceback.format_exc())
+    finally:
+        engine.dispose()
 
 
 if __name__ == "__main__":
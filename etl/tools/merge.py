@@ -8,12 +8,13 @@ from typing import Any, Final
 from etl.process import run_merge
 from etl.util.connection import get_connection_details
 from etl.util.db import (
+    EngineOptions,
     is_db_connected,
     make_db_session,
-    make_engine_duckdb,
-    make_engine_postgres,
+    make_engine,
 )
 from etl.util.exceptions import DBConnectionException
+from etl.util.explain import PlanCapture
 from etl.util.files import load_config_from_file
 from etl.util.logger import set_logger_verbosity
 
@@ -39,6 +40,31 @@ def process_args() -> Any:
         help="The verbosity level",
         choices=["DEBUG", "INFO", "WARNING", "ERROR"],
     )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        dest="workers",
+        required=False,
+        default=1,
+        help="Number of independent transformations to run concurrently, "
+        "each on its own connection. Requires a file-based or server DB.",
+    )
+    parser.add_argument(
+        "--explain",
+        dest="explain",
+        required=False,
+        action="store_true",
+        help="Write the query plan of every statement to a report "
+        "directory next to the log.",
+    )
+    parser.add_argument(
+        "--analyze",
+        dest="analyze",
+        required=False,
+        action="store_true",
+        help="Like --explain, but with the timings and actual rows of "
+        "EXPLAIN ANALYZE. Row counts are then not logged.",
+    )
     args = parser.parse_args()
     return args
 
@@ -58,15 +84,7 @@ def main() -> None:
     set_logger_verbosity(logger, verbosity)
 
     logger.info("Connecting to database...")
-    engine = None
-    if cnxn.dbms == "postgresql":
-        engine = make_engine_postgres(cnxn, implicit_returning=False)
-    elif cnxn.dbms == "duckdb":
-        engine = make_engine_duckdb(cnxn)
-    else:
-        raise DBConnectionException(
-            f"Unsupported DBMS: {cnxn.dbms}. Please use 'postgresql' or 'duckdb'."
-        )
+    engine = make_engine(cnxn, EngineOptions.for_workers(args.workers))
 
     if not is_db_connected(engine):
         raise DBConnectionException(
@@ -75,13 +93,24 @@ def main() -> None:
 
     try:
         session = make_db_session(engine)
-        run_merge(session)
+        run_merge(
+            session,
+            workers=int(args.workers),
+            session_factory=lambda: make_db_session(engine),
+            plan_capture=(
+                PlanCapture(analyze=args.analyze)
+                if args.explain or args.analyze
+                else None
+            ),
+        )
     except KeyboardInterrupt:
         print("\n")
         logger.error("KeyboardInterrupt detected, exiting.")
     # Exceptions will be logged
     except:  # noqa: E722
         logger.critical("Uncaught exception: %s", traceback.format_exc())
+    finally:
+        engine.dispose()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,399 @@
+"""
+Program to run the ETL for several sites concurrently, followed by the merge.
+
+The schemas and department of a run are read from the environment when the
+etl models are imported, so every site runs in a new process with its own
+environment, and nothing importing the models is imported at module level.
+"""
+
+import logging
+import os
+import sys
+import traceback
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Dict, Final, List, NamedTuple, Optional
+
+from etl.util.connection import get_connection_details
+from etl.util.db import (
+    EngineOptions,
+    is_db_connected,
+    make_db_session,
+    make_engine,
+)
+from etl.util.exceptions import DBConnectionException
+from etl.util.files import load_config_from_file
+from etl.util.logger import set_logger_verbosity
+from etl.util.memory import parse_memory_size
+
+DESCRIPTION: Final[str] = (
+    "Execute the Rigshospitalet ETL for several sites, then merge them."
+)
+
+logger = logging.getLogger("ETL")
+
+
+class SiteConfig(NamedTuple):
+    """The configuration of the ETL of one site"""
+
+    name: str
+    department_shak_code: str
+    source_schema: str
+    target_schema: str
+    environment: Dict[str, str] = {}
+
+    def get_environment(self) -> Dict[str, str]:
+        """The environment variables of the ETL of this site"""
+        return {
+            **self.environment,
+            "DEPARTMENT_SHAK_CODE": self.department_shak_code,
+            "SOURCE_SCHEMA": self.source_schema,
+            "TARGET_SCHEMA": self.target_schema,
+        }
+
+
+class RunOptions(NamedTuple):
+    """The options shared by the ETL of all sites and the merge"""
+
+    conn_config: Dict[str, Any]
+    verbosity: str = "INFO"
+    mem_limit: str = "10gb"
+    num_threads: int = 4
+    workers: int = 1
+
+
+def get_site_configs(config: Any) -> List[SiteConfig]:
+    """
+    Read the site configurations, a list of objects with a
+    department_shak_code, source_schema, target_schema, an optional
+    name and optional environment variables.
+    """
+    sites = config["sites"] if isinstance(config, dict) else config
+    configs = [
+        SiteConfig(
+            name=site.get("name", site["target_schema"]),
+            department_shak_code=str(site["department_shak_code"]),
+            source_schema=site["source_schema"],
+            target_schema=site["target_schema"],
+            environment={
+                k: str(v) for k, v in site.get("environment", {}).items()
+            },
+        )
+        for site in sites
+    ]
+    target_schemas = [c.target_schema for c in configs]
+    if len(set(target_schemas)) != len(target_schemas):
+        raise ValueError("Every site must have its own target schema.")
+    return configs
+
+
+def get_concurrent_sites(
+    n_sites: int,
+    max_sites: int,
+    memory_budget: str,
+    site_memory: str,
+    dbms: str,
+) -> int:
+    """
+    The number of sites to run at the same time, limited by the memory
+    budget. A DuckDB database only allows a single writing process.
+    """
+    if dbms == "duckdb":
+        return 1
+    within_budget = parse_memory_size(memory_budget) // parse_memory_size(
+        site_memory
+    )
+    return max(1, min(n_sites, max_sites, within_budget))
+
+
+def _make_engine(options: RunOptions) -> Any:
+    engine = make_engine(
+        get_connection_details(options.conn_config),
+        EngineOptions.for_workers(
+            options.workers,
+            memory_limit=options.mem_limit,
+            threads=options.num_threads,
+        ),
+    )
+    if not is_db_connected(engine):
+        raise DBConnectionException(
+            "Cannot connect to the database, please check configuration."
+        )
+    return engine
+
+
+def _lookup_loader() -> Any:
+    # pylint: disable=import-outside-toplevel
+    from etl.loader import CSVFileLoader
+    from etl.models.tempmodels import TEMP_MODELS
+
+    return CSVFileLoader(
+        Path(__file__).parent.parent.absolute() / "csv",
+        TEMP_MODELS,
+        delimiter=";",
+    )
+
+
+def prepare_shared_tables(sites: List[SiteConfig], options: RunOptions) -> bool:
+    """
+    Prepare the lookup tables and the join key indexes of the sources of
+    all sites, in a new process, before the sites run. The sites share the
+    lookup and registry schemas, so they only read what is prepared here.
+    """
+    set_logger_verbosity(logger, options.verbosity)
+
+    # pylint: disable=import-outside-toplevel
+    from etl.process import prepare_lookup_tables
+    from etl.transform.stem import prepare_join_keys
+
+    logger.info("Preparing the lookup tables and join keys of all sites...")
+    try:
+        engine = _make_engine(options)
+        session = make_db_session(engine)
+        prepare_lookup_tables(session, _lookup_loader(), reload_vocab=False)
+        for site in sites:
+            prepare_join_keys(
+                session,
+                source_schema=site.source_schema,
+                registry_schema=site.environment.get("REGISTRY_SCHEMA"),
+            )
+    except Exception:  # pylint: disable=broad-except
+        logger.critical(
+            "Preparing the shared tables failed: %s", traceback.format_exc()
+        )
+        return False
+    return True
+
+
+def run_site(site: SiteConfig, options: RunOptions) -> bool:
+    """Run the ETL of one site, in a new process. True if it succeeded."""
+    os.environ.update(site.get_environment())
+    set_logger_verbosity(logger, options.verbosity)
+
+    # pylint: disable=import-outside-toplevel
+    from etl.governor import ResourceGovernor
+    from etl.process import run_etl
+
+    logger.info("Site %s: starting the ETL...", site.name)
+    try:
+        engine = _make_engine(options)
+        run_etl(
+            make_db_session(engine),
+            lookup_loader=_lookup_loader(),
+            reload_vocab=False,
+            workers=options.workers,
+            session_factory=lambda: make_db_session(engine),
+            governor=ResourceGovernor(options.mem_limit, options.num_threads),
+            prepare_shared=False,
+        )
+    except Exception:  # pylint: disable=broad-except
+        logger.critical(
+            "Site %s: ETL failed: %s", site.name, traceback.format_exc()
+        )
+        return False
+    logger.info("Site %s: ETL completed", site.name)
+    return True
+
+
+def run_merge_of_sites(
+    merge_schema: str, sites: List[SiteConfig], options: RunOptions
+) -> bool:
+    """Merge the target schemas of the sites, in a new process"""
+    os.environ["TARGET_SCHEMA"] = merge_schema
+    os.environ["MERGE_SOURCE_SCHEMAS"] = ",".join(
+        site.target_schema for site in sites
+    )
+    set_logger_verbosity(logger, options.verbosity)
+
+    # pylint: disable=import-outside-toplevel
+    from etl.governor import ResourceGovernor
+    from etl.process import run_merge
+
+    logger.info("Merging %s site(s) into %s...", len(sites), merge_schema)
+    try:
+        engine = _make_engine(options)
+        run_merge(
+            make_db_session(engine),
+            workers=options.workers,
+            session_factory=lambda: make_db_session(engine),
+            governor=ResourceGovernor(options.mem_limit, options.num_threads),
+        )
+    except Exception:  # pylint: disable=broad-except
+        logger.critical("Merge failed: %s", traceback.format_exc())
+        return False
+    return True
+
+
+def run_sites(
+    sites: List[SiteConfig],
+    options: RunOptions,
+    concurrent_sites: int,
+    merge_schema: Optional[str] = None,
+) -> bool:
+    """
+    Run the ETL of all sites, at most concurrent_sites at the same time,
+    each in a new process, once the tables they share are prepared. When
+    all sites succeed and a merge schema is given, their target schemas
+    are merged into it.
+    """
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=get_context("spawn")
+    ) as executor:
+        if not executor.submit(prepare_shared_tables, sites, options).result():
+            return False
+
+    logger.info(
+        "Running the ETL of %s site(s), %s at a time",
+        len(sites),
+        concurrent_sites,
+    )
+    failed = []
+    # a new process per site, as the models read the schemas on import
+    with ProcessPoolExecutor(
+        max_workers=concurrent_sites,
+        mp_context=get_context("spawn"),
+        max_tasks_per_child=1,
+    ) as executor:
+        futures = {
+            executor.submit(run_site, site, options): site for site in sites
+        }
+        for future in as_completed(futures):
+            if not future.result():
+                failed.append(futures[future].name)
+
+    if failed:
+        logger.error(
+            "The ETL failed for site(s) %s, skipping the merge.",
+            ", ".join(sorted(failed)),
+        )
+        return False
+    if merge_schema is None:
+        return True
+
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=get_context("spawn")
+    ) as executor:
+        return executor.submit(
+            run_merge_of_sites, merge_schema, sites, options
+        ).result()
+
+
+def process_args() -> Any:
+    parser = ArgumentParser(description=DESCRIPTION)
+    parser.add_argument(
+        "-c",
+        "--conn_file",
+        dest="conn_file",
+        required=False,
+        default="connection.json",
+        help="The target database connection details.",
+    )
+    parser.add_argument(
+        "-s",
+        "--sites_file",
+        dest="sites_file",
+        required=False,
+        default="sites.json",
+        help="A JSON file with the department_shak_code, source_schema "
+        "and target_schema of every site.",
+    )
+    parser.add_argument(
+        "--merge_schema",
+        dest="merge_schema",
+        required=False,
+        default=None,
+        help="The schema to merge the sites into once all have completed. "
+        "If not given, the sites are not merged.",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbosity",
+        dest="verbosity_level",
+        required=False,
+        default="INFO",
+        help="The verbosity level",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+    )
+    parser.add_argument(
+        "-m",
+        "--memory_budget",
+        dest="memory_budget",
+        required=False,
+        default="150gb",
+        help="Str with the amount of memory for all sites together.",
+    )
+    parser.add_argument(
+        "--site_memory",
+        dest="site_memory",
+        required=False,
+        default="30gb",
+        help="Str with the max amount of memory for the ETL of one site.",
+    )
+    parser.add_argument(
+        "-p",
+        "--parallel_sites",
+        dest="parallel_sites",
+        required=False,
+        default=4,
+        help="Maximum number of sites to run at the same time.",
+    )
+    parser.add_argument(
+        "-t",
+        "--threads",
+        dest="num_threads",
+        required=False,
+        default=8,
+        help="Number of threads to use for the DB, per site.",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        dest="workers",
+        required=False,
+        default=1,
+        help="Number of independent transformations to run concurrently "
+        "within a site, each on its own connection.",
+    )
+    args = parser.parse_args()
+    return args
+
+
+def main() -> None:
+    """
+    Main entrypoint for running the ETL of several sites and the merge
+    """
+    args = process_args()
+    set_logger_verbosity(logger, args.verbosity_level)
+
+    conn_config = load_config_from_file(args.conn_file)
+    sites = get_site_configs(load_config_from_file(args.sites_file))
+    options = RunOptions(
+        conn_config=conn_config,
+        verbosity=args.verbosity_level,
+        mem_limit=args.site_memory,
+        num_threads=int(args.num_threads),
+        workers=int(args.workers),
+    )
+    concurrent_sites = get_concurrent_sites(
+        len(sites),
+        int(args.parallel_sites),
+        args.memory_budget,
+        args.site_memory,
+        get_connection_details(conn_config).dbms,
+    )
+
+    try:
+        succeeded = run_sites(
+            sites, options, concurrent_sites, merge_schema=args.merge_schema
+        )
+    except KeyboardInterrupt:
+        print("\n")
+        logger.error("KeyboardInterrupt detected, exiting.")
+        succeeded = False
+    sys.exit(0 if succeeded else 1)
+
+
+if __name__ == "__main__":
+    main()
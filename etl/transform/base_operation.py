@@ -1,28 +1,70 @@
 """The base transformation operation"""
 
-from typing import Any, Optional
+from typing import Any, FrozenSet, Iterable, Optional, Union
 
-from ..sql.cdm_summary import with_log_to_summary_table
+from ..sql.cdm_summary import SummaryBuffer, with_log_to_summary_table
 from ..util.logger import Logger
 
 
+def table_names(
+    tables: Optional[Iterable[Union[str, Any]]],
+) -> Optional[FrozenSet[str]]:
+    """
+    Normalise a collection of models (or fully qualified table names)
+    to a set of fully qualified table names. None means undeclared.
+    """
+    if tables is None:
+        return None
+    return frozenset(
+        t if isinstance(t, str) else str(t.__table__) for t in tables
+    )
+
+
 class BaseOperation:
     """The base transformation operation. It is essentially a Functor.
-    All transformations should inherit from this."""
+    All transformations should inherit from this.
+
+    An operation can declare the tables it reads (inputs) and the tables it
+    writes (outputs). Operations that do not declare both are treated as
+    barriers by the scheduler and never run concurrently with anything else.
+
+    An operation can also declare its footprint, the share of the memory
+    budget of the run it is expected to need, between 0 and 1.
+
+    The metrics of the operation are added to the summary buffer of the run
+    it is part of, if any.
+    """
 
     def __init__(
         self,
         key: str,
         description: Optional[str] = "",
+        inputs: Optional[Iterable[Union[str, Any]]] = None,
+        outputs: Optional[Iterable[Union[str, Any]]] = None,
+        footprint: Optional[float] = None,
     ) -> None:
         self.key = key
         self.description = description
+        self.inputs = table_names(inputs)
+        self.outputs = table_names(outputs)
+        self.footprint = footprint
+        self.has_failed = False
+        self.summary: Optional[SummaryBuffer] = None
+
+    @property
+    def is_declared(self) -> bool:
+        """True if both the inputs and outputs of the operation are known"""
+        return self.inputs is not None and self.outputs is not None
 
     @Logger
     @with_log_to_summary_table
     def __call__(self, *args, **kwargs) -> Any:
         """Execute the operation"""
-        return self._run(*args, **kwargs)
+        # errors are logged rather than raised, so keep track of them here
+        self.has_failed = True
+        result = self._run(*args, **kwargs)
+        self.has_failed = False
+        return result
 
     def _run(self, *args, **kwargs) -> Any:
         """To be implemented in extensions"""
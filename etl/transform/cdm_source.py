@@ -10,6 +10,7 @@ from ..util.dates import todays_date
 from ..util.db import (
     AbstractSession,
     DataBaseWriterBuilder,
+    FrameDataBaseWriter,
     get_environment_variable,
 )
 
@@ -78,5 +79,9 @@ def transform(session: AbstractSession) -> None:
     output_df = pd.Series(cdm_source_data).to_frame().T
 
     # write to session
-    writer = DataBaseWriterBuilder().build().set_source(TARGET, output_df)
+    writer = (
+        DataBaseWriterBuilder(FrameDataBaseWriter)
+        .build()
+        .set_source(TARGET, output_df)
+    )
     writer.write(session)
@@ -6,16 +6,20 @@ from ..models.omopcdm54.standardized_derived_elements import (
     ConditionEra as OmopConditionEra,
 )
 from ..sql.condition_era import get_condition_era_insert
-from ..util.db import AbstractSession
+from ..util.db import AbstractSession, count_rows
+from .transformutils import execute_insert
 
 logger = logging.getLogger("ETL.ConditionEra")
 
 
-def transform(session: AbstractSession) -> None:
+def transform(session: AbstractSession, incremental: bool = False) -> int:
     """Run the Condition era transformation"""
     logger.info("Starting the condition era transformation... ")
-    session.execute(get_condition_era_insert(session))
+    result = execute_insert(
+        session, get_condition_era_insert(session), incremental
+    )
     logger.info(
         "Condition era Transformation complete! %s rows included",
-        session.query(OmopConditionEra).count(),
+        count_rows(session, result.inserted, OmopConditionEra),
     )
+    return result.inserted
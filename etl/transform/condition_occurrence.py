@@ -6,16 +6,22 @@ from ..models.omopcdm54.clinical import (
     ConditionOccurrence as OmopConditionOccurrence,
 )
 from ..sql.condition_occurrence import ConditionOccurrenceInsert
-from ..util.db import AbstractSession
+from ..util.db import AbstractSession, count_rows
+from .transformutils import execute_insert
 
 logger = logging.getLogger("ETL.ConditionOccurrence")
 
 
-def transform(session: AbstractSession) -> None:
+def transform(
+    session: AbstractSession, incremental: bool = False, fanout: bool = False
+) -> int:
     """Run the Condition occurrence transformation"""
     logger.info("Starting the Condition occurrence transformation... ")
-    session.execute(ConditionOccurrenceInsert)
+    result = execute_insert(
+        session, ConditionOccurrenceInsert, incremental, fanout
+    )
     logger.info(
         "Condition occurrence Transformation complete! %s rows included",
-        session.query(OmopConditionOccurrence).count(),
+        count_rows(session, result.inserted, OmopConditionOccurrence),
     )
+    return result.inserted
@@ -1,21 +1,38 @@
 """Create the tables needed for the ETL"""
 
 import logging
+from typing import List, Optional
 
-from ..sql.create_omopcdm_tables import SQL, get_models_in_scope
+from ..models.omopcdm54 import OmopCdmModelBase, Stem
+from ..sql.create_omopcdm_tables import get_ddl_sql, get_models_in_scope
+from ..sql.stem_partitions import STEM_PARTITIONING, use_stem_partitions
 from ..util.db import AbstractSession
 from .transformutils import execute_sql_transform
 
 logger = logging.getLogger("ETL.Core")
 
 
-def transform(session: AbstractSession) -> None:
-    """Create the OMOP CDM tables"""
-    models_in_scope = get_models_in_scope()
+def transform(
+    session: AbstractSession,
+    models: Optional[List[OmopCdmModelBase]] = None,  # type: ignore
+) -> None:
+    """
+    Create the OMOP CDM tables.
+    If models are given, only those tables are dropped and recreated.
+    """
+    models_in_scope = get_models_in_scope() if models is None else models
     logger.info("Creating OMOP CDM tables in DB...")
     for m in models_in_scope:
         logger.debug(
             "\tCreating table step %s: %s", m.__step__, m.__tablename__
         )
-    execute_sql_transform(session, SQL)
+    partition_stem = Stem in models_in_scope and use_stem_partitions(session)
+    if STEM_PARTITIONING and Stem in models_in_scope and not partition_stem:
+        logger.warning(
+            "STEM_PARTITIONING is only supported on Postgres, "
+            "the Stem is created as a single table."
+        )
+    if partition_stem:
+        logger.info("Creating the Stem partitioned by domain and datasource")
+    execute_sql_transform(session, get_ddl_sql(models, partition_stem))
     logger.info("OMOP CDM tables created successfully!")
@@ -3,17 +3,23 @@
 import logging
 
 from ..sql.death import DEATH_EXCLUDED, DEATH_INSERT, DEATH_UPLOADED
-from ..util.db import AbstractSession
+from ..util.db import LOG_FULL_COUNTS, AbstractSession
+from .transformutils import execute_insert
 
 logger = logging.getLogger("ETL.Death")
 
 
-def transform(session: AbstractSession) -> None:
+def transform(session: AbstractSession, incremental: bool = False) -> int:
     """Run the Death transformation"""
     logger.info("Starting the Death transformation... ")
-    session.execute(DEATH_INSERT)
+    result = execute_insert(session, DEATH_INSERT, incremental)
     count_excluded = session.query(DEATH_EXCLUDED).scalar()
-    count_uploaded = session.query(DEATH_UPLOADED).scalar()
+    count_uploaded = (
+        session.query(DEATH_UPLOADED).scalar()
+        if LOG_FULL_COUNTS
+        else result.inserted
+    )
     logger.info("Death transformation finished successfully.")
     logger.info("Death: %d rows were uploaded.", count_uploaded)
     logger.info("Death: %d rows were excluded.", count_excluded)
+    return result.inserted
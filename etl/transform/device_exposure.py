@@ -4,16 +4,20 @@ import logging
 
 from ..models.omopcdm54.clinical import DeviceExposure as OmopDeviceExposure
 from ..sql.device_exposure import DeviceExposureInsert
-from ..util.db import AbstractSession
+from ..util.db import AbstractSession, count_rows
+from .transformutils import execute_insert
 
 logger = logging.getLogger("ETL.DeviceExposure")
 
 
-def transform(session: AbstractSession) -> None:
+def transform(
+    session: AbstractSession, incremental: bool = False, fanout: bool = False
+) -> int:
     """Run the device exposure transformation"""
     logger.info("Starting the device exposure transformation... ")
-    session.execute(DeviceExposureInsert)
+    result = execute_insert(session, DeviceExposureInsert, incremental, fanout)
     logger.info(
         "Device exposure Transformation complete! %s rows included",
-        session.query(OmopDeviceExposure).count(),
+        count_rows(session, result.inserted, OmopDeviceExposure),
     )
+    return result.inserted
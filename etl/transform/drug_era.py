@@ -5,25 +5,37 @@ import logging
 from ..models.omopcdm54.standardized_derived_elements import (
     DrugEra as OmopDrugEra,
 )
-from ..sql.drug_era import get_ingredient_era_insert, get_ingredients_with_data
-from ..util.db import AbstractSession
+from ..sql.drug_era import (
+    INGREDIENT_CONCEPT_ID,
+    get_ingredient_era_insert,
+    get_ingredients_with_data,
+)
+from ..util.db import AbstractSession, count_rows
+from .transformutils import execute_insert
 
 logger = logging.getLogger("ETL.DrugEra")
 
 
-def transform(session: AbstractSession) -> None:
+def transform(session: AbstractSession, incremental: bool = False) -> int:
     """Run the Drug era transformation"""
     logger.info("Starting the drug era transformation... ")
 
+    inserted = 0
     ingredients = get_ingredients_with_data(session)
     for concept_id, ingredient_name in ingredients:
         logger.debug(
             "  Processing drug era for ingredient  %s...",
             ingredient_name,
         )
-        session.execute(get_ingredient_era_insert(session, concept_id))
+        inserted += execute_insert(
+            session,
+            get_ingredient_era_insert(),
+            incremental,
+            parameters={INGREDIENT_CONCEPT_ID: concept_id},
+        ).inserted
 
     logger.info(
         "Drug era Transformation complete! %s rows included",
-        session.query(OmopDrugEra).count(),
+        count_rows(session, inserted, OmopDrugEra),
     )
+    return inserted
@@ -4,16 +4,20 @@ import logging
 
 from ..models.omopcdm54.clinical import DrugExposure as OmopDrugExposure
 from ..sql.drug_exposure import DrugExposureInsert
-from ..util.db import AbstractSession
+from ..util.db import AbstractSession, count_rows
+from .transformutils import execute_insert
 
 logger = logging.getLogger("ETL.DrugExposure")
 
 
-def transform(session: AbstractSession) -> None:
+def transform(
+    session: AbstractSession, incremental: bool = False, fanout: bool = False
+) -> int:
     """Run the Drug exposure transformation"""
     logger.info("Starting the drug exposure transformation... ")
-    session.execute(DrugExposureInsert)
+    result = execute_insert(session, DrugExposureInsert, incremental, fanout)
     logger.info(
         "Drug exposure Transformation complete! %s rows included",
-        session.query(OmopDrugExposure).count(),
+        count_rows(session, result.inserted, OmopDrugExposure),
     )
+    return result.inserted
@@ -0,0 +1,26 @@
+"""Prepare the OMOP tables for an incremental run"""
+
+import logging
+
+from ..models.modelutils import DIALECT_POSTGRES, create_tables_sql
+from ..sql.create_omopcdm_tables import SQL_CREATE_SCHEMA, get_models_in_scope
+from ..sql.incremental import purge_delta_persons
+from ..util.db import AbstractSession
+from .transformutils import execute_sql_transform
+
+logger = logging.getLogger("ETL.Core")
+
+
+def transform(session: AbstractSession) -> None:
+    """
+    Create the OMOP CDM tables that do not exist yet and delete
+    the rows of the persons with new source data.
+    """
+    logger.info("Preparing OMOP CDM tables for an incremental run...")
+    execute_sql_transform(
+        session,
+        SQL_CREATE_SCHEMA
+        + create_tables_sql(get_models_in_scope(), dialect=DIALECT_POSTGRES),
+    )
+    purge_delta_persons(session)
+    logger.info("OMOP CDM tables prepared successfully!")
@@ -4,16 +4,20 @@ import logging
 
 from ..models.omopcdm54.clinical import Measurement as OmopMeasurement
 from ..sql.measurement import MeasurementInsert
-from ..util.db import AbstractSession
+from ..util.db import AbstractSession, count_rows
+from .transformutils import execute_insert
 
 logger = logging.getLogger("ETL.Measurement")
 
 
-def transform(session: AbstractSession) -> None:
+def transform(
+    session: AbstractSession, incremental: bool = False, fanout: bool = False
+) -> int:
     """Run the Measurement transformation"""
     logger.info("Starting the measurement transformation... ")
-    session.execute(MeasurementInsert)
+    result = execute_insert(session, MeasurementInsert, incremental, fanout)
     logger.info(
         "Measurement Transformation complete! %s rows included",
-        session.query(OmopMeasurement).count(),
+        count_rows(session, result.inserted, OmopMeasurement),
     )
+    return result.inserted
@@ -5,18 +5,19 @@ import logging
 from ...models.omopcdm54.health_systems import CareSite
 from ...sql.merge.care_site import add_location_to_care_site
 from ...sql.merge.mergeutils import merge_cdm_table
-from ...util.db import AbstractSession
+from ...util.db import AbstractSession, count_rows
 
 logger = logging.getLogger("ETL.Merge.CareSite")
 
 
-def transform(session: AbstractSession) -> None:
+def transform(session: AbstractSession) -> int:
     """Run the Merge location transformation"""
     logger.info("Starting the care site transformation... ")
 
-    merge_cdm_table(session, CareSite, logger)
+    inserted = merge_cdm_table(session, CareSite, logger)
     session.execute(add_location_to_care_site())
     logger.info(
         "Merge Care Site Transformation complete! %s CareSite(s) included",
-        session.query(CareSite).count(),
+        count_rows(session, inserted, CareSite),
     )
+    return inserted
@@ -5,7 +5,7 @@ import logging
 from etl.sql.merge.mergeutils import _unite_intervals_sql, merge_cdm_table
 
 from ...models.omopcdm54.standardized_derived_elements import ConditionEra
-from ...util.db import AbstractSession
+from ...util.db import LOG_FULL_COUNTS, AbstractSession, count_rows
 
 logger = logging.getLogger("ETL.Merge.DrugEra")
 
@@ -29,16 +29,21 @@ def transform(session: AbstractSession) -> None:
     """Run the Merge Condition era transformation"""
     logger.info("Starting the Condition Era merge transformation... ")
 
-    merge_cdm_table(session, ConditionEra, logger)
+    inserted = merge_cdm_table(session, ConditionEra, logger)
 
     logger.info(
         "Merge Condition Era Transformation. Initial %s Era(s) included ...",
-        session.query(ConditionEra).count(),
+        count_rows(session, inserted, ConditionEra),
     )
 
     unite_intervals(session)
 
-    logger.info(
-        "Merge Condition Era unite overlapping periods. Transformation complete! %s Era(s) included",
-        session.query(ConditionEra).count(),
-    )
+    if LOG_FULL_COUNTS:
+        logger.info(
+            "Merge Condition Era unite overlapping periods. Transformation complete! %s Era(s) included",
+            session.query(ConditionEra).count(),
+        )
+    else:
+        logger.info(
+            "Merge Condition Era unite overlapping periods. Transformation complete!"
+        )
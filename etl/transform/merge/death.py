@@ -5,16 +5,16 @@ import logging
 from etl.sql.merge.mergeutils import drop_duplicate_rows, merge_cdm_table
 
 from ...models.omopcdm54.clinical import Death
-from ...util.db import AbstractSession
+from ...util.db import AbstractSession, count_rows
 
 logger = logging.getLogger("ETL.Merge.Death")
 
 
-def transform(session: AbstractSession) -> None:
+def transform(session: AbstractSession) -> int:
     """Run the Merge location transformation"""
     logger.info("Starting the Death merge transformation... ")
 
-    merge_cdm_table(
+    inserted = merge_cdm_table(
         session,
         Death,
         logger,
@@ -22,15 +22,16 @@ def transform(session: AbstractSession) -> None:
 
     logger.info(
         "Merge Death Transformation. Initial %s Death(s) included ...",
-        session.query(Death).count(),
+        count_rows(session, inserted, Death),
     )
 
     # pylint: disable=no-member
-    session.execute(
+    inserted -= session.execute(
         drop_duplicate_rows(Death, Death.person_id.key, Death.death_id.key)
-    )
+    ).deleted
 
     logger.info(
         "Merge Death Removed duplicates. Transformation complete! %s Death(s) included",
-        session.query(Death).count(),
+        count_rows(session, inserted, Death),
     )
+    return inserted
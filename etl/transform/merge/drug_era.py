@@ -5,7 +5,7 @@ import logging
 from etl.sql.merge.mergeutils import _unite_intervals_sql, merge_cdm_table
 
 from ...models.omopcdm54.standardized_derived_elements import DrugEra
-from ...util.db import AbstractSession
+from ...util.db import LOG_FULL_COUNTS, AbstractSession, count_rows
 
 logger = logging.getLogger("ETL.Merge.DrugEra")
 
@@ -30,16 +30,21 @@ def transform(session: AbstractSession) -> None:
     """Run the Merge Drug era transformation"""
     logger.info("Starting the Drug Era merge transformation... ")
 
-    merge_cdm_table(session, DrugEra, logger)
+    inserted = merge_cdm_table(session, DrugEra, logger)
 
     logger.info(
         "Merge Drug Era Transformation. Initial %s Era(s) included ...",
-        session.query(DrugEra).count(),
+        count_rows(session, inserted, DrugEra),
     )
 
     unite_intervals(session)
 
-    logger.info(
-        "Merge Drug Era unite overlapping periods. Transformation complete! %s Era(s) included",
-        session.query(DrugEra).count(),
-    )
+    if LOG_FULL_COUNTS:
+        logger.info(
+            "Merge Drug Era unite overlapping periods. Transformation complete! %s Era(s) included",
+            session.query(DrugEra).count(),
+        )
+    else:
+        logger.info(
+            "Merge Drug Era unite overlapping periods. Transformation complete!"
+        )
@@ -5,7 +5,7 @@ import logging
 from etl.sql.merge.mergeutils import _unite_intervals_sql, merge_cdm_table
 
 from ...models.omopcdm54.clinical import ObservationPeriod
-from ...util.db import AbstractSession
+from ...util.db import LOG_FULL_COUNTS, AbstractSession, count_rows
 
 logger = logging.getLogger("ETL.Merge.ObservationPeriod")
 
@@ -29,16 +29,21 @@ def transform(session: AbstractSession) -> None:
     """Run the Merge Observation period transformation"""
     logger.info("Starting the Observation Period merge transformation... ")
 
-    merge_cdm_table(session, ObservationPeriod, logger)
+    inserted = merge_cdm_table(session, ObservationPeriod, logger)
 
     logger.info(
         "Merge Observation Period Transformation. Initial %s Periods(s) included ...",
-        session.query(ObservationPeriod).count(),
+        count_rows(session, inserted, ObservationPeriod),
     )
 
     unite_intervals(session)
 
-    logger.info(
-        "Merge Observation Period unite overlapping periods. Transformation complete! %s Period(s) included",
-        session.query(ObservationPeriod).count(),
-    )
+    if LOG_FULL_COUNTS:
+        logger.info(
+            "Merge Observation Period unite overlapping periods. Transformation complete! %s Period(s) included",
+            session.query(ObservationPeriod).count(),
+        )
+    else:
+        logger.info(
+            "Merge Observation Period unite overlapping periods. Transformation complete!"
+        )
@@ -4,26 +4,27 @@ import logging
 
 from ...models.omopcdm54.clinical import Person
 from ...sql.merge.mergeutils import drop_duplicate_rows, merge_cdm_table
-from ...util.db import AbstractSession
+from ...util.db import AbstractSession, count_rows
 
 logger = logging.getLogger("ETL.Merge.Person")
 
 
-def transform(session: AbstractSession) -> None:
+def transform(session: AbstractSession) -> int:
     """Run the Merge Person transformation"""
     logger.info("Starting the Person transformation... ")
 
-    merge_cdm_table(session, Person, logger)
+    inserted = merge_cdm_table(session, Person, logger)
     logger.info(
         "Merge Person Transformation with duplicates! %s Person(s) included",
-        session.query(Person).count(),
+        count_rows(session, inserted, Person),
     )
-    session.execute(
+    inserted -= session.execute(
         drop_duplicate_rows(
             Person, Person.person_source_value.key, Person.person_id.key
         )
-    )
+    ).deleted
     logger.info(
         "Merge Person Transformation complete! %s Person(s) included",
-        session.query(Person).count(),
+        count_rows(session, inserted, Person),
     )
+    return inserted
@@ -4,16 +4,20 @@ import logging
 
 from ..models.omopcdm54.clinical import Observation as OmopObservation
 from ..sql.observation import ObservationInsert
-from ..util.db import AbstractSession
+from ..util.db import AbstractSession, count_rows
+from .transformutils import execute_insert
 
 logger = logging.getLogger("ETL.Observation")
 
 
-def transform(session: AbstractSession) -> None:
+def transform(
+    session: AbstractSession, incremental: bool = False, fanout: bool = False
+) -> int:
     """Run the Observation transformation"""
     logger.info("Starting the Observation transformation... ")
-    session.execute(ObservationInsert)
+    result = execute_insert(session, ObservationInsert, incremental, fanout)
     logger.info(
         "Observation Transformation complete! %s rows included",
-        session.query(OmopObservation).count(),
+        count_rows(session, result.inserted, OmopObservation),
     )
+    return result.inserted
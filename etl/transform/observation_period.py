@@ -2,32 +2,51 @@
 
 import logging
 
+from sqlalchemy import func, select
+
 from ..models.omopcdm54.clinical import ObservationPeriod
 from ..sql.observation_period import (
     CONCEPT_ID_EHR,
     CONCEPT_ID_REGISTRY,
     insert_observation_periods_sql,
 )
-from ..util.db import AbstractSession
+from ..util.db import LOG_FULL_COUNTS, AbstractSession
 from .transformutils import execute_sql_transform
 
 logger = logging.getLogger("ETL.ObservationPeriod")
 
 
-def transform(session: AbstractSession) -> None:
+def transform(session: AbstractSession, incremental: bool = False) -> int:
     """Create the ObservationPeriod tables"""
     logger.info("Creating ObservationPeriod table in DB for EHR... ")
-    execute_sql_transform(session, insert_observation_periods_sql())
-    logger.info("ObservationPeriod Transform complete!")
-    logger.info(
-        "ObservationPeriod Transform: %s rows included from EHR.",
-        session.query(ObservationPeriod)
-        .where(ObservationPeriod.period_type_concept_id == CONCEPT_ID_EHR)
-        .count(),
+    result = execute_sql_transform(
+        session, insert_observation_periods_sql(incremental)
     )
+    logger.info("ObservationPeriod Transform complete!")
     logger.info(
-        "ObservationPeriod Transform: %s rows included from Registry.",
-        session.query(ObservationPeriod)
-        .where(ObservationPeriod.period_type_concept_id == CONCEPT_ID_REGISTRY)
-        .count(),
+        "ObservationPeriod Transform: %s rows included.", result.inserted
     )
+    if LOG_FULL_COUNTS:
+        # counted in a single scan, on the uncommitted periods
+        counts = dict(
+            session.execute(
+                select(ObservationPeriod.period_type_concept_id, func.count())
+                .where(
+                    ObservationPeriod.period_type_concept_id.in_(
+                        [CONCEPT_ID_EHR, CONCEPT_ID_REGISTRY]
+                    )
+                )
+                .group_by(ObservationPeriod.period_type_concept_id)
+            ).all()
+        )
+        count_ehr = counts.get(CONCEPT_ID_EHR, 0)
+        count_registry = counts.get(CONCEPT_ID_REGISTRY, 0)
+        logger.info(
+            "ObservationPeriod Transform: %s rows included from EHR.",
+            count_ehr,
+        )
+        logger.info(
+            "ObservationPeriod Transform: %s rows included from Registry.",
+            count_registry,
+        )
+    return result.inserted
@@ -3,17 +3,24 @@
 import logging
 
 from ..models.omopcdm54.clinical import Person as OmopPerson
+from ..sql.id_maps import refresh_person_map
 from ..sql.person import get_person_insert
-from ..util.db import AbstractSession
+from ..util.db import AbstractSession, count_rows
+from .transformutils import execute_insert
 
 logger = logging.getLogger("ETL.Person")
 
 
-def transform(session: AbstractSession) -> None:
+def transform(session: AbstractSession, incremental: bool = False) -> int:
     """Run the Person transformation"""
     logger.info("Starting the Person transformation... ")
-    session.execute(get_person_insert())
+    result = execute_insert(session, get_person_insert(), incremental)
     logger.info(
         "PERSON Transformation complete! %s rows included",
-        session.query(OmopPerson).count(),
+        count_rows(session, result.inserted, OmopPerson),
     )
+    logger.info(
+        "PERSON map complete! %s cpr_enc mapped",
+        refresh_person_map(session),
+    )
+    return result.inserted
@@ -6,16 +6,22 @@ from ..models.omopcdm54.clinical import (
     ProcedureOccurrence as OmopProcedureOccurrence,
 )
 from ..sql.procedure_occurrence import ProcedureOccurrenceInsert
-from ..util.db import AbstractSession
+from ..util.db import AbstractSession, count_rows
+from .transformutils import execute_insert
 
 logger = logging.getLogger("ETL.ProcedureOccurrence")
 
 
-def transform(session: AbstractSession) -> None:
+def transform(
+    session: AbstractSession, incremental: bool = False, fanout: bool = False
+) -> int:
     """Run the Procedure occurrence transformation"""
     logger.info("Starting the Procedure occurrence transformation... ")
-    session.execute(ProcedureOccurrenceInsert)
+    result = execute_insert(
+        session, ProcedureOccurrenceInsert, incremental, fanout
+    )
     logger.info(
         "Procedure occurrence Transformation complete! %s rows included",
-        session.query(OmopProcedureOccurrence).count(),
+        count_rows(session, result.inserted, OmopProcedureOccurrence),
     )
+    return result.inserted
@@ -1,12 +1,12 @@
 """The base transformation operation with a session"""
 
 import logging
-from typing import Any, Callable, Optional
+from typing import Any, Callable, Iterable, Optional, Union
 
 from etl.models.omopcdm54.registry import OmopCdmModelBase
 from etl.sql.merge.mergeutils import merge_cdm_table
 
-from ..util.db import AbstractSession, session_context
+from ..util.db import AbstractSession, count_rows, session_context
 from .base_operation import BaseOperation
 
 
@@ -19,10 +19,16 @@ class SessionOperation(BaseOperation):
         session: AbstractSession,
         func: Callable[[AbstractSession], Any],
         description: Optional[str] = "",
+        inputs: Optional[Iterable[Union[str, Any]]] = None,
+        outputs: Optional[Iterable[Union[str, Any]]] = None,
+        footprint: Optional[float] = None,
     ) -> None:
         super().__init__(
             key=key,
             description=description,
+            inputs=inputs,
+            outputs=outputs,
+            footprint=footprint,
         )
         self._func = func
         self.session = session
@@ -41,10 +47,13 @@ class SessionOperationDefaultMerge(BaseOperation):
         cdm_table: OmopCdmModelBase,
         session: AbstractSession,
         description: Optional[str] = "",
+        inputs: Optional[Iterable[Union[str, Any]]] = None,
     ) -> None:
         super().__init__(
             key=str(cdm_table.__tablename__),
             description=description,
+            inputs=inputs,
+            outputs=None if inputs is None else [cdm_table],
         )
         self.session = session
         self.cdm_table = cdm_table
@@ -55,8 +64,9 @@ class SessionOperationDefaultMerge(BaseOperation):
             self.logger.info(
                 "Starting the %s merge transformation... ", self.key
             )
-            merge_cdm_table(cntx, self.cdm_table, self.logger)
+            inserted = merge_cdm_table(cntx, self.cdm_table, self.logger)
             self.logger.info(
                 f"Merge {self.key} transformation complete. %s Row(s) included.",
-                self.session.query(self.cdm_table).count(),
+                count_rows(cntx, inserted, self.cdm_table),
             )
+            return inserted
@@ -4,16 +4,20 @@ import logging
 
 from ..models.omopcdm54.clinical import Specimen as OmopSpecimen
 from ..sql.specimen import SpecimenInsert
-from ..util.db import AbstractSession
+from ..util.db import AbstractSession, count_rows
+from .transformutils import execute_insert
 
 logger = logging.getLogger("ETL.Specimen")
 
 
-def transform(session: AbstractSession) -> None:
+def transform(
+    session: AbstractSession, incremental: bool = False, fanout: bool = False
+) -> int:
     """Run the Specimen transformation"""
     logger.info("Starting the specimen transformation... ")
-    session.execute(SpecimenInsert)
+    result = execute_insert(session, SpecimenInsert, incremental, fanout)
     logger.info(
         "Specimen Transformation complete! %s rows included",
-        session.query(OmopSpecimen).count(),
+        count_rows(session, result.inserted, OmopSpecimen),
     )
+    return result.inserted
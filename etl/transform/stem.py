@@ -1,9 +1,12 @@
 """Stem transformations"""
 
+import asyncio
 import logging
 import os
+from typing import Any, Dict, List, NamedTuple, Optional
 
 from sqlalchemy import and_
+from sqlalchemy.sql import Insert
 
 from ..models.omopcdm54.clinical import Stem as OmopStem
 from ..models.source import (
@@ -23,11 +26,30 @@ from ..sql.stem import (
     get_registry_stem_insert,
     get_unmapped_nondrug_stem_insert,
 )
+from ..sql.stem.join_keys import get_join_key_index_statements
 from ..sql.stem.utils import (
+    BATCH_UIDS,
     get_batches_from_concept_loopkup_stem,
+    get_concept_lookup_stem_cte,
+    split_batches_by_column_names,
     validate_source_variables,
 )
-from ..util.db import AbstractSession, get_environment_variable
+from ..sql.stem_staging import (
+    create_stem_staging_sql,
+    drop_stem_staging_sql,
+    get_stem_append_insert,
+    stem_staging_table,
+    to_stem_staging,
+)
+from ..util.async_session import AsyncSession, can_run_concurrently
+from ..util.connection import POSTGRES_DB
+from ..util.db import (
+    LOG_FULL_COUNTS,
+    AbstractSession,
+    get_dialect_name,
+    get_environment_variable,
+)
+from .transformutils import execute_insert, prepare_insert
 
 logger = logging.getLogger("ETL.Stem")
 
@@ -35,10 +57,24 @@ NONDRUG_MODELS = [CourseMetadata, DiagnosesProcedures, Observations]
 DRUG_MODELS = [Administrations]
 REGISTRY_MODELS = [LprDiagnoses, LprProcedures, LprOperations]
 LABORATORY_MODELS = [LabkaBccLaboratory]
-BATCH_SIZE = int(get_environment_variable("BATCH_SIZE", "5"))
+# The non-drug sources are mapped in a single pass, unless they are batched
+# by a number of lookup uids, or by an estimated number of source rows
+BATCH_SIZE = int(get_environment_variable("BATCH_SIZE", "0"))
+STEM_BATCH_ROWS = int(get_environment_variable("STEM_BATCH_ROWS", "0"))
+# With more than one worker, the inserts into the Stem run concurrently,
+# each into a staging table of its own
+STEM_WORKERS = int(get_environment_variable("STEM_WORKERS", "1"))
+
+
+class StemInsert(NamedTuple):
+    """An insert into the Stem of the rows of a source, or of a batch"""
 
+    source: str
+    stmt: Any
+    parameters: Optional[Dict[str, Any]] = None
 
-def transform(session: AbstractSession) -> None:
+
+def transform(session: AbstractSession, incremental: bool = False) -> int:
     """Run the Stem transformation"""
     logger.info("Starting the Stem transformation... ")
 
@@ -47,11 +83,24 @@ def transform(session: AbstractSession) -> None:
     ):
         validate_source_variables(session, model, logger)
 
-    transform_non_drug_models(session)
-    transform_drug_models(session)
-    transform_registry_models(session)
-    transform_laboratory_models(session)
+    inserts = (
+        get_non_drug_inserts(session)
+        + get_drug_inserts(session)
+        + get_registry_inserts(session)
+        + get_laboratory_inserts(session)
+    )
+    if STEM_WORKERS > 1:
+        inserted = run_stem_inserts_in_parallel(
+            session, inserts, incremental, STEM_WORKERS
+        )
+    else:
+        inserted = run_stem_inserts(session, inserts, incremental)
+
+    if not LOG_FULL_COUNTS:
+        logger.info("STEM Transformation complete! %s rows included.", inserted)
+        return inserted
 
+    log_drug_counts(session)
     count_rows = session.query(OmopStem).count()
     n_mapped_rows = (
         session.query(OmopStem).where(OmopStem.concept_id.isnot(None)).count()
@@ -63,57 +112,197 @@ def transform(session: AbstractSession) -> None:
         n_mapped_rows,
         round(n_mapped_rows / max(1, count_rows) * 100, 2),
     )
+    return inserted
+
 
+def prepare_join_keys(
+    session: AbstractSession,
+    source_schema: Optional[str] = None,
+    registry_schema: Optional[str] = None,
+) -> None:
+    """
+    Index the normalized keys the non-drug, registry and laboratory source
+    rows are mapped on, on PostgreSQL. The indexes are only created once.
+    The schemas of the sources can be given, if not those of the models.
+    """
+    if get_dialect_name(session) != POSTGRES_DB:
+        return
+    logger.info("Indexing the join keys of the STEM mapping...")
+    for stmt in get_join_key_index_statements(
+        NONDRUG_MODELS, source_schema
+    ) + get_join_key_index_statements(
+        REGISTRY_MODELS + LABORATORY_MODELS, registry_schema
+    ):
+        session.execute(stmt)
+    session.commit()
 
-def transform_non_drug_models(session: AbstractSession) -> None:
 
-    for model in NONDRUG_MODELS:
+def run_stem_inserts(
+    session: AbstractSession,
+    inserts: List[StemInsert],
+    incremental: bool = False,
+) -> int:
+    """Execute the inserts into the Stem one after another"""
+    inserted = 0
+    for stem_insert in inserts:
+        source_inserted = execute_insert(
+            session,
+            stem_insert.stmt,
+            incremental,
+            parameters=stem_insert.parameters,
+        ).inserted
+        session.commit()
         logger.info(
-            "%s source data to the STEM table...",
-            model.__tablename__.upper(),
+            "STEM Transform in Progress, %s Events Included from source %s.",
+            source_inserted,
+            stem_insert.source,
         )
+        inserted += source_inserted
+    return inserted
+
 
-        for ConceptLookupStemBatchCte in get_batches_from_concept_loopkup_stem(
-            model, session, batch_size=BATCH_SIZE, logger=logger
-        ):
-            session.execute(
-                get_mapped_nondrug_stem_insert(
-                    session, model, ConceptLookupStemBatchCte
+def run_stem_inserts_in_parallel(
+    session: AbstractSession,
+    inserts: List[StemInsert],
+    incremental: bool = False,
+    workers: int = STEM_WORKERS,
+) -> int:
+    """
+    Execute the inserts into the Stem concurrently, each into a staging
+    table of its own on a connection of its own, then append the staging
+    tables to the Stem in the order of the inserts, in a single insert
+    which assigns the stem ids. Without sessions of their own, as on an in
+    memory database, the inserts run one after another instead.
+    """
+    if not can_run_concurrently(session):
+        logger.warning(
+            "STEM Transform cannot run %s inserts at a time on this "
+            "database, the inserts run one after another.",
+            workers,
+        )
+        return run_stem_inserts(session, inserts, incremental)
+    inserts = [i for i in inserts if isinstance(i.stmt, Insert)]
+    if not inserts:
+        return 0
+    tables = [stem_staging_table(index) for index in range(len(inserts))]
+    session.execute(create_stem_staging_sql(tables))
+    session.commit()
+
+    async def _stage() -> list:
+        async with AsyncSession(session, workers) as async_session:
+            return await asyncio.gather(
+                *(
+                    async_session.execute(
+                        to_stem_staging(
+                            prepare_insert(stem_insert.stmt, incremental),
+                            table,
+                        ),
+                        stem_insert.parameters or {},
+                    )
+                    for stem_insert, table in zip(inserts, tables)
                 )
             )
-            session.commit()
 
-        logger.info(
-            "STEM Transform in Progress, %s Events Included from mapped nondrug source %s.",
-            session.query(OmopStem)
-            .where(OmopStem.datasource == model.__tablename__)
-            .count(),
-            model.__tablename__,
+    try:
+        results = asyncio.run(_stage())
+        for stem_insert, result in zip(inserts, results):
+            logger.info(
+                "STEM Transform in Progress, %s Events Included from source %s.",
+                result.inserted,
+                stem_insert.source,
+            )
+        inserted = session.execute(get_stem_append_insert(tables)).inserted
+        session.commit()
+    finally:
+        session.execute(drop_stem_staging_sql(tables))
+        session.commit()
+    return inserted
+
+
+def get_non_drug_inserts(session: AbstractSession) -> List[StemInsert]:
+    """The inserts of the mapped, then unmapped, rows of the non-drug sources"""
+    inserts = []
+    for model in NONDRUG_MODELS:
+        batches = list(
+            get_batches_from_concept_loopkup_stem(
+                model,
+                session,
+                batch_size=BATCH_SIZE,
+                logger=logger,
+                batch_rows=STEM_BATCH_ROWS,
+            )
         )
+        # a single pass needs a single name for each source column
+        batches = split_batches_by_column_names(model, session, batches)
+        source = f"mapped nondrug {model.__tablename__}"
+        if len(batches) == 1:
+            # a single pass over the source, joined to all its lookup rows
+            inserts.append(
+                StemInsert(
+                    source,
+                    get_mapped_nondrug_stem_insert(
+                        session, model, get_concept_lookup_stem_cte(model)
+                    ),
+                )
+            )
+        else:
+            # the same statement for every batch, the uids are a parameter
+            inserts.extend(
+                StemInsert(
+                    source,
+                    get_mapped_nondrug_stem_insert(
+                        session,
+                        model,
+                        get_concept_lookup_stem_cte(model, batched=True),
+                        batch,
+                    ),
+                    {BATCH_UIDS: batch},
+                )
+                for batch in batches
+            )
 
         if os.getenv("INCLUDE_UNMAPPED_CODES", "TRUE") == "TRUE":
-            session.execute(get_unmapped_nondrug_stem_insert(session, model))
-
-            logger.info(
-                "STEM Transform in Progress, %s Events including unmapped nondrug source %s.",
-                session.query(OmopStem)
-                .where(OmopStem.datasource == model.__tablename__)
-                .count(),
-                model.__tablename__,
+            inserts.append(
+                StemInsert(
+                    f"unmapped nondrug {model.__tablename__}",
+                    get_unmapped_nondrug_stem_insert(session, model),
+                )
             )
+    return inserts
 
 
-def transform_drug_models(session: AbstractSession) -> None:
-    logger.info("DRUG source data to the STEM table...")
-    session.execute(get_drug_stem_insert(session, logger))
+def get_drug_inserts(session: AbstractSession) -> List[StemInsert]:
+    """The insert of the drug administrations"""
+    return [
+        StemInsert(
+            Administrations.__tablename__,
+            get_drug_stem_insert(session, logger),
+        )
+    ]
 
-    logger.info(
-        "STEM Transform in Progress, %s Events Included from source administrations.",
-        session.query(OmopStem)
-        .where(OmopStem.datasource.like("%_administrations"))
-        .count(),
-    )
 
+def get_registry_inserts(session: AbstractSession) -> List[StemInsert]:
+    """The inserts of the registry sources"""
+    return [
+        StemInsert(
+            model.__tablename__, get_registry_stem_insert(session, model)
+        )
+        for model in REGISTRY_MODELS
+    ]
+
+
+def get_laboratory_inserts(session: AbstractSession) -> List[StemInsert]:
+    """The inserts of the laboratory sources"""
+    return [
+        StemInsert(
+            model.__tablename__, get_laboratory_stem_insert(session, model)
+        )
+        for model in LABORATORY_MODELS
+    ]
+
+
+def log_drug_counts(session: AbstractSession) -> None:
+    """Log the drug events of the Stem, and how many have a quantity"""
     drug_records_in_stem = (
         session.query(OmopStem)
         .where(
@@ -142,35 +331,3 @@ def transform_drug_models(session: AbstractSession) -> None:
             drug_records_with_quantity / max(1, drug_records_in_stem) * 100, 2
         ),
     )
-
-
-def transform_registry_models(session: AbstractSession) -> None:
-    for model in REGISTRY_MODELS:
-        logger.info(
-            "%s source data to the STEM table...",
-            model.__tablename__.upper(),
-        )
-        session.execute(get_registry_stem_insert(session, model))
-        logger.info(
-            "STEM Transform in Progress, %s Events Included from source %s.",
-            session.query(OmopStem)
-            .where(OmopStem.datasource == model.__tablename__)
-            .count(),
-            model.__tablename__,
-        )
-
-
-def transform_laboratory_models(session: AbstractSession) -> None:
-    for model in LABORATORY_MODELS:
-        logger.info(
-            "%s source data to the STEM table...",
-            model.__tablename__.upper(),
-        )
-        session.execute(get_laboratory_stem_insert(session, model))
-        logger.info(
-            "STEM Transform in Progress, %s Events Included from source %s.",
-            session.query(OmopStem)
-            .where(OmopStem.datasource == model.__tablename__)
-            .count(),
-            model.__tablename__,
-        )
@@ -0,0 +1,36 @@
+"""Stem fan-out transformations"""
+
+import logging
+
+from ..sql.stem_fanout import (
+    SQL_CREATE_STEM_FANOUT,
+    SQL_DROP_STEM_FANOUT,
+    SQL_INDEX_STEM_FANOUT,
+    StemFanoutInsert,
+)
+from ..util.connection import POSTGRES_DB
+from ..util.db import AbstractSession, get_dialect_name
+from .transformutils import execute_insert, execute_sql_transform
+
+logger = logging.getLogger("ETL.Stem")
+
+
+def transform(session: AbstractSession, incremental: bool = False) -> int:
+    """Copy the Stem rows of the clinical domains to the fan-out table"""
+    logger.info("Starting the Stem fan-out... ")
+    execute_sql_transform(session, SQL_CREATE_STEM_FANOUT)
+    result = execute_insert(session, StemFanoutInsert, incremental)
+    if get_dialect_name(session) == POSTGRES_DB:
+        execute_sql_transform(session, SQL_INDEX_STEM_FANOUT)
+    logger.info(
+        "Stem fan-out complete! %s rows to the domain tables.",
+        result.inserted,
+    )
+    return result.inserted
+
+
+def drop(session: AbstractSession) -> int:
+    """Drop the fan-out table once the domain tables are filled"""
+    execute_sql_transform(session, SQL_DROP_STEM_FANOUT)
+    logger.info("Stem fan-out dropped.")
+    return 0
@@ -2,15 +2,51 @@
 
 import logging
 import os
+from typing import Any, Dict, Optional
 
-from ..util.db import AbstractSession
+from sqlalchemy.sql import Insert
+
+from ..sql.incremental import restrict_to_delta_persons
+from ..sql.stem_fanout import from_stem_fanout
+from ..util.db import AbstractSession, ExecuteResult
 
 logger = logging.getLogger("ETL.Core")
 
 
-def execute_sql_transform(session: AbstractSession, sql: str) -> None:
+def execute_sql_transform(session: AbstractSession, sql: str) -> ExecuteResult:
     """Execute sql for a given session"""
-    session.execute(sql)
+    return session.execute(sql)
+
+
+def execute_insert(
+    session: AbstractSession,
+    stmt: Insert,
+    incremental: bool = False,
+    fanout: bool = False,
+    parameters: Optional[Dict[str, Any]] = None,
+) -> ExecuteResult:
+    """
+    Execute an INSERT ... SELECT statement. In incremental runs, only the
+    rows of the persons with new source data are inserted. With fanout,
+    a select from the Stem reads the Stem fan-out table instead.
+    The parameters are the values of the bound parameters of the insert.
+    """
+    if not isinstance(stmt, Insert):
+        return session.execute(stmt)
+    return session.execute(
+        prepare_insert(stmt, incremental, fanout), parameters or {}
+    )
+
+
+def prepare_insert(
+    stmt: Insert, incremental: bool = False, fanout: bool = False
+) -> Insert:
+    """The INSERT ... SELECT statement executed by execute_insert"""
+    if fanout:
+        stmt = from_stem_fanout(stmt)
+    if incremental:
+        stmt = restrict_to_delta_persons(stmt)
+    return stmt
 
 
 def execute_sql_file(
@@ -5,24 +5,32 @@ import logging
 from etl.models.omopcdm54.clinical import VisitOccurrence
 
 from ..sql import DEPARTMENT_SHAK_CODE
+from ..sql.id_maps import refresh_visit_map
 from ..sql.visit_occurrence import (
     get_count_courseid_dates_not_matching,
     get_count_courseid_missing_dates,
     get_visit_occurrence_insert,
 )
-from ..util.db import AbstractSession
+from ..util.db import AbstractSession, count_rows
+from .transformutils import execute_insert
 
 logger = logging.getLogger("ETL.VisitOccurrence")
 
 
-def transform(session: AbstractSession) -> None:
+def transform(session: AbstractSession, incremental: bool = False) -> int:
     """Run the visit occurrence transformation"""
     logger.info("Starting the visit occurrence transformation... ")
 
-    session.execute(get_visit_occurrence_insert(DEPARTMENT_SHAK_CODE))
+    result = execute_insert(
+        session, get_visit_occurrence_insert(DEPARTMENT_SHAK_CODE), incremental
+    )
     logger.info(
         "Visit occurrence Transformation complete! %s rows included",
-        session.query(VisitOccurrence).count(),
+        count_rows(session, result.inserted, VisitOccurrence),
+    )
+    logger.info(
+        "Visit occurrence map complete! %s courseid mapped",
+        refresh_visit_map(session),
     )
     date_not_found = get_count_courseid_missing_dates(DEPARTMENT_SHAK_CODE)
     date_mismatch = get_count_courseid_dates_not_matching(DEPARTMENT_SHAK_CODE)
@@ -31,10 +39,11 @@ def transform(session: AbstractSession) -> None:
     count_date_mismatch = session.query(date_mismatch).count()
 
     logger.info(
-        "Visit Occurrence: %d rows excluded because missing date.",
+        "Visit Occurrence: %s rows excluded because missing date.",
         count_date_not_found,
     )
     logger.info(
-        "Visit Occurrence: %d rows excluded because date mismatch.",
+        "Visit Occurrence: %s rows excluded because date mismatch.",
         count_date_mismatch,
     )
+    return result.inserted
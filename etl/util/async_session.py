@@ -0,0 +1,153 @@
+"""An asyncio facade to run independent statements of a session together"""
+
+import asyncio
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import SingletonThreadPool
+
+from .db import AbstractSession, ExecuteResult, FakeSession, make_db_session
+
+
+def _engine_of(session: AbstractSession) -> Optional[Engine]:
+    """
+    The engine to make more sessions from, None if statements cannot run
+    on sessions of their own. Every thread gets a new in memory database
+    from a SingletonThreadPool, so DuckDB in memory runs on one session.
+    """
+    if isinstance(session, FakeSession) or not hasattr(session, "connection"):
+        return None
+    engine = session.connection().engine
+    if isinstance(engine.pool, SingletonThreadPool):
+        return None
+    return engine
+
+
+def can_run_concurrently(session: AbstractSession) -> bool:
+    """True if statements can run concurrently on sessions of their own"""
+    return _engine_of(session) is not None
+
+
+def _read(session: AbstractSession, result: ExecuteResult, method: str) -> Any:
+    """Read the rows of a result, a fake session has none"""
+    if isinstance(session, FakeSession):
+        return [] if method == "all" else None
+    return getattr(result, method)()
+
+
+class AsyncSession:
+    """
+    Execute independent statements concurrently with asyncio, so that a
+    transformation can await several statements together instead of
+    waiting for each in turn.
+
+    Every statement runs in a worker thread, on a session of its own made
+    from the engine of the given session, and is committed when it
+    completes. It only sees what the given session has committed. The
+    database drivers release the GIL while they wait, so the statements
+    overlap on Postgres and DuckDB alike. With a fake session, or an in
+    memory DuckDB database, the statements run one after another on the
+    given session.
+    """
+
+    def __init__(self, session: AbstractSession, max_workers: int = 4) -> None:
+        self._session = session
+        self._engine = _engine_of(session)
+        self._idle: "queue.SimpleQueue[AbstractSession]" = queue.SimpleQueue()
+        self._created: List[AbstractSession] = []
+        self._executor = (
+            ThreadPoolExecutor(max_workers, thread_name_prefix="etl-async")
+            if self._engine is not None
+            else None
+        )
+
+    @property
+    def is_concurrent(self) -> bool:
+        """True if the statements run concurrently on sessions of their own"""
+        return self._executor is not None
+
+    def _run(self, method: Callable[[AbstractSession], Any]) -> Any:
+        try:
+            session = self._idle.get_nowait()
+        except queue.Empty:
+            session = make_db_session(self._engine)
+            self._created.append(session)
+        try:
+            value = method(session)
+            session.commit()
+            return value
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            self._idle.put(session)
+
+    async def _submit(self, method: Callable[[AbstractSession], Any]) -> Any:
+        if self._executor is None:
+            return method(self._session)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._run, method
+        )
+
+    async def execute(self, sql: Any, *args, **kwargs) -> ExecuteResult:
+        """
+        Execute a statement, for the rows it inserted or deleted. The rows
+        of a query are read with scalar or all.
+        """
+        return await self._submit(
+            lambda session: session.execute(sql, *args, **kwargs)
+        )
+
+    async def scalar(self, sql: Any, *args, **kwargs) -> Any:
+        """The first column of the first row of a query"""
+        return await self._submit(
+            lambda session: _read(
+                session, session.execute(sql, *args, **kwargs), "scalar"
+            )
+        )
+
+    async def all(self, sql: Any, *args, **kwargs) -> List[Any]:
+        """All the rows of a query"""
+        return await self._submit(
+            lambda session: _read(
+                session, session.execute(sql, *args, **kwargs), "all"
+            )
+        )
+
+    def close(self) -> None:
+        """Wait for the running statements and close the sessions made"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        for session in self._created:
+            session.close()
+        self._created = []
+
+    async def __aenter__(self) -> "AsyncSession":
+        return self
+
+    async def __aexit__(self, *args, **kwargs) -> None:
+        self.close()
+
+
+def gather_scalars(
+    session: AbstractSession, statements: Iterable[Any], max_workers: int = 4
+) -> List[Any]:
+    """
+    The scalar result of every statement, in order, with the statements
+    run together. To be called from a transformation, not from a coroutine.
+    Without sessions of their own, the statements run on the given session.
+    """
+    if not can_run_concurrently(session):
+        return [
+            _read(session, session.execute(sql), "scalar") for sql in statements
+        ]
+
+    async def _gather() -> List[Any]:
+        async with AsyncSession(session, max_workers) as async_session:
+            return await asyncio.gather(
+                *(async_session.scalar(sql) for sql in statements)
+            )
+
+    return asyncio.run(_gather())
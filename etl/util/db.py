@@ -1,26 +1,104 @@
 """Module for database utilities and helpers"""
 
-import json
 import os
+import re
 from abc import ABC, abstractmethod
 from contextlib import contextmanager
 from enum import Enum
+from io import StringIO
 from tempfile import NamedTemporaryFile
-from typing import Any, Callable, Generator, Iterable, List, Literal, Optional
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Final,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    NamedTuple,
+    Optional,
+    Set,
+    Union,
+)
+from uuid import uuid4
 
 import pandas as pd
-from sqlalchemy import JSON, create_engine, inspect
-from sqlalchemy.engine import Engine, ScalarResult
+from sqlalchemy import JSON, create_engine, event, inspect
+from sqlalchemy.engine import Connection, Engine, ScalarResult
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Query, sessionmaker
 
 from etl.util.logger import setup_logger
 
-from .connection import ConnectionDetails
-from .exceptions import DependencyNotFoundException
+from .connection import POSTGRES_DB, ConnectionDetails
+from .exceptions import DBConnectionException, DependencyNotFoundException
 
 logger = setup_logger("DEBUG")
 
+# attribute on the execution context holding the rowcount read from DuckDB
+DUCKDB_ROWCOUNT_ATTRIBUTE: Final[str] = "etl_duckdb_rowcount"
+DML_KEYWORDS: Final[re.Pattern] = re.compile(
+    r"\b(INSERT|DELETE|UPDATE)\b", re.IGNORECASE
+)
+# rows fetched at a time when streaming a result
+STREAM_CHUNK_ROWS: Final[int] = 10000
+
+
+class ExecuteResult:
+    """
+    The result of executing a statement in a Session.
+
+    Wraps the sqlalchemy result and exposes the number of rows inserted or
+    deleted by a DML statement, so transformations can report what they
+    did without counting the table afterwards.
+    """
+
+    def __init__(self, result: Any) -> None:
+        self._result = result
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._result, name)
+
+    def __iter__(self) -> Iterator:
+        return iter(self._result)
+
+    @property
+    def rowcount(self) -> int:
+        """The number of rows affected by the statement, -1 if unknown"""
+        context = getattr(self._result, "context", None)
+        rowcount = getattr(context, DUCKDB_ROWCOUNT_ATTRIBUTE, None)
+        if rowcount is not None:
+            return rowcount
+        return getattr(self._result, "rowcount", -1)
+
+    @property
+    def statement_type(self) -> Optional[str]:
+        """INSERT, DELETE or UPDATE for DML statements, otherwise None"""
+        context = getattr(self._result, "context", None)
+        if context is None:
+            return None
+        if context.isinsert:
+            return "INSERT"
+        if context.isdelete:
+            return "DELETE"
+        if context.isupdate:
+            return "UPDATE"
+        # for text statements, the last DML keyword is the one counted
+        keywords = DML_KEYWORDS.findall(str(context.statement))
+        return keywords[-1].upper() if keywords else None
+
+    @property
+    def inserted(self) -> int:
+        """The number of rows inserted by the statement"""
+        return max(self.rowcount, 0) if self.statement_type == "INSERT" else 0
+
+    @property
+    def deleted(self) -> int:
+        """The number of rows deleted by the statement"""
+        return max(self.rowcount, 0) if self.statement_type == "DELETE" else 0
+
 
 class AbstractSession(ABC):
     """A simple interface for interacting with a DB (session)"""
@@ -53,6 +131,16 @@ class AbstractSession(ABC):
     def execute(self, sql: Any, *args, **kwargs):
         pass
 
+    @abstractmethod
+    def stream(
+        self, sql: Any, *args, chunk_size: int = STREAM_CHUNK_ROWS, **kwargs
+    ) -> Iterator[List[Any]]:
+        """
+        Iterate over the rows of a statement in chunks of chunk_size rows,
+        without holding the whole result in memory. The session must not
+        execute other statements (nor commit) until the iteration is done.
+        """
+
 
 class Session(AbstractSession):
     """We wrap the sqlalchemy session in an interface we own, so we can easily fake/mock it"""
@@ -82,8 +170,28 @@ class Session(AbstractSession):
     def scalars(self, *entities, **kwargs) -> ScalarResult:
         return self._session.scalars(*entities, **kwargs)
 
-    def execute(self, sql: Any, *args, **kwargs):
-        return self._session.execute(sql, *args, **kwargs)
+    def execute(self, sql: Any, *args, **kwargs) -> ExecuteResult:
+        return ExecuteResult(self._session.execute(sql, *args, **kwargs))
+
+    def stream(
+        self, sql: Any, *args, chunk_size: int = STREAM_CHUNK_ROWS, **kwargs
+    ) -> Iterator[List[Any]]:
+        # a server-side cursor on Postgres, DuckDB streams its results
+        # and only fetches the chunks asked for
+        result = self._session.execute(
+            sql,
+            *args,
+            execution_options={
+                "stream_results": True,
+                "max_row_buffer": chunk_size,
+            },
+            **kwargs,
+        )
+        try:
+            for partition in result.partitions(chunk_size):
+                yield partition
+        finally:
+            result.close()
 
     def connection_execute(self, sql: str, *args, **kwargs):
         return self._session.connection().connection.execute(
@@ -99,9 +207,19 @@ class FakeSession(AbstractSession):
         self._commits = 0
         self.objects = []
         self._sqllog = []
+        # the rows returned by stream, whatever the statement
+        self.stream_rows: List[Any] = []
 
-    def execute(self, sql: Any, *args, **kwargs) -> None:
+    def execute(self, sql: Any, *args, **kwargs) -> ExecuteResult:
         self._sqllog.append(sql)
+        return ExecuteResult(None)
+
+    def stream(
+        self, sql: Any, *args, chunk_size: int = STREAM_CHUNK_ROWS, **kwargs
+    ) -> Iterator[List[Any]]:
+        self._sqllog.append(sql)
+        for start in range(0, len(self.stream_rows), chunk_size):
+            yield self.stream_rows[start : start + chunk_size]
 
     def get_sql_log(self) -> List[str]:
         return self._sqllog
@@ -157,13 +275,20 @@ def session_context(
         session.close()
 
 
+def get_dialect_name(session: AbstractSession) -> Optional[str]:
+    """The name of the dialect of a session, None for a fake session"""
+    if not hasattr(session, "connection"):
+        return None
+    return session.connection().dialect.name
+
+
 def is_db_connected(engine: Engine) -> bool:
     """helper to check if we can connect to the DB"""
     if engine is None:
         return False
     try:
-        engine.connect()
-        return True
+        with engine.connect():
+            return True
     except OperationalError:
         return False
 
@@ -206,13 +331,52 @@ def make_engine_postgres(connection: ConnectionDetails, **kwargs) -> Engine:
         ) from excep
 
 
+def _read_duckdb_rowcount(
+    conn, cursor, statement, parameters, context, executemany
+) -> None:
+    """
+    DuckDB leaves the cursor rowcount at -1 and instead returns
+    the number of affected rows of a DML statement as a "Count" row.
+    Read it before sqlalchemy closes the cursor.
+    """
+    # pylint: disable=unused-argument
+    if executemany or context is None or not cursor.description:
+        return
+    if len(cursor.description) != 1 or cursor.description[0][0] != "Count":
+        return
+    is_dml = (
+        context.isinsert
+        or context.isdelete
+        or context.isupdate
+        or DML_KEYWORDS.search(statement) is not None
+    )
+    if is_dml:
+        row = cursor.fetchone()
+        setattr(context, DUCKDB_ROWCOUNT_ATTRIBUTE, row[0] if row else 0)
+
+
 def _create_engine_duckdb(
     dbname: Optional[str] = ":memory:",
+    pool_kwargs: Optional[Dict[str, Any]] = None,
     **kwargs,
 ) -> Engine:
-    """Create a Duckdb database engine based on connection details"""
+    """
+    Create a Duckdb database engine based on connection details.
+    The keyword arguments are DuckDB settings.
+    """
     url = f"duckdb:///{dbname}"
-    return create_engine(url, connect_args={"config": kwargs})
+    engine = create_engine(url, **(pool_kwargs or {}))
+
+    def _connect_with_config(dialect, conn_rec, cargs, cparams) -> None:
+        # duckdb_engine changes the config it is given on every connect, a
+        # file is only opened again with the same config, so every
+        # connection gets its own copy
+        # pylint: disable=unused-argument
+        cparams["config"] = dict(kwargs)
+
+    event.listen(engine, "do_connect", _connect_with_config)
+    event.listen(engine, "after_cursor_execute", _read_duckdb_rowcount)
+    return engine
 
 
 def make_engine_duckdb(connection: ConnectionDetails, **kwargs) -> Engine:
@@ -228,6 +392,72 @@ def make_engine_duckdb(connection: ConnectionDetails, **kwargs) -> Engine:
         ) from excep
 
 
+class EngineOptions(NamedTuple):
+    """
+    The pool configuration of an engine, and the DuckDB settings.
+    None leaves the setting to the database default.
+    """
+
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_pre_ping: bool = True
+    pool_recycle: int = 3600
+    memory_limit: Optional[str] = None
+    threads: Optional[int] = None
+    temp_directory: Optional[str] = None
+    preserve_insertion_order: Optional[bool] = None
+
+    @classmethod
+    def for_workers(cls, workers: int, **kwargs) -> "EngineOptions":
+        """
+        Options with a connection for every worker, the session running
+        the ETL and the memory sampler of the resource governor.
+        """
+        return cls(pool_size=max(1, int(workers)) + 2, **kwargs)
+
+    def duckdb_config(self) -> Dict[str, Any]:
+        """The DuckDB settings given when connecting"""
+        config = {
+            "memory_limit": self.memory_limit,
+            "threads": self.threads,
+            "temp_directory": self.temp_directory,
+            "preserve_insertion_order": self.preserve_insertion_order,
+        }
+        return {k: v for k, v in config.items() if v is not None}
+
+
+def make_engine(
+    connection: ConnectionDetails,
+    options: EngineOptions = EngineOptions(),
+) -> Engine:
+    """
+    Create the engine of the ETL and merge for the DBMS of the connection,
+    with a pool large enough for the concurrent workers. Connections are
+    checked before they are handed out and recycled after an hour, so
+    sessions of idle workers do not fail on dropped connections.
+    """
+    pool_kwargs = {
+        "pool_size": options.pool_size,
+        "max_overflow": options.max_overflow,
+        "pool_pre_ping": options.pool_pre_ping,
+        "pool_recycle": options.pool_recycle,
+    }
+    if connection.dbms == POSTGRES_DB:
+        return make_engine_postgres(
+            connection, implicit_returning=False, **pool_kwargs
+        )
+    if connection.dbms == "duckdb":
+        if connection.dbname in ("", ":memory:"):
+            # a single in memory database, shared by all sessions
+            pool_kwargs = {"pool_pre_ping": options.pool_pre_ping}
+        return make_engine_duckdb(
+            connection, pool_kwargs=pool_kwargs, **options.duckdb_config()
+        )
+    raise DBConnectionException(
+        f"Unsupported DBMS: {connection.dbms}. Please use 'postgresql' or 'duckdb'."
+    )
+
+
 def get_environment_variable(
     environment_variable_name: str = None,
     default: str = None,
@@ -263,6 +493,31 @@ def get_environment_variable(
     return value
 
 
+LOG_FULL_COUNTS: Final[bool] = (
+    get_environment_variable("LOG_FULL_COUNTS", "FALSE") == "TRUE"
+)
+
+
+def count_rows(session: AbstractSession, rowcount: int, counted: Any) -> int:
+    """
+    The number of rows to log for a transformation. This is the rowcount
+    of its statements, unless LOG_FULL_COUNTS is set, in which case the
+    given model or query is counted instead.
+    """
+    if not LOG_FULL_COUNTS:
+        return rowcount
+    if isinstance(counted, Query):
+        return counted.count()
+    return session.query(counted).count()
+
+
+def reported_row_count(result: Any) -> Optional[int]:
+    """The number of rows a transformation returned, if it returned one"""
+    if isinstance(result, int) and not isinstance(result, bool):
+        return result
+    return None
+
+
 class WriteMode(Enum):
     """Enum for write modes"""
 
@@ -270,8 +525,34 @@ class WriteMode(Enum):
     OVERWRITE = 2
 
 
+def json_strings(values: pd.Series) -> pd.Series:
+    """
+    The values of a json column as json strings, serialised by pandas in
+    one go instead of a json.dumps per value. Missing values stay None.
+    """
+    if values.empty:
+        return values.astype(object)
+    strings = values.to_json(
+        orient="records", lines=True, double_precision=15
+    ).split("\n")[: len(values)]
+    return pd.Series(strings, index=values.index, dtype=object).where(
+        values.notna(), None
+    )
+
+
 class DataBaseWriter:
-    """Use this to write pandas dataframes to a database session"""
+    """
+    Use this to write pandas dataframes to a database session.
+
+    The source is never copied as a whole: only the columns written are
+    taken from it, chunk by chunk, so the memory used stays in the order
+    of a chunk. A chunk holds chunk_rows rows, or as many rows as fit in
+    write_buffer_size bytes if not set.
+
+    On DuckDB the chunks are written to a CSV file, which is read with
+    read_csv. On Postgres every chunk is streamed with COPY FROM STDIN,
+    using the CSV options of the writer.
+    """
 
     def __init__(self) -> None:
         self._source = None
@@ -287,6 +568,7 @@ class DataBaseWriter:
         )
         self.read_buffer_size: int = 8192
         self.write_buffer_size: int = 268435500
+        self.chunk_rows: Optional[int] = None
 
     def _build_options_str(self) -> str:
         quote = '"'
@@ -322,60 +604,172 @@ class DataBaseWriter:
         )
 
     def _do_read(self, file_path: Any, columns: Iterable[str]) -> None:
-        self._source[columns].to_csv(
-            file_path,
-            sep=self.delimiter,
-            header=self.header,
-            index=False,
-            encoding=self.encoding,
-        )
+        for number, chunk in enumerate(self._chunks(columns)):
+            chunk.to_csv(
+                file_path,
+                mode="w" if number == 0 else "a",
+                sep=self.delimiter,
+                header=self.header and number == 0,
+                index=False,
+                encoding=self.encoding,
+            )
 
     def set_source(self, model: Any, source: pd.DataFrame) -> "DataBaseWriter":
         """
-        Set the source dataframe.
-
-        Will copy the dataframe to avoid mutating the source.
-        Could be a performance issue if using repeatedly.
-
-        TO-DO: Check the cost of this copy.
+        Set the source dataframe, which is neither copied nor changed.
         """
-        self._source = source.copy()
+        self._source = source
         self._model = model
         return self
 
-    def _process_json_fields(self) -> None:
+    def _json_columns(self) -> Set[str]:
+        return {
+            col.key
+            for col in self._model.__table__.columns.values()
+            if isinstance(col.type, JSON)
+        }
+
+    def _chunk_rows(self, columns: List[str]) -> int:
+        """
+        The rows per chunk. Without chunk_rows, the size of a row is
+        estimated on the first rows of the columns written.
+        """
+        if self.chunk_rows is not None:
+            return max(1, self.chunk_rows)
+        sample = self._source.iloc[:1000][columns]
+        if sample.empty:
+            return 1
+        row_size = sample.memory_usage(index=False, deep=True).sum() / len(
+            sample
+        )
+        return max(1, int(self.write_buffer_size // max(1, row_size)))
+
+    def _chunks(self, columns: Iterable[str]) -> Iterator[pd.DataFrame]:
+        """
+        The columns to write in chunks of rows, with the json fields as
+        strings. An empty source gives a single empty chunk.
+        """
+        columns = list(columns)
+        rows = self._chunk_rows(columns)
+        json_columns = self._json_columns().intersection(columns)
+        for start in range(0, max(len(self._source), 1), rows):
+            chunk = self._source.iloc[start : start + rows][columns]
+            if json_columns:
+                chunk = chunk.assign(
+                    **{c: json_strings(chunk[c]) for c in json_columns}
+                )
+            yield chunk
+
+    def _do_copy(
+        self,
+        session: AbstractSession,
+        table: str,
+        columns: Iterable[str],
+    ) -> None:
         """
-        We need to convert json fields to strings
-        when writing to the database.
+        Stream the source to Postgres with COPY FROM STDIN, one chunk of
+        rows at a time, so at most one chunk is held as CSV in memory.
         """
-        if self._model is not None:
-            for col in self._model.__table__.columns.values():
-                if isinstance(col.type, JSON):
-                    self._source[col.key] = self._source[col.key].apply(
-                        lambda x: json.dumps(x) if x is not None else None
-                    )
+        columns = list(columns)
+        self._initialise_target(session, table)
+        sql = (
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN "
+            f"WITH ({self._build_options_str()})"
+        )
+        cursor = session.connection().connection.cursor()
+        try:
+            for chunk in self._chunks(columns):
+                if chunk.empty:
+                    continue
+                buffer = StringIO()
+                chunk.to_csv(
+                    buffer,
+                    sep=self.delimiter,
+                    header=False,
+                    index=False,
+                    na_rep=self.null_field or "",
+                )
+                buffer.seek(0)
+                cursor.copy_expert(sql, buffer)
+        finally:
+            cursor.close()
 
     def write(
         self,
         session: AbstractSession,
         columns: Optional[Iterable[str]] = None,
     ) -> None:
-        df_columns = self._source.columns if columns is None else columns
+        if self._source is None or self._model is None:
+            raise RuntimeError("No source dataframe set!")
+        df_columns = list(self._source.columns if columns is None else columns)
+        if get_dialect_name(session) == POSTGRES_DB:
+            self._do_copy(session, str(self._model.__table__), df_columns)
+            return
         with NamedTemporaryFile(
             suffix=".csv",
             mode="w+b",
             delete=True,
         ) as csv_file:
-            if self._source is None or self._model is None:
-                raise RuntimeError("No source dataframe set!")
-
-            self._process_json_fields()
             self._do_read(csv_file.name, df_columns)
             self._do_insert(
                 session, csv_file.name, str(self._model.__table__), df_columns
             )
 
 
+class FrameDataBaseWriter(DataBaseWriter):
+    """
+    Write a pandas dataframe to a DuckDB session without a copy.
+
+    The dataframe is registered as a view on the DuckDB connection and
+    inserted from there, so DuckDB scans its columns in place instead of
+    reading them back from a CSV file, and the dtypes are kept. Only the
+    json fields are serialised to new columns. The CSV options of the
+    writer are not used. On Postgres, it writes with COPY like the
+    DataBaseWriter.
+    """
+
+    def _frame(self, columns: Iterable[str]) -> pd.DataFrame:
+        """The columns to write, with the json fields as strings"""
+        json_columns = self._json_columns()
+        return pd.DataFrame(
+            {
+                c: (
+                    json_strings(self._source[c])
+                    if c in json_columns
+                    else self._source[c]
+                )
+                for c in columns
+            },
+            copy=False,
+        )
+
+    def write(
+        self,
+        session: AbstractSession,
+        columns: Optional[Iterable[str]] = None,
+    ) -> None:
+        if self._source is None or self._model is None:
+            raise RuntimeError("No source dataframe set!")
+        if get_dialect_name(session) == POSTGRES_DB:
+            super().write(session, columns)
+            return
+        df_columns = list(self._source.columns if columns is None else columns)
+        table = str(self._model.__table__)
+        view = f"etl_frame_{uuid4().hex}"
+
+        dbapi_connection = session.connection().connection
+        dbapi_connection.register(view, self._frame(df_columns))
+        try:
+            self._initialise_target(session, table)
+            column_list = ", ".join(df_columns)
+            session.execute(
+                f"INSERT INTO {table} ({column_list}) "
+                f"SELECT {column_list} FROM {view};"
+            )
+        finally:
+            dbapi_connection.unregister(view)
+
+
 class DataBaseWriterBuilder:
     """Use this to build a DataBaseWriter"""
 
@@ -412,6 +806,11 @@ class DataBaseWriterBuilder:
         self._writer.null_field = null_field
         return self
 
+    def set_chunk_size(self, rows: int) -> "DataBaseWriterBuilder":
+        """Set the number of rows written at a time"""
+        self._writer.chunk_rows = rows
+        return self
+
     def set_write_mode(
         self, mode: Literal[WriteMode.APPEND, WriteMode.OVERWRITE]
     ) -> "DataBaseWriterBuilder":
@@ -430,7 +829,9 @@ class DataBaseWriterBuilder:
 
 
 def check_table_exists(
-    engine: Engine, tablename: str, schema: Optional[str] = None
+    engine: Union[Engine, Connection],
+    tablename: str,
+    schema: Optional[str] = None,
 ) -> bool:
     """Helper to check if a table exists"""
     return inspect(engine).has_table(tablename, schema=schema)
@@ -470,8 +871,14 @@ def get_source_cdm_schemas(
 ) -> List[str]:
     """
     These functions reads all the schema in the database
-    excludes the schemas that are not structured as a cdm schema and returns the list of cdm schemas
+    excludes the schemas that are not structured as a cdm schema and returns the list of cdm schemas.
+    If MERGE_SOURCE_SCHEMAS is set, only the cdm schemas in that comma separated list are returned.
     """
+    selected = [
+        s.strip()
+        for s in os.getenv("MERGE_SOURCE_SCHEMAS", "").split(",")
+        if s.strip()
+    ]
 
     query = """SELECT table_schema
     FROM information_schema.tables
@@ -481,4 +888,8 @@ def get_source_cdm_schemas(
     """
     result = session.execute(query)
     TARGET_SCHEMA = get_environment_variable("TARGET_SCHEMA", "omopcdm")
-    return [row[0] for row in result if row[0] != TARGET_SCHEMA]
+    return [
+        row[0]
+        for row in result
+        if row[0] != TARGET_SCHEMA and (not selected or row[0] in selected)
+    ]
@@ -0,0 +1,256 @@
+"""Capture the query plans of the statements of the transformations"""
+
+import csv
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Final, Generator, List, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import CompileError
+from sqlalchemy.sql.visitors import cloned_traverse
+
+from ..models.modelutils import DIALECT_POSTGRES
+from .db import DUCKDB_ROWCOUNT_ATTRIBUTE, AbstractSession, FakeSession
+from .logger import LOG_DIR
+
+logger = logging.getLogger("ETL.Core")
+
+# only single statements which can be explained, so that EXPLAIN
+# never fails and aborts the transaction of the transformation
+EXPLAINABLE: Final[re.Pattern] = re.compile(
+    r"^\s*(WITH|SELECT|INSERT|UPDATE|DELETE)\b(?![^;]*;\s*\S)",
+    re.IGNORECASE | re.DOTALL,
+)
+DML: Final[re.Pattern] = re.compile(
+    r"^\s*(INSERT|UPDATE|DELETE)\b", re.IGNORECASE
+)
+SUMMARY_FILE: Final[str] = "statements.csv"
+SUMMARY_COLUMNS: Final[List[str]] = [
+    "statement",
+    "transformation",
+    "seconds",
+    "rowcount",
+    "plan_file",
+]
+
+
+def default_report_dir() -> Path:
+    """A new report directory next to the log files"""
+    return Path(LOG_DIR) / f"explain_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+
+def _with_values(compiled: Any, values: Dict[str, Any]) -> Any:
+    """
+    The statement of a compiled statement, with its bound parameters set
+    to the values it was executed with. The values of an expanding (IN)
+    parameter are given as one parameter per value.
+    """
+    bound = {}
+    for bind, name in compiled.bind_names.items():
+        if bind.expanding:
+            expanded = []
+            while f"{name}_{len(expanded) + 1}" in values:
+                expanded.append(values[f"{name}_{len(expanded) + 1}"])
+            bound[bind.key] = expanded
+        elif name in values:
+            bound[bind.key] = values[name]
+
+    def _set_value(bind: Any) -> None:
+        if bind.key in bound:
+            bind.value = bound[bind.key]
+            bind.required = False
+
+    # as ClauseElement.params, which INSERT statements do not support
+    return cloned_traverse(
+        compiled.statement,
+        {"maintain_key": True, "detect_subquery_cols": True},
+        {"bindparam": _set_value},
+    )
+
+
+class PlanCapture:
+    """
+    Write the query plan of every statement a transformation executes
+    to a report directory, with its timing and cardinalities.
+
+    Plans are read with EXPLAIN before a statement runs. With analyze,
+    SELECT statements are also run with EXPLAIN ANALYZE before they run,
+    and INSERT, UPDATE and DELETE statements are run as EXPLAIN ANALYZE,
+    so they are executed once and the plan holds the actual rows of every
+    operator. The rowcount of those statements is unknown, so the rows
+    reported by the transformations are 0.
+
+    Only the statements executed by the thread running a transformation
+    are captured, on all connections of the engine.
+    """
+
+    def __init__(self, analyze: bool = False, report_dir: Any = None) -> None:
+        self.analyze = analyze
+        self.report_dir = Path(report_dir or default_report_dir())
+        self._engines: Set[int] = set()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._statements = 0
+
+    def _listen(self, session: AbstractSession) -> None:
+        engine = session.connection().engine
+        with self._lock:
+            if id(engine) in self._engines:
+                return
+            if not self._engines:
+                self.report_dir.mkdir(parents=True, exist_ok=True)
+                with open(
+                    self.report_dir / SUMMARY_FILE, "w", newline=""
+                ) as summary:
+                    csv.writer(summary).writerow(SUMMARY_COLUMNS)
+                logger.info("Writing query plans to %s", self.report_dir)
+            self._engines.add(id(engine))
+        self._register(engine)
+
+    def _register(self, engine: Engine) -> None:
+        event.listen(
+            engine,
+            "before_cursor_execute",
+            self._before_cursor_execute,
+            retval=True,
+        )
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _explain(self, dialect_name: str, statement: str) -> str:
+        if not self.analyze:
+            return "EXPLAIN " + statement
+        if dialect_name == DIALECT_POSTGRES.name:
+            return "EXPLAIN (ANALYZE, BUFFERS) " + statement
+        return "EXPLAIN ANALYZE " + statement
+
+    @staticmethod
+    def _without_parameters(
+        conn, statement: str, parameters: Any, context: Any
+    ) -> Optional[str]:
+        """
+        The statement with its parameters rendered as literals, as DuckDB
+        cannot explain a statement with parameters. None if not possible.
+        """
+        if not parameters or conn.dialect.name == DIALECT_POSTGRES.name:
+            return statement
+        compiled = getattr(context, "compiled", None)
+        if compiled is None or compiled.statement is None:
+            return None
+        statement = compiled.statement
+        if getattr(context, "compiled_parameters", None):
+            # the values given when executing, not those of the construct
+            statement = _with_values(compiled, context.compiled_parameters[0])
+        try:
+            return str(
+                statement.compile(
+                    dialect=conn.dialect,
+                    compile_kwargs={"literal_binds": True},
+                )
+            )
+        except CompileError:
+            return None
+
+    # pylint: disable=unused-argument,too-many-arguments
+    def _before_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        operation = getattr(self._local, "operation", None)
+        if operation is None or executemany or not EXPLAINABLE.match(statement):
+            return statement, parameters
+        explained = self._without_parameters(
+            conn, statement, parameters, context
+        )
+        if explained is None:
+            return statement, parameters
+        explain_parameters = (
+            parameters if explained == statement else type(parameters)()
+        )
+        self._local.started = time.perf_counter()
+        self._local.plan = None
+        if self.analyze and DML.match(statement):
+            # run the statement itself through EXPLAIN ANALYZE
+            self._local.rewritten = True
+            return self._explain(conn.dialect.name, explained), (
+                explain_parameters
+            )
+        self._local.rewritten = False
+        cursor.execute(
+            self._explain(conn.dialect.name, explained), explain_parameters
+        )
+        self._local.plan = cursor.fetchall()
+        self._local.started = time.perf_counter()
+        return statement, parameters
+
+    def _after_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ) -> None:
+        if getattr(self._local, "started", None) is None:
+            return
+        seconds = time.perf_counter() - self._local.started
+        self._local.started = None
+        rowcount = getattr(context, DUCKDB_ROWCOUNT_ATTRIBUTE, cursor.rowcount)
+        plan = self._local.plan
+        if self._local.rewritten:
+            plan = cursor.fetchall()
+            rowcount = -1
+            if context is not None:
+                # the rows returned are the plan, not the rows affected
+                setattr(context, DUCKDB_ROWCOUNT_ATTRIBUTE, -1)
+        self._write(statement, parameters, seconds, rowcount, plan)
+
+    def _write(
+        self,
+        statement: str,
+        parameters: Any,
+        seconds: float,
+        rowcount: int,
+        plan: Optional[List[Any]],
+    ) -> None:
+        operation = self._local.operation
+        with self._lock:
+            self._statements += 1
+            number = self._statements
+        plan_file = (
+            f"{number:05d}_{re.sub(r'[^0-9A-Za-z]+', '_', operation)}.txt"
+        )
+        lines = [
+            f"-- transformation: {operation}",
+            f"-- seconds: {seconds:.3f}",
+            f"-- rowcount: {rowcount}",
+            statement,
+            f"-- parameters: {parameters}" if parameters else "",
+            "",
+        ]
+        for row in plan or []:
+            lines.extend(str(value) for value in row)
+        (self.report_dir / plan_file).write_text("\n".join(lines) + "\n")
+        with self._lock, open(
+            self.report_dir / SUMMARY_FILE, "a", newline=""
+        ) as summary:
+            csv.writer(summary).writerow(
+                [number, operation, f"{seconds:.3f}", rowcount, plan_file]
+            )
+
+    @contextmanager
+    def capturing(
+        self, key: str, session: AbstractSession
+    ) -> Generator[None, None, None]:
+        """Capture the plans of the statements run by a transformation"""
+        if isinstance(session, FakeSession) or not hasattr(
+            session, "connection"
+        ):
+            yield
+            return
+        self._listen(session)
+        self._local.operation = key
+        try:
+            yield
+        finally:
+            self._local.operation = None
+            self._local.started = None
@@ -6,13 +6,15 @@ import types
 from datetime import datetime
 from functools import partial
 from logging import ERROR, Handler, Logger as Log, getLogger
-from typing import Optional
+from typing import Final, Optional
 
 import pandas as pd
 
 from .exceptions import TransformationErrorException
 from .memory import get_memory_use
 
+LOG_DIR: Final[str] = "../log"
+
 
 def log_memory_use(logger: Log) -> None:
     """
@@ -92,7 +94,7 @@ def set_logger_verbosity(logger: logging.Logger, verbosity_level: str) -> None:
 
 
 def setup_logger(verbosity_level: str) -> logging.Logger:
-    logdir = "../log"
+    logdir = LOG_DIR
     if not os.path.exists(logdir):
         os.makedirs(logdir)
 
@@ -1,9 +1,20 @@
 """get memory usage"""
 
 import os
+import re
+from typing import Dict, Final
 
 import psutil
 
+MEMORY_UNITS: Final[Dict[str, int]] = {
+    "": 1,
+    "b": 1,
+    "kb": 1024,
+    "mb": 1024**2,
+    "gb": 1024**3,
+    "tb": 1024**4,
+}
+
 
 def get_memory_use():
     """
@@ -12,3 +23,14 @@ def get_memory_use():
     """
     process = psutil.Process(os.getpid())
     return process.memory_info().rss  # in bytes
+
+
+def parse_memory_size(size: str) -> int:
+    """
+    Convert a memory size such as '120gb' or '512MB' to bytes.
+    A number without a unit is in bytes.
+    """
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]*)\s*", str(size))
+    if match is None or match.group(2).lower() not in MEMORY_UNITS:
+        raise ValueError(f"Invalid memory size: {size}")
+    return int(float(match.group(1)) * MEMORY_UNITS[match.group(2).lower()])
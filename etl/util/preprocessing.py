@@ -3,115 +3,84 @@ Preprocessing the source data
 """
 
 import logging
+from typing import Iterable, List
 
 import pandas as pd
-from sqlalchemy import and_
+from sqlalchemy import select
 
-from etl.models.omopcdm54.vocabulary import Concept
-from etl.util.db import AbstractSession, session_context
+from etl.models.omopcdm54 import LookupValidation
+from etl.models.tempmodels import ConceptLookupStem
+from etl.sql.lookup_validation import (
+    SQL_CREATE_LOOKUP_VALIDATION,
+    get_era_lookback_interval_statements,
+    get_lookup_validation_statements,
+)
+from etl.util.db import AbstractSession, FakeSession
 
 logger = logging.getLogger("ETL.Core.PreProcessing")
 
 
-def _validate_concept_id(concept_id: int, session: AbstractSession) -> int:
-    if not concept_id:
-        return 0
-    with session_context(session):
-        counter_result = (
-            session.query(Concept)
-            .where(
-                and_(
-                    Concept.concept_id == concept_id,
-                    Concept.standard_concept == "S",
-                )
-            )
-            .count()
-        )
-        if counter_result == 0:
-            logger.debug(
-                """\tConcept id %s is missing in the concept table of OMOP CDM database. It has been set to 0.""",
-                concept_id,
-            )
-            return 0
-    return concept_id
-
-
-def validate_concept_ids(
-    input_df: pd.DataFrame, session: AbstractSession, concept_column: str
-) -> pd.DataFrame:
-    # Validates concept ids. If they are not present in the existing concept ids, it will log
-    # the concept_id and set it to 0.
-
-    input_df[concept_column] = input_df.apply(
-        lambda x: _validate_concept_id(x[concept_column], session),
-        axis=1,
-    ).astype(int)
-    return input_df
-
-
-def _validate_domain_id(
-    concept_id: int, domain_id: str, session: AbstractSession
-) -> str:
-    with session_context(session):
-        valid_domain = (
-            session.query(Concept.domain_id)
-            .where(Concept.concept_id == concept_id)
-            .scalar()
-        )
-        if valid_domain != domain_id and concept_id != 0:
-            logger.debug(
-                """Domain id %s is not valid for concept id %s. It has been set to %s.""",
-                domain_id,
-                concept_id,
-                valid_domain,
-            )
-            return valid_domain
-    return domain_id
-
-
-def validate_domain_ids(
-    input_df: pd.DataFrame,
-    session: AbstractSession,
-    concept_column: str,
-    domain_column: str,
-) -> pd.DataFrame:
-
-    input_df[domain_column] = input_df.apply(
-        lambda x: _validate_domain_id(
-            x[concept_column], x[domain_column], session
-        ),
-        axis=1,
-    ).astype(str)
-    return input_df
-
-
-def validate_timezones(
-    input_df: pd.DataFrame, session: AbstractSession, timezone_column: str
-) -> pd.DataFrame:
-    original_tz = input_df[timezone_column]
-
-    allowed_tz = set(session.scalars("SELECT name FROM pg_timezone_names()"))
-    provided_tz = set(tz for tz in original_tz if not pd.isna(tz))
-
-    for invalid_tz in provided_tz - allowed_tz:
-        logger.debug("Invalid time zone '%s' replaced by NULL.", invalid_tz)
-
-    new_tz = [str(tz) if tz in allowed_tz else None for tz in original_tz]
-    input_df[timezone_column] = new_tz
-    return input_df
-
-
-def validate_era_lookback_intervals(
-    input_df: pd.DataFrame, era_lookback_interval_column: str
-) -> pd.DataFrame:
-    for era in set(input_df[era_lookback_interval_column]):
+def invalid_era_lookback_intervals(intervals: Iterable[str]) -> List[str]:
+    """The era lookback intervals that are not time deltas"""
+    invalid = []
+    for era in set(intervals):
+        if era is None:
+            continue
         try:
             pd.to_timedelta(era)
         except ValueError:
-            logger.debug(
-                "Invalid era_lookback_interval '%s' replaced by NULL", era
+            invalid.append(era)
+    return invalid
+
+
+def validate_lookup_tables(session: AbstractSession) -> pd.DataFrame:
+    """
+    Validate the loaded lookup tables against the vocabulary in a single
+    pass of set-based statements, and return the replacements made, as
+    reported to the lookup validation table.
+    """
+    session.execute(SQL_CREATE_LOOKUP_VALIDATION)
+    for stmt in get_lookup_validation_statements():
+        session.execute(stmt)
+    if not isinstance(session, FakeSession):
+        intervals = session.scalars(
+            select(ConceptLookupStem.era_lookback_interval).distinct()
+        ).all()
+        for stmt in get_era_lookback_interval_statements(
+            invalid_era_lookback_intervals(intervals)
+        ):
+            session.execute(stmt)
+    session.commit()
+
+    columns = [
+        LookupValidation.lookup_table,
+        LookupValidation.lookup_column,
+        LookupValidation.lookup_id,
+        LookupValidation.original_value,
+        LookupValidation.replacement_value,
+        LookupValidation.reason,
+    ]
+    if isinstance(session, FakeSession):
+        return pd.DataFrame(columns=[c.key for c in columns])
+    report = pd.DataFrame(
+        session.execute(
+            select(*columns).order_by(
+                LookupValidation.lookup_table,
+                LookupValidation.lookup_column,
+                LookupValidation.lookup_id,
             )
-            replace_idx = input_df[era_lookback_interval_column] == era
-            input_df.loc[replace_idx, era_lookback_interval_column] = None
-
-    return input_df
+        ).all(),
+        columns=[c.key for c in columns],
+    )
+    for (table, lookup_column, reason), replaced in report.groupby(
+        ["lookup_table", "lookup_column", "reason"]
+    ):
+        logger.debug(
+            "%s value(s) of %s.%s replaced, %s: %s",
+            len(replaced),
+            table,
+            lookup_column,
+            reason,
+            ", ".join(sorted(set(replaced["original_value"].astype(str)))),
+        )
+    return report
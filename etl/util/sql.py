@@ -1,5 +1,9 @@
 """A module for sql helpers"""
 
+import functools
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
 
 def clean_sql(func):
     """Decorator for cleaning sql statements generated in functions"""
@@ -12,3 +16,31 @@ def clean_sql(func):
         return cleaned_sql.strip()
 
     return decorated
+
+
+def cached_statement(func: Callable) -> Callable:
+    """
+    Decorator caching the statements built by a function, by its arguments,
+    which must be hashable.
+
+    The values that change between executions (batches of ids, concept ids)
+    must be bound parameters given when executing, not arguments. The same
+    statement is then executed every time, and SQLAlchemy compiles it once
+    per dialect into the compiled cache of the engine, instead of building
+    and compiling it again for every execution.
+    """
+    cache: Dict[Tuple[Hashable, ...], Any] = {}
+    lock = threading.Lock()
+
+    @functools.wraps(func)
+    def decorated(*args, **kwargs) -> Any:
+        key = (args, tuple(sorted(kwargs.items())))
+        with lock:
+            if key in cache:
+                return cache[key]
+        statement = func(*args, **kwargs)
+        with lock:
+            return cache.setdefault(key, statement)
+
+    decorated.cache_clear = cache.clear
+    return decorated
@@ -0,0 +1,116 @@
+import unittest
+from datetime import datetime
+
+from sqlalchemy import select
+
+from etl.models.omopcdm54 import CDMSummary
+from etl.process import run_transformations
+from etl.sql.cdm_summary import (
+    SummaryBuffer,
+    log_transform_to_summary_table,
+    write_summary,
+)
+from etl.transform.session_operation import SessionOperation
+from etl.util.db import FakeSession, make_db_session, session_context
+from tests.testutils import DuckDBBaseTest
+
+
+class CDMSummaryUnitTests(unittest.TestCase):
+    def test_buffer_merges_metrics(self):
+        session = FakeSession()
+        summary = SummaryBuffer()
+        summary.add("a", start_transform_datetime=datetime(2024, 1, 1))
+        summary.add("a", model_row_count=3, memory_used=None)
+        summary.add("b", model_row_count=1)
+        summary.flush(session)
+
+        # a single upsert for all transformations
+        self.assertEqual(len(session.get_sql_log()), 1)
+        params = session.get_sql_log()[0].compile().params
+        self.assertEqual(params["transform_name_m0"], "a")
+        self.assertEqual(params["model_row_count_m0"], 3)
+        self.assertIsNone(params["memory_used_m0"])
+        self.assertEqual(params["transform_name_m1"], "b")
+
+        # nothing left to write
+        summary.flush(session)
+        self.assertEqual(len(session.get_sql_log()), 1)
+
+
+class CDMSummaryDuckDBTests(DuckDBBaseTest):
+    def setUp(self):
+        super().setUp()
+        self._create_tables_and_schemas(models=[CDMSummary])
+
+    def tearDown(self):
+        self._drop_tables_and_schemas(models=[CDMSummary])
+        super().tearDown()
+
+    def test_upsert(self):
+        with session_context(make_db_session(self.engine)) as session:
+            log_transform_to_summary_table(
+                session, "a", model_row_count=3, memory_used=10
+            )
+            log_transform_to_summary_table(session, "b", model_row_count=1)
+            # logged again, the metrics not given keep their value
+            log_transform_to_summary_table(session, "a", model_row_count=5)
+            rows = session.execute(
+                select(
+                    CDMSummary.transform_name,
+                    CDMSummary.model_row_count,
+                    CDMSummary.memory_used,
+                ).order_by(CDMSummary.transform_name)
+            ).all()
+
+        self.assertEqual([tuple(r) for r in rows], [("a", 5, 10), ("b", 1, None)])
+
+    def test_run_transformations(self):
+        def make_session():
+            return make_db_session(self.engine)
+
+        def op(key):
+            return SessionOperation(
+                key=key,
+                session=make_session(),
+                func=lambda s: 2,
+                inputs=[],
+                outputs=[f"x.{key}"],
+            )
+
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                run_transformations(
+                    make_session(),
+                    [(1, op(f"a{workers}")), (2, op(f"b{workers}"))],
+                    workers=workers,
+                    session_factory=make_session,
+                )
+                with session_context(make_session()) as session:
+                    rows = session.execute(
+                        select(
+                            CDMSummary.transform_name,
+                            CDMSummary.model_row_count,
+                        )
+                        .where(CDMSummary.transform_name.like(f"%{workers}"))
+                        .order_by(CDMSummary.transform_name)
+                    ).all()
+                self.assertEqual(
+                    [tuple(r) for r in rows],
+                    [(f"a{workers}", 2), (f"b{workers}", 2)],
+                )
+
+    def test_missing_table(self):
+        self._drop_tables_and_schemas(models=[CDMSummary])
+        with session_context(make_db_session(self.engine)) as session:
+            session.execute("CREATE TABLE kept (n INTEGER);")
+            summary = SummaryBuffer()
+            summary.add("a", model_row_count=1)
+            # nothing is written, and the session is left as it is
+            write_summary(session, summary)
+            session.execute("INSERT INTO kept VALUES (1);")
+            self.assertEqual(session.execute("SELECT count(*) FROM kept").scalar(), 1)
+            session.execute("DROP TABLE kept;")
+        self._create_tables_and_schemas(models=[CDMSummary])
+
+
+__all__ = ["CDMSummaryUnitTests", "CDMSummaryDuckDBTests"]
@@ -0,0 +1,43 @@
+import logging
+import unittest
+
+from etl.models.source import Administrations, Prescriptions
+from etl.sql.stem.drug_recipes import get_drug_recipes
+
+
+def _mapping(uid, drug_exposure_type, quantity, conversion=None):
+    return {
+        "uid": uid,
+        "drug_exposure_type": drug_exposure_type,
+        "quantity_or_value_as_number": quantity,
+        "conversion": conversion,
+    }
+
+
+class DrugRecipesUnitTests(unittest.TestCase):
+    def test_recipe_per_distinct_formula(self):
+        mappings = [
+            _mapping(1, "bolus", "value"),
+            _mapping(2, "continuous", "value", "recipe__g_to_mg"),
+            _mapping(3, "continuous", "recipe__solumdr__continuous", "1/1000"),
+            _mapping(4, "bolus", "recipe__solumdr__bolus", "recipe__g_to_mg"),
+            _mapping(5, "bolus", "value0"),
+        ]
+        recipes = get_drug_recipes(mappings, Administrations, Prescriptions, logging.getLogger())
+
+        # the uid, quantity recipe id, conversion recipe id and factor of each mapping
+        sql = str(recipes.table.compile(compile_kwargs={"literal_binds": True}))
+        self.assertIn(
+            "VALUES (1, 0, NULL, 1.0), (2, 0, 0, NULL), (3, 1, NULL, 0.001), (4, 2, 0, NULL), (5, 3, NULL, 1.0)",
+            sql,
+        )
+        # one branch per distinct formula, not per mapping
+        self.assertEqual(len(recipes.quantity.whens), 4)
+        self.assertEqual(len(recipes.conversion.whens), 1)
+
+    def test_no_mappings(self):
+        recipes = get_drug_recipes([], Administrations, Prescriptions, logging.getLogger())
+        self.assertIs(recipes.conversion, recipes.table.c.conversion_factor)
+
+
+__all__ = ["DrugRecipesUnitTests"]
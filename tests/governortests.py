@@ -0,0 +1,145 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy import text
+
+from etl.governor import Allotment, ResourceGovernor
+from etl.process import run_transformations
+from etl.transform.session_operation import SessionOperation
+from etl.util.db import FakeSession, make_db_session, make_fake_session
+from tests.testutils import DuckDBBaseTest
+
+
+class GovernorUnitTests(unittest.TestCase):
+
+    def _op(self, key, func=lambda s: None, inputs=None, outputs=None, footprint=None):
+        return SessionOperation(
+            key=key,
+            session=make_fake_session(),
+            func=func,
+            inputs=inputs,
+            outputs=outputs,
+            footprint=footprint,
+        )
+
+    def test_reserve(self):
+        governor = ResourceGovernor("8gb", 8)
+        stem = self._op("stem", footprint=1.0)
+        m = self._op("m", footprint=0.5)
+        o = self._op("o")
+
+        # a transformation running alone gets the whole budget
+        self.assertTrue(governor.reserve(m))
+        self.assertEqual(governor.allotment(m), Allotment(8 * 1024**3, 8))
+        self.assertFalse(governor.reserve(stem))
+        self.assertTrue(governor.reserve(o))
+        self.assertEqual(governor.allotment(o), Allotment(2 * 1024**3, 2))
+        governor.release(m)
+        governor.release(o)
+        self.assertTrue(governor.reserve(stem))
+        self.assertFalse(governor.reserve(o))
+
+    def test_reserve_measured(self):
+        governor = ResourceGovernor("8gb", 8)
+        self.assertTrue(governor.reserve(self._op("m", footprint=0.25)))
+        # the running transformation uses more than it declared
+        governor._usage = governor._usage._replace(rss=7 * 1024**3)
+        self.assertFalse(governor.reserve(self._op("o", footprint=0.25)))
+
+    def test_run_transformations_within_budget(self):
+        lock = threading.Lock()
+        running = set()
+        concurrent = []
+
+        def record(name):
+            def _func(session: FakeSession):
+                with lock:
+                    running.add(name)
+                    concurrent.append(set(running))
+                time.sleep(0.05)
+                with lock:
+                    running.remove(name)
+                return name
+
+            return _func
+
+        transformations = [
+            (1, self._op("stem", record("stem"), [], ["x.stem"], 1.0)),
+            (2, self._op("m", record("m"), ["x.stem"], ["x.m"], 0.5)),
+            (3, self._op("o", record("o"), ["x.stem"], ["x.o"], 0.5)),
+            (4, self._op("p", record("p"), ["x.stem"], ["x.p"], 0.5)),
+        ]
+        governor = ResourceGovernor("8gb", 8, sample_interval=0.01)
+        run_transformations(
+            make_fake_session(),
+            transformations,
+            workers=4,
+            session_factory=make_fake_session,
+            governor=governor,
+        )
+
+        self.assertEqual(concurrent[0], {"stem"})
+        # only two of the three fit in the budget at the same time
+        self.assertLessEqual(max(len(c) for c in concurrent), 2)
+        self.assertEqual(len(concurrent), 4)
+
+    def test_apply_only_duckdb(self):
+        governor = ResourceGovernor("150gb", 40)
+        op = self._op("stem", footprint=1.0)
+        session = MagicMock()
+        session.connection.return_value.dialect.name = "postgresql"
+        governor.reserve(op)
+        governor.apply(op, session)
+        # the settings of a Postgres server are left as they are
+        session.execute.assert_not_called()
+
+    def test_sampling_stops_on_failure(self):
+        governor = ResourceGovernor("8gb", 8, sample_interval=0.01)
+        with patch.object(governor, "sample", side_effect=RuntimeError("boom")) as sample:
+            with self.assertLogs("ETL.Core", level="WARNING") as logs:
+                with governor.sampling(make_fake_session):
+                    time.sleep(0.1)
+
+        # the first failure is logged, and nothing is sampled after it
+        self.assertEqual(sample.call_count, 1)
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("boom", logs.output[0])
+
+
+class GovernorDuckDBTests(DuckDBBaseTest):
+
+    def test_apply(self):
+        session = make_db_session(self.engine)
+        governor = ResourceGovernor("2gb", 4)
+        stem = SessionOperation(
+            key="stem", session=session, func=lambda s: None, footprint=1.0
+        )
+        governor.reserve(stem)
+        governor.apply(stem, session)
+        self.assertEqual(
+            session.execute(text("SELECT current_setting('threads')")).scalar(),
+            4,
+        )
+        self.assertIsNotNone(governor.sample(session))
+
+        # running next to another transformation, it gets its share
+        measurement = self._op_of(session, "measurement")
+        governor.release(stem)
+        governor.reserve(self._op_of(session, "observation"))
+        governor.reserve(measurement)
+        governor.apply(measurement, session)
+        self.assertEqual(
+            session.execute(text("SELECT current_setting('threads')")).scalar(),
+            2,
+        )
+        session.close()
+
+    def _op_of(self, session, key):
+        return SessionOperation(
+            key=key, session=session, func=lambda s: None, footprint=0.5
+        )
+
+
+__all__ = ["GovernorUnitTests", "GovernorDuckDBTests"]
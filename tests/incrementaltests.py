@@ -0,0 +1,189 @@
+import os
+import unittest
+
+from etl.models.omopcdm54 import (
+    CDMSource,
+    DeltaPerson,
+    Person as OmopPerson,
+    PersonMap,
+    SourceWatermark,
+    VisitMap,
+)
+from etl.models.source import (
+    Administrations,
+    CourseIdCprMapping,
+    CourseMetadata,
+    DiagnosesProcedures,
+    LabkaBccLaboratory,
+    LprDiagnoses,
+    LprOperations,
+    LprProcedures,
+    Observations,
+    Person as SourcePerson,
+    Prescriptions,
+)
+from etl.sql.incremental import (
+    PERSON_SCOPED_MODELS,
+    create_incremental_tables,
+    get_delta_person_select,
+    get_source_watermarks,
+    get_watermarks,
+    purge_delta_persons,
+    restrict_to_delta_persons,
+    save_watermarks,
+    set_delta_persons,
+)
+from etl.sql.measurement import MeasurementInsert
+from etl.transform.person import transform as person_transform
+from etl.util.db import make_db_session, session_context
+from tests.testutils import DuckDBBaseTest
+
+
+class IncrementalUnitTests(unittest.TestCase):
+    def test_restrict_to_delta_persons(self):
+        sql = str(restrict_to_delta_persons(MeasurementInsert))
+        self.assertIn("INSERT INTO omopcdm.measurement", sql)
+        # the Stem is read through the rows of the persons to process
+        self.assertIn("FROM omopcdm.stem \nWHERE omopcdm.stem.person_id IN", sql)
+        self.assertIn("omopcdm.delta_person", sql)
+
+    def test_restrict_person_insert(self):
+        from etl.sql.person import get_person_insert
+
+        sql = str(restrict_to_delta_persons(get_person_insert()))
+        self.assertIn("INSERT INTO omopcdm.person", sql)
+        self.assertIn(
+            "WHERE registries.person.cpr_enc IN (SELECT substr(omopcdm.delta_person.person_source_value",
+            sql,
+        )
+
+    def test_restrict_course_sources(self):
+        from etl.sql.visit_occurrence import get_visit_occurrence_insert
+
+        sql = str(restrict_to_delta_persons(get_visit_occurrence_insert("x")))
+        self.assertIn(
+            "WHERE source.course_metadata.courseid IN (SELECT source.courseid_cpr_mapping.courseid",
+            sql,
+        )
+        self.assertIn(
+            "WHERE source.courseid_cpr_mapping.cpr_enc IN (SELECT substr(omopcdm.delta_person.person_source_value",
+            sql,
+        )
+
+
+class IncrementalDuckDBTests(DuckDBBaseTest):
+    SOURCE_MODELS = [
+        CourseMetadata,
+        Administrations,
+        Prescriptions,
+        DiagnosesProcedures,
+        Observations,
+        SourcePerson,
+        CourseIdCprMapping,
+        LprDiagnoses,
+        LprProcedures,
+        LprOperations,
+        LabkaBccLaboratory,
+    ]
+    OMOP_MODELS = [OmopPerson, CDMSource, *PERSON_SCOPED_MODELS]
+
+    def setUp(self):
+        super().setUp()
+        self._create_tables_and_schemas(self.SOURCE_MODELS)
+        self._create_tables_and_schemas(self.OMOP_MODELS)
+        with session_context(make_db_session(self.engine)) as session:
+            create_incremental_tables(session)
+            session.execute(
+                """
+                INSERT INTO registries.person
+                    (_id, cpr_enc, c_kon, d_foddato, c_status, d_status_hen_start)
+                VALUES
+                    (1, 'A', 'M', '1970-01-01', '1', '1990-01-01'),
+                    (2, 'B', 'K', '1971-01-01', '1', '1990-01-01'),
+                    (3, 'C', 'K', '1972-01-01', '1', '1990-01-01');
+                INSERT INTO source.courseid_cpr_mapping (_id, cpr_enc, courseid)
+                VALUES (1, 'A', 10), (2, 'B', 20), (3, 'C', 30);
+                INSERT INTO source.course_metadata (_id, courseid, variable, value)
+                VALUES (1, 10, 'admdate', '2020-01-01');
+                """
+            )
+        os.environ["REGISTRY_START_DATE"] = "1977-01-01"
+
+    def tearDown(self) -> None:
+        self._drop_tables_and_schemas(
+            [*self.OMOP_MODELS, SourceWatermark, DeltaPerson, PersonMap, VisitMap]
+        )
+        self._drop_tables_and_schemas(self.SOURCE_MODELS)
+        super().tearDown()
+
+    def test_watermarks(self):
+        with session_context(make_db_session(self.engine)) as session:
+            watermarks = get_source_watermarks(session)
+            self.assertEqual(watermarks["registries.person"], 3)
+            self.assertEqual(watermarks["source.course_metadata"], 1)
+            self.assertEqual(watermarks["source.observations"], 0)
+
+            save_watermarks(session, watermarks)
+            self.assertEqual(get_watermarks(session), watermarks)
+
+    def test_delta_persons(self):
+        with session_context(make_db_session(self.engine)) as session:
+            previous = get_source_watermarks(session)
+            session.execute(
+                """
+                INSERT INTO source.observations (_id, courseid, variable, value)
+                VALUES (1, 20, 'x', '1');
+                INSERT INTO registries.laboratory (_id, cpr_enc)
+                VALUES (1, 'C');
+                """
+            )
+            current = get_source_watermarks(session)
+            n_persons = set_delta_persons(
+                session, get_delta_person_select(previous, current)
+            )
+            delta = {
+                r[0] for r in session.query(DeltaPerson.person_source_value)
+            }
+
+        self.assertEqual(n_persons, 2)
+        self.assertEqual(delta, {"cpr_enc|B", "cpr_enc|C"})
+
+    def test_incremental_person(self):
+        with session_context(make_db_session(self.engine)) as session:
+            person_transform(session)
+            previous = get_source_watermarks(session)
+            session.execute(
+                """
+                UPDATE registries.person SET c_kon = 'M' WHERE cpr_enc = 'B';
+                INSERT INTO source.observations (_id, courseid, variable, value)
+                VALUES (1, 20, 'x', '1');
+                """
+            )
+            set_delta_persons(
+                session,
+                get_delta_person_select(
+                    previous, get_source_watermarks(session)
+                ),
+            )
+            purge_delta_persons(session)
+            self.assertEqual(session.query(OmopPerson).count(), 2)
+
+            person_transform(session, incremental=True)
+            persons = dict(
+                session.query(
+                    OmopPerson.person_source_value,
+                    OmopPerson.gender_source_value,
+                ).all()
+            )
+
+        self.assertEqual(
+            persons,
+            {
+                "cpr_enc|A": "c_kon|M",
+                "cpr_enc|B": "c_kon|M",
+                "cpr_enc|C": "c_kon|K",
+            },
+        )
+
+
+__all__ = ["IncrementalUnitTests", "IncrementalDuckDBTests"]
@@ -0,0 +1,49 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+from etl.loader import HAS_PYARROW, CSVFileLoader, model_dtypes
+from etl.models.tempmodels import ConceptLookup, ConceptLookupStem
+from etl.util.exceptions import DependencyNotFoundException
+
+
+class LoaderUnitTests(unittest.TestCase):
+    def test_model_dtypes(self):
+        self.assertEqual(
+            model_dtypes(ConceptLookup, arrow=False),
+            {"lookup_id": "Int64", "concept_string": "string", "concept_id": "Int64", "filter": "string"},
+        )
+        dtypes = model_dtypes(ConceptLookupStem, arrow=True)
+        self.assertEqual(dtypes["mapped_standard_code"], "int64[pyarrow]")
+        self.assertEqual(dtypes["range_low"], "double[pyarrow]")
+        self.assertEqual(dtypes["timezone"], "string[pyarrow]")
+
+    def test_load_typed(self):
+        with tempfile.TemporaryDirectory() as lookup_dir:
+            with open(Path(lookup_dir) / "concept_lookup.csv", "w") as f:
+                f.write("concept_string;concept_id;filter\n01;8532;\n;;person\n")
+            with open(Path(lookup_dir) / "concept_lookup_stem.csv", "w") as f:
+                f.write("uid;mapped_standard_code;timezone\n1;;\n2;4094581;Europe/Copenhagen\n")
+            loader = CSVFileLoader(Path(lookup_dir), [ConceptLookup, ConceptLookupStem], delimiter=";").load()
+
+        concept_lookup = loader.get("concept_lookup")
+        # text is not parsed as numbers, integers with missing values stay integers
+        self.assertEqual(concept_lookup["concept_string"].tolist()[0], "01")
+        self.assertEqual(concept_lookup["concept_id"].tolist()[0], 8532)
+        self.assertTrue(pd.isna(concept_lookup["concept_id"].tolist()[1]))
+        stem = loader.get("concept_lookup_stem")
+        self.assertTrue(pd.api.types.is_integer_dtype(stem["mapped_standard_code"]))
+        self.assertTrue(pd.api.types.is_string_dtype(stem["timezone"]))
+
+    @unittest.skipIf(HAS_PYARROW, "pyarrow is installed")
+    def test_parquet_without_pyarrow(self):
+        with tempfile.TemporaryDirectory() as lookup_dir:
+            (Path(lookup_dir) / "concept_lookup.parquet").touch()
+            loader = CSVFileLoader(Path(lookup_dir), [ConceptLookup], extension=".parquet")
+            with self.assertRaises(DependencyNotFoundException):
+                loader.load()
+
+
+__all__ = ["LoaderUnitTests"]
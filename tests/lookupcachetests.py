@@ -0,0 +1,98 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+from sqlalchemy import insert, select
+
+from etl.loader import CSVFileLoader
+from etl.models.omopcdm54 import Concept, Vocabulary
+from etl.models.tempmodels import ConceptLookup, ConceptLookupStem, LookupCache
+from etl.process import prepare_lookup_tables
+from etl.sql.lookup_cache import lookup_cache_key
+from etl.util.db import make_db_session, session_context
+from tests.testutils import DuckDBBaseTest
+
+
+def _write_lookups(directory: Path, concept_id: int) -> None:
+    pd.DataFrame({"concept_string": ["x"], "concept_id": [concept_id]}).to_csv(
+        directory / "concept_lookup.csv", index=False
+    )
+    pd.DataFrame(
+        {
+            "uid": [1],
+            "mapped_standard_code": [0],
+            "std_code_domain": ["Drug"],
+            "timezone": [None],
+            "era_lookback_interval": [None],
+        }
+    ).to_csv(directory / "concept_lookup_stem.csv", index=False)
+
+
+class LookupCacheUnitTests(unittest.TestCase):
+    def test_content_hash(self):
+        with tempfile.TemporaryDirectory() as lookup_dir:
+            loader = CSVFileLoader(Path(lookup_dir), [ConceptLookup, ConceptLookupStem])
+            _write_lookups(Path(lookup_dir), 1)
+            content_hash = loader.content_hash()
+            # the files are not parsed
+            self.assertEqual(loader.data, {})
+            self.assertEqual(loader.content_hash(), content_hash)
+            _write_lookups(Path(lookup_dir), 2)
+            self.assertNotEqual(loader.content_hash(), content_hash)
+
+    def test_lookup_cache_key(self):
+        self.assertEqual(lookup_cache_key("a", "v5"), lookup_cache_key("a", "v5"))
+        self.assertNotEqual(lookup_cache_key("a", "v5"), lookup_cache_key("b", "v5"))
+        self.assertNotEqual(lookup_cache_key("a", "v5"), lookup_cache_key("a", "v6"))
+
+
+class LookupCacheDuckDBTests(DuckDBBaseTest):
+    MODELS = [Concept, ConceptLookup, ConceptLookupStem, LookupCache]
+
+    def setUp(self):
+        super().setUp()
+        self._create_tables_and_schemas(models=self.MODELS)
+        self._lookup_dir = tempfile.TemporaryDirectory()
+        self.loader = CSVFileLoader(
+            Path(self._lookup_dir.name), [ConceptLookup, ConceptLookupStem]
+        )
+        with session_context(make_db_session(self.engine)) as session:
+            # the sequence of the vocabulary model is not schema qualified
+            session.execute(
+                f"CREATE TABLE {Vocabulary.__table__} (vocabulary_id VARCHAR, vocabulary_version VARCHAR);"
+                f"INSERT INTO {Vocabulary.__table__} VALUES ('None', 'v5');"
+            )
+
+    def tearDown(self):
+        self._lookup_dir.cleanup()
+        with session_context(make_db_session(self.engine)) as session:
+            session.execute(f"DROP TABLE {Vocabulary.__table__};")
+        self._drop_tables_and_schemas(models=self.MODELS)
+        super().tearDown()
+
+    def _prepare(self, reload_vocab: bool = False) -> list:
+        with session_context(make_db_session(self.engine)) as session:
+            prepare_lookup_tables(session, self.loader, reload_vocab)
+            return session.execute(
+                select(ConceptLookup.concept_string).order_by(ConceptLookup.lookup_id)
+            ).scalars().all()
+
+    def test_reuse(self):
+        _write_lookups(Path(self._lookup_dir.name), 1)
+        self.assertEqual(self._prepare(), ["x"])
+        with session_context(make_db_session(self.engine)) as session:
+            session.execute(insert(ConceptLookup).values(lookup_id=2, concept_string="kept", concept_id=0))
+
+        # nothing changed, the tables are not recreated
+        self.assertEqual(self._prepare(), ["x", "kept"])
+        # reloading the vocabulary recreates them
+        self.assertEqual(self._prepare(reload_vocab=True), ["x"])
+
+        with session_context(make_db_session(self.engine)) as session:
+            session.execute(insert(ConceptLookup).values(lookup_id=2, concept_string="kept", concept_id=0))
+        _write_lookups(Path(self._lookup_dir.name), 2)
+        self.assertEqual(self._prepare(), ["x"])
+
+
+__all__ = ["LookupCacheUnitTests", "LookupCacheDuckDBTests"]
@@ -0,0 +1,92 @@
+import unittest
+
+from etl.tools.multisite import (
+    SiteConfig,
+    get_concurrent_sites,
+    get_site_configs,
+)
+from etl.util.memory import parse_memory_size
+
+
+class MultiSiteUnitTests(unittest.TestCase):
+    SITES = {
+        "sites": [
+            {
+                "name": "site1",
+                "department_shak_code": 1234,
+                "source_schema": "source_site1",
+                "target_schema": "omopcdm_site1",
+                "environment": {"INCLUDE_UNMAPPED_CODES": "FALSE"},
+            },
+            {
+                "department_shak_code": "5678",
+                "source_schema": "source_site2",
+                "target_schema": "omopcdm_site2",
+            },
+        ]
+    }
+
+    def test_get_site_configs(self):
+        sites = get_site_configs(self.SITES)
+        self.assertEqual(
+            sites,
+            [
+                SiteConfig(
+                    "site1",
+                    "1234",
+                    "source_site1",
+                    "omopcdm_site1",
+                    {"INCLUDE_UNMAPPED_CODES": "FALSE"},
+                ),
+                SiteConfig(
+                    "omopcdm_site2", "5678", "source_site2", "omopcdm_site2"
+                ),
+            ],
+        )
+        self.assertEqual(
+            sites[0].get_environment(),
+            {
+                "INCLUDE_UNMAPPED_CODES": "FALSE",
+                "DEPARTMENT_SHAK_CODE": "1234",
+                "SOURCE_SCHEMA": "source_site1",
+                "TARGET_SCHEMA": "omopcdm_site1",
+            },
+        )
+
+    def test_get_site_configs_shared_target(self):
+        sites = self.SITES["sites"] + [
+            {
+                "department_shak_code": "9999",
+                "source_schema": "source_site3",
+                "target_schema": "omopcdm_site1",
+            }
+        ]
+        with self.assertRaises(ValueError):
+            get_site_configs(sites)
+
+    def test_get_concurrent_sites(self):
+        self.assertEqual(
+            get_concurrent_sites(12, 8, "120gb", "30gb", "postgresql"), 4
+        )
+        self.assertEqual(
+            get_concurrent_sites(12, 2, "120gb", "30gb", "postgresql"), 2
+        )
+        self.assertEqual(
+            get_concurrent_sites(3, 8, "120gb", "10gb", "postgresql"), 3
+        )
+        self.assertEqual(
+            get_concurrent_sites(12, 8, "10gb", "30gb", "postgresql"), 1
+        )
+        self.assertEqual(
+            get_concurrent_sites(12, 8, "120gb", "30gb", "duckdb"), 1
+        )
+
+    def test_parse_memory_size(self):
+        self.assertEqual(parse_memory_size("2gb"), 2 * 1024**3)
+        self.assertEqual(parse_memory_size("512MB"), 512 * 1024**2)
+        self.assertEqual(parse_memory_size("100"), 100)
+        with self.assertRaises(ValueError):
+            parse_memory_size("lots")
+
+
+__all__ = ["MultiSiteUnitTests"]
@@ -0,0 +1,198 @@
+import os
+import unittest
+from typing import Any, Final
+
+import pandas as pd
+
+from etl.models.modelutils import IntField, PKIdMixin, make_model_base
+from etl.models.omopcdm54 import RunManifest
+from etl.process import plan_resume, record_to_manifest, run_transformations
+from etl.sql.run_manifest import (
+    STATUS_COMPLETED,
+    STATUS_FAILED,
+    create_run_manifest_table,
+    get_completed_steps,
+    run_fingerprint,
+    step_fingerprint,
+)
+from etl.transform.session_operation import SessionOperation
+from etl.util.db import make_db_session, session_context
+from etl.util.exceptions import (
+    ETLFatalErrorException,
+    TransformationErrorException,
+)
+from tests.testutils import DuckDBBaseTest
+
+
+class RunManifestUnitTests(unittest.TestCase):
+    def test_run_fingerprint_lookup_data(self):
+        data = {"lookup": pd.DataFrame({"a": [1, 2]})}
+        self.assertEqual(run_fingerprint(data), run_fingerprint(data))
+        self.assertNotEqual(
+            run_fingerprint(data),
+            run_fingerprint({"lookup": pd.DataFrame({"a": [1, 3]})}),
+        )
+
+    def test_run_fingerprint_lookup_key(self):
+        self.assertEqual(run_fingerprint(lookup_key="a"), run_fingerprint(lookup_key="a"))
+        self.assertNotEqual(run_fingerprint(lookup_key="a"), run_fingerprint(lookup_key="b"))
+
+    def test_run_fingerprint_environment(self):
+        os.environ["ETL_TEST_FINGERPRINT"] = "a"
+        fp = run_fingerprint(environment_variables=["ETL_TEST_FINGERPRINT"])
+        os.environ["ETL_TEST_FINGERPRINT"] = "b"
+        self.assertNotEqual(
+            fp, run_fingerprint(environment_variables=["ETL_TEST_FINGERPRINT"])
+        )
+        del os.environ["ETL_TEST_FINGERPRINT"]
+
+    def test_step_fingerprint(self):
+        self.assertEqual(
+            step_fingerprint("fp", "a", ["x.b", "x.a"]),
+            step_fingerprint("fp", "a", ["x.a", "x.b"]),
+        )
+        self.assertNotEqual(
+            step_fingerprint("fp", "a", ["x.a"]),
+            step_fingerprint("fp", "a", ["x.a", "x.b"]),
+        )
+
+
+class RunManifestDuckDBTests(DuckDBBaseTest):
+
+    TestModelBase: Final[Any] = make_model_base(schema="dummy")
+
+    class DummyTable(TestModelBase, PKIdMixin):
+        __tablename__: Final = "dummy_source"
+        __table_args__ = {"schema": "dummy"}
+
+        a: Final = IntField()
+
+    class DummyTableTwo(TestModelBase, PKIdMixin):
+        __tablename__: Final = "dummy_target"
+        __table_args__ = {"schema": "dummy"}
+
+        a: Final = IntField()
+
+    def setUp(self):
+        super().setUp()
+        self._create_tables_and_schemas(
+            models=[self.DummyTable, self.DummyTableTwo]
+        )
+        self._session = make_db_session(self.engine)
+        create_run_manifest_table(self._session)
+
+    def tearDown(self) -> None:
+        self._drop_tables_and_schemas(
+            models=[self.DummyTable, self.DummyTableTwo, RunManifest]
+        )
+        super().tearDown()
+
+    def _transformations(self, fail: bool):
+        def transform1(session):
+            session.execute(
+                "INSERT INTO dummy.dummy_source (_id, a) VALUES (1, 1), (2, 2)"
+            )
+
+        def transform2(session):
+            if fail:
+                raise TransformationErrorException("Transform 2 failed")
+            session.execute(
+                "INSERT INTO dummy.dummy_target SELECT * FROM dummy.dummy_source"
+            )
+
+        return [
+            (
+                1,
+                SessionOperation(
+                    "source",
+                    self._session,
+                    transform1,
+                    inputs=[],
+                    outputs=[self.DummyTable],
+                ),
+            ),
+            (
+                2,
+                SessionOperation(
+                    "target",
+                    self._session,
+                    transform2,
+                    inputs=[self.DummyTable],
+                    outputs=[self.DummyTableTwo],
+                ),
+            ),
+        ]
+
+    def _run(self, transformations, fingerprint="fp"):
+        run_transformations(
+            self._session,
+            transformations,
+            on_complete=lambda step, trans, session, result: (
+                record_to_manifest(fingerprint, step, trans, session, result)
+            ),
+        )
+
+    def test_record_to_manifest(self):
+        with self.assertRaises(ETLFatalErrorException):
+            self._run(self._transformations(fail=True))
+
+        with session_context(make_db_session(self.engine)) as session:
+            rows = {
+                r[0]: r[1:]
+                for r in session.query(
+                    RunManifest.step_key,
+                    RunManifest.step,
+                    RunManifest.status,
+                    RunManifest.row_count,
+                ).all()
+            }
+        self.assertEqual(rows["source"], (1, STATUS_COMPLETED, 2))
+        self.assertEqual(rows["target"], (2, STATUS_FAILED, None))
+
+    def test_resume_skips_completed(self):
+        with self.assertRaises(ETLFatalErrorException):
+            self._run(self._transformations(fail=True))
+
+        plan = plan_resume(self._session, self._transformations(False), "fp")
+        self.assertEqual(
+            [t.key for _, t in plan], ["create_omop", "target"]
+        )
+        self.assertEqual(plan[0][1].outputs, {"dummy.dummy_target"})
+
+        self._run(plan[1:])
+        with session_context(make_db_session(self.engine)) as session:
+            self.assertEqual(
+                set(get_completed_steps(session)), {"source", "target"}
+            )
+
+    def test_resume_changed_fingerprint(self):
+        self._run(self._transformations(fail=False))
+
+        plan = plan_resume(
+            self._session, self._transformations(False), "changed"
+        )
+        self.assertEqual(
+            [t.key for _, t in plan], ["create_omop", "source", "target"]
+        )
+
+    def test_resume_transient(self):
+        transient = [str(self.DummyTable.__table__)]
+        self._run(self._transformations(fail=False))
+        # a completed run leaves nothing to rebuild
+        plan = plan_resume(
+            self._session, self._transformations(False), "fp", transient
+        )
+        self.assertEqual([t.key for _, t in plan], ["create_omop"])
+
+        with self.assertRaises(ETLFatalErrorException):
+            self._run(self._transformations(fail=True))
+        # the transient table is written again for the step reading it
+        plan = plan_resume(
+            self._session, self._transformations(False), "fp", transient
+        )
+        self.assertEqual(
+            [t.key for _, t in plan], ["create_omop", "source", "target"]
+        )
+
+
+__all__ = ["RunManifestUnitTests", "RunManifestDuckDBTests"]
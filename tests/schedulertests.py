@@ -0,0 +1,144 @@
+import threading
+import time
+import unittest
+
+from etl.process import run_transformations
+from etl.scheduler import DependencyGraph, depends_on, run_scheduled
+from etl.transform.session_operation import SessionOperation
+from etl.util.db import FakeSession, make_fake_session
+
+
+class SchedulerUnitTests(unittest.TestCase):
+
+    def _op(self, key, func=lambda s: None, inputs=None, outputs=None):
+        return SessionOperation(
+            key=key,
+            session=make_fake_session(),
+            func=func,
+            inputs=inputs,
+            outputs=outputs,
+        )
+
+    def test_undeclared_is_barrier(self):
+        a = self._op("a", inputs=[], outputs=["x.a"])
+        b = self._op("b")
+        self.assertTrue(depends_on(b, a))
+        self.assertTrue(depends_on(a, b))
+
+    def test_independent_writers(self):
+        a = self._op("a", inputs=["x.stem"], outputs=["x.measurement"])
+        b = self._op("b", inputs=["x.stem"], outputs=["x.observation"])
+        self.assertFalse(depends_on(b, a))
+
+    def test_read_after_write(self):
+        a = self._op("a", inputs=[], outputs=["x.stem"])
+        b = self._op("b", inputs=["x.stem"], outputs=["x.measurement"])
+        self.assertTrue(depends_on(b, a))
+
+    def test_write_after_read(self):
+        a = self._op("a", inputs=["x.stem"], outputs=["x.measurement"])
+        b = self._op("b", inputs=[], outputs=["x.stem"])
+        self.assertTrue(depends_on(b, a))
+
+    def test_graph(self):
+        graph = DependencyGraph(
+            [
+                (-1, self._op("create")),
+                (1, self._op("stem", inputs=[], outputs=["x.stem"])),
+                (2, self._op("m", inputs=["x.stem"], outputs=["x.m"])),
+                (3, self._op("o", inputs=["x.stem"], outputs=["x.o"])),
+                (4, self._op("p", inputs=["x.m", "x.o"], outputs=["x.p"])),
+            ]
+        )
+        self.assertEqual(graph.dependencies(2), {0, 1})
+        self.assertEqual(graph.dependencies(3), {0, 1})
+        self.assertEqual(graph.dependencies(4), {0, 2, 3})
+        self.assertEqual(graph.ready(done={0, 1}, started={0, 1}), [2, 3])
+        self.assertEqual(graph.ready(done={0, 1, 2}, started={0, 1, 2, 3}), [])
+
+    def test_run_transformations_concurrently(self):
+        lock = threading.Lock()
+        events = []
+        sessions = []
+
+        def record(name):
+            def _func(session: FakeSession):
+                with lock:
+                    events.append(("start", name))
+                    sessions.append(session)
+                time.sleep(0.05)
+                with lock:
+                    events.append(("end", name))
+                return name
+
+            return _func
+
+        transformations = [
+            (1, self._op("stem", record("stem"), [], ["x.stem"])),
+            (2, self._op("m", record("m"), ["x.stem"], ["x.m"])),
+            (3, self._op("o", record("o"), ["x.stem"], ["x.o"])),
+            (4, self._op("p", record("p"), ["x.m", "x.o"], ["x.p"])),
+        ]
+        run_transformations(
+            make_fake_session(),
+            transformations,
+            workers=4,
+            session_factory=make_fake_session,
+        )
+
+        self.assertEqual(events[0], ("start", "stem"))
+        self.assertEqual(events[1], ("end", "stem"))
+        self.assertEqual({events[2], events[3]}, {("start", "m"), ("start", "o")})
+        self.assertEqual(events[-2:], [("start", "p"), ("end", "p")])
+        # every transformation gets its own session
+        self.assertEqual(len(set(id(s) for s in sessions)), 4)
+
+    def test_commit_after_on_complete(self):
+        commits = {}
+
+        def on_complete(step, trans, session, result):
+            session.add(trans.key)
+            commits[trans.key] = (session, session._commits)
+
+        transformations = [
+            (1, self._op("m", inputs=["x.stem"], outputs=["x.m"])),
+            (2, self._op("o", inputs=["x.stem"], outputs=["x.o"])),
+        ]
+        run_transformations(
+            make_fake_session(),
+            transformations,
+            workers=2,
+            session_factory=make_fake_session,
+            on_complete=on_complete,
+        )
+        # the writes of on_complete are committed on the step session
+        for session, committed in commits.values():
+            self.assertGreater(session._commits, committed)
+
+    def test_reserve_only_running(self):
+        reserved = []
+
+        class Governor:
+            def reserve(self, operation):
+                reserved.append(operation.key)
+                return True
+
+            def release(self, operation):
+                reserved.remove(operation.key)
+
+        most_reserved = []
+        transformations = [
+            (1, self._op(key, inputs=[], outputs=[f"x.{key}"])) for key in "mop"
+        ]
+        run_scheduled(
+            transformations,
+            lambda step, operation: most_reserved.append(len(reserved)),
+            workers=2,
+            governor=Governor(),
+        )
+        # the operations waiting for a worker hold no reservation
+        self.assertEqual(max(most_reserved), 2)
+        self.assertEqual(reserved, [])
+
+
+__all__ = ["SchedulerUnitTests"]
@@ -3,14 +3,31 @@ import unittest
 
 from tests.models.sourcetests import *
 from tests.models.targettests import *
+from tests.cdmsummarytests import CDMSummaryUnitTests
+from tests.drugrecipestests import DrugRecipesUnitTests
+from tests.governortests import GovernorUnitTests
+from tests.incrementaltests import IncrementalUnitTests
+from tests.loadertests import LoaderUnitTests
+from tests.lookupcachetests import LookupCacheUnitTests
+from tests.multisitetests import MultiSiteUnitTests
 from tests.processtests import ProcessUnitTests
+from tests.runmanifesttests import RunManifestUnitTests
+from tests.schedulertests import SchedulerUnitTests
+from tests.util.asyncsessiontests import AsyncSessionUnitTests
 from tests.util.connectiontests import *
+from tests.util.dbtests import DataBaseWriterUnitTests, FakeSessionUnitTests
 from tests.util.loggertests import *
+from tests.util.preprocessingtests import PreprocessingUnitTests
 from tests.util.sqltests import *
 
 # only run regression tests if explicitly set ETL_RUN_INTEGRATION_TESTS variable
 if os.getenv("ETL_RUN_INTEGRATION_TESTS", None) == "ON":
+    from tests.cdmsummarytests import CDMSummaryDuckDBTests
+    from tests.governortests import GovernorDuckDBTests
+    from tests.incrementaltests import IncrementalDuckDBTests
+    from tests.lookupcachetests import LookupCacheDuckDBTests
     from tests.processtests import ProcessDuckDBTests, RunETLDuckDBTests
+    from tests.runmanifesttests import RunManifestDuckDBTests
     from tests.transform.care_site_tests import *
     from tests.transform.condition_era_tests import *
     from tests.transform.condition_occurrence_tests import *
@@ -29,7 +46,10 @@ if os.getenv("ETL_RUN_INTEGRATION_TESTS", None) == "ON":
     from tests.transform.specimen_tests import *
     from tests.transform.stem_tests import *
     from tests.transform.visit_occurrence_tests import *
+    from tests.util.asyncsessiontests import AsyncSessionDuckDBTests
     from tests.util.dbtests import *
+    from tests.util.explaintests import *
+    from tests.util.preprocessingtests import PreprocessingDuckDBTests
 
 
 def main():
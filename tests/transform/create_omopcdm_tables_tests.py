@@ -1,9 +1,34 @@
-from etl.sql.create_omopcdm_tables import MODELS
+import unittest
+
+from etl.models.omopcdm54 import Person, Stem
+from etl.sql.create_omopcdm_tables import MODELS, get_ddl_sql
 from etl.transform.create_omopcdm_tables import transform
 from etl.util.db import check_table_exists, make_db_session, session_context
 from tests.testutils import DuckDBBaseTest
 
 
+class CreateOMOPTablesUnitTests(unittest.TestCase):
+    def test_partitioned_stem(self):
+        sql = get_ddl_sql([Person, Stem], partition_stem=True)
+        self.assertIn("PARTITION BY LIST (domain_id)", sql)
+        self.assertIn(
+            "CREATE TABLE omopcdm.stem_measurement PARTITION OF omopcdm.stem "
+            "FOR VALUES IN ('Measurement') PARTITION BY LIST (datasource);",
+            sql,
+        )
+        self.assertIn(
+            "CREATE TABLE omopcdm.stem_drug_other PARTITION OF "
+            "omopcdm.stem_drug DEFAULT;",
+            sql,
+        )
+        self.assertNotIn("PRIMARY KEY (stem_id)", sql)
+        self.assertIn("PRIMARY KEY (person_id)", sql)
+
+    def test_partitioned_stem_not_in_scope(self):
+        sql = get_ddl_sql([Person], partition_stem=True)
+        self.assertNotIn("PARTITION", sql)
+
+
 class CreateOMOPTablesDuckDBTests(DuckDBBaseTest):
     def setUp(self):
         super().setUp()
@@ -25,4 +50,4 @@ class CreateOMOPTablesDuckDBTests(DuckDBBaseTest):
             )
 
 
-__all__ = ["CreateOMOPTablesDuckDBTests"]
+__all__ = ["CreateOMOPTablesUnitTests", "CreateOMOPTablesDuckDBTests"]
@@ -3,11 +3,13 @@
 import pandas as pd
 from sqlalchemy import select
 
+from etl.models.omopcdm54 import PersonMap, VisitMap
 from etl.models.omopcdm54.clinical import (
     Death as OmopDeath,
     Person as OmopPerson,
 )
 from etl.models.source import Person as RegistryPerson
+from etl.sql.id_maps import refresh_person_map
 from etl.transform.death import transform as death_transform
 from etl.util.db import make_db_session, session_context
 from tests.testutils import (
@@ -38,11 +40,12 @@ class DeathTransformationTest(DuckDBBaseTest):
     def tearDown(self) -> None:
         super().tearDown()
         self._drop_tables_and_schemas(self.REGISTRY_MODELS)
-        self._drop_tables_and_schemas(self.TARGET_MODEL)
+        self._drop_tables_and_schemas(self.TARGET_MODEL + [PersonMap, VisitMap])
 
     def _insert_test_data(self, session):
         write_to_db(session, self.source_person_in, RegistryPerson.__tablename__, schema=RegistryPerson.metadata.schema)
         write_to_db(session, self.omop_person_in, OmopPerson.__tablename__, schema=OmopPerson.metadata.schema)
+        refresh_person_map(session)
 
     def test_transform(self):
         del self.expected_df["_id"]  # no need to test stochastic columns
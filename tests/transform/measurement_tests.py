@@ -7,7 +7,9 @@ from etl.models.omopcdm54.clinical import (
     Measurement as OmopMeasurement,
     Stem as OmopStem,
 )
+from etl.sql.stem_fanout import StemFanout
 from etl.transform.measurement import transform as measurement_transformation
+from etl.transform.stem_fanout import transform as stem_fanout_transformation
 from etl.util.db import make_db_session, session_context
 from tests.testutils import (
     DuckDBBaseTest,
@@ -56,4 +58,21 @@ class MeasurementTest(DuckDBBaseTest):
 
         assert_dataframe_equality(result_df, self.expected_df, index_cols='measurement_id')
 
+    def test_transform_fanout(self):
+        self._insert_test_data(self.engine)
+
+        with session_context(make_db_session(self.engine)) as session:
+            stem_fanout_transformation(session)
+            session.execute(f"DELETE FROM {OmopStem.__table__}")
+            measurement_transformation(session, fanout=True)
+
+            result = select(self.expected_cols).subquery()
+            result_df = enforce_dtypes(
+                self.expected_df,
+                pd.DataFrame(session.query(result).all())
+            )
+            session.execute(f"DROP TABLE {StemFanout}")
+
+        assert_dataframe_equality(result_df, self.expected_df, index_cols='measurement_id')
+
 __all__ = ['MeasurementTest']
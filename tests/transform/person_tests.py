@@ -5,6 +5,7 @@ import os
 import pandas as pd
 from sqlalchemy import select
 
+from etl.models.omopcdm54 import PersonMap, VisitMap
 from etl.models.omopcdm54.clinical import Person as OmopPerson
 from etl.models.source import Person as SourcePerson
 from etl.transform.person import transform as person_transform
@@ -35,7 +36,7 @@ class PersonTransformationTest(DuckDBBaseTest):
     def tearDown(self) -> None:
         super().tearDown()
         self._drop_tables_and_schemas(self.SOURCE_MODELS)
-        self._drop_tables_and_schemas([self.TARGET_MODEL])
+        self._drop_tables_and_schemas([self.TARGET_MODEL, PersonMap, VisitMap])
 
     def _insert_test_data(self, session):
         write_to_db(session, self.test_data_in, SourcePerson.__tablename__, schema=SourcePerson.metadata.schema)
@@ -54,4 +55,18 @@ class PersonTransformationTest(DuckDBBaseTest):
         result_df = enforce_dtypes(self.expected_df, result_df)
         assert_dataframe_equality(result_df, self.expected_df, index_cols='person_id')
 
+    def test_person_map(self):
+        with session_context(make_db_session(self.engine)) as session:
+            self._insert_test_data(session)
+            os.environ["REGISTRY_START_DATE"] = "1677-01-01"
+            person_transform(session)
+            persons = session.execute(select(OmopPerson.person_source_value, OmopPerson.person_id)).all()
+            mapped = session.execute(select(PersonMap.cpr_enc, PersonMap.person_id)).all()
+
+        self.assertTrue(persons)
+        self.assertEqual(
+            sorted((f"cpr_enc|{cpr_enc}", person_id) for cpr_enc, person_id in mapped),
+            sorted(tuple(row) for row in persons),
+        )
+
 __all__ = ["PersonTransformationTest"]
@@ -1,8 +1,14 @@
 """Stem transformation tests"""
 
+import os
+import tempfile
+from itertools import chain
+from unittest.mock import patch
+
 import pandas as pd
-from sqlalchemy import select
+from sqlalchemy import delete, func, insert, select, update
 
+from etl.models.omopcdm54 import DeltaPerson, PersonMap, VisitMap
 from etl.models.omopcdm54.clinical import (
     Concept as OmopConcept,
     Person as OmopPerson,
@@ -25,8 +31,13 @@ from etl.models.source import (
     Prescriptions as SourcePrescriptions,
 )
 from etl.models.tempmodels import ConceptLookup, ConceptLookupStem
-from etl.transform.stem import transform as stem_transformation
-from etl.util.db import make_db_session, session_context
+from etl.sql.id_maps import refresh_person_map, refresh_visit_map
+from etl.sql.stem.join_keys import get_join_key_index_statements
+from etl.sql.stem.utils import split_batches_by_column_names
+from etl.sql.stem_staging import get_stem_append_insert
+from etl.transform.stem import prepare_join_keys, transform as stem_transformation
+from etl.util.connection import ConnectionDetails
+from etl.util.db import EngineOptions, make_db_session, make_engine, session_context
 from tests.testutils import (
     DuckDBBaseTest,
     assert_dataframe_equality,
@@ -39,7 +50,7 @@ from tests.testutils import (
 class StemTransformationTest(DuckDBBaseTest):
     SOURCE_MODELS = [SourceCourseIdCprMapping, SourceCourseMetadata, SourceObservations, SourceAdministrations, SourcePrescriptions, SourceDiagnosesProcedures]
     REGISTRY_MODELS = [SourceLprDiagnoses, SourceLprProcedures, SourceLprOperations, SourceLabkaBccLaboratory]
-    TARGET_MODEL = [OmopVisitOccurrence, OmopPerson, OmopStem]
+    TARGET_MODEL = [OmopVisitOccurrence, OmopPerson, OmopStem, DeltaPerson]
     VOCAB_MODELS = [OmopConcept, OmopConceptRelationship]
     LOOKUPS = [ConceptLookup, ConceptLookupStem]
 
@@ -70,11 +81,7 @@ class StemTransformationTest(DuckDBBaseTest):
 
     def setUp(self):
         super().setUp()
-        self._create_tables_and_schemas(self.VOCAB_MODELS)
-        self._create_tables_and_schemas(self.LOOKUPS)
-        self._create_tables_and_schemas(self.SOURCE_MODELS)
-        self._create_tables_and_schemas(self.TARGET_MODEL)
-        self._create_tables_and_schemas(self.REGISTRY_MODELS)
+        self._create_tables()
 
         self.concept_lookup = pd.read_csv(self.CONCEPT_LOOKUP_DF, index_col=False, sep=';')
         self.concept_lookup_stem = pd.read_csv(self.CONCEPT_LOOKUP_STEM_DF, index_col=False, sep=';', dtype=str)
@@ -103,10 +110,17 @@ class StemTransformationTest(DuckDBBaseTest):
         super().tearDown()
         self._drop_tables_and_schemas(self.LOOKUPS)
         self._drop_tables_and_schemas(self.SOURCE_MODELS)
-        self._drop_tables_and_schemas(self.TARGET_MODEL)
+        self._drop_tables_and_schemas(self.TARGET_MODEL + [PersonMap, VisitMap])
         self._drop_tables_and_schemas(self.REGISTRY_MODELS)
         self._drop_tables_and_schemas(self.VOCAB_MODELS)
 
+    def _create_tables(self):
+        self._create_tables_and_schemas(self.VOCAB_MODELS)
+        self._create_tables_and_schemas(self.LOOKUPS)
+        self._create_tables_and_schemas(self.SOURCE_MODELS)
+        self._create_tables_and_schemas(self.TARGET_MODEL)
+        self._create_tables_and_schemas(self.REGISTRY_MODELS)
+
     def _insert_test_data(self, engine):
         write_to_db(engine, self.concept_lookup, ConceptLookup.__tablename__, schema=ConceptLookup.metadata.schema)
         write_to_db(engine, self.concept_lookup_stem, ConceptLookupStem.__tablename__, schema=ConceptLookupStem.metadata.schema)
@@ -120,6 +134,8 @@ class StemTransformationTest(DuckDBBaseTest):
         write_to_db(engine, self.source_diagnoses_procedures, SourceDiagnosesProcedures.__tablename__, schema=SourceDiagnosesProcedures.metadata.schema)
         write_to_db(engine, self.omop_person, OmopPerson.__tablename__, schema=OmopPerson.metadata.schema)
         write_to_db(engine, self.omop_visit_occurrence, OmopVisitOccurrence.__tablename__, schema=OmopVisitOccurrence.metadata.schema)
+        refresh_person_map(engine)
+        refresh_visit_map(engine)
         write_to_db(engine, self.source_lpr_diagnoses, SourceLprDiagnoses.__tablename__, schema=SourceLprDiagnoses.metadata.schema)
         write_to_db(engine, self.source_lpr_procedures, SourceLprProcedures.__tablename__, schema=SourceLprProcedures.metadata.schema)
         write_to_db(engine, self.source_lpr_operations, SourceLprOperations.__tablename__, schema=SourceLprOperations.metadata.schema)
@@ -146,5 +162,121 @@ class StemTransformationTest(DuckDBBaseTest):
         drug_expected_df = self.expected_df.query(query_criteria)
         assert_dataframe_equality(drug_result_df, drug_expected_df, index_cols=['stem_id', 'value_source_value'])
 
+    def test_transform_batched(self):
+        with session_context(make_db_session(self.engine)) as session:
+            self._insert_test_data(session)
+
+        for batching in (
+            {"BATCH_SIZE": 5},
+            {"STEM_BATCH_ROWS": 10},
+            {"STEM_WORKERS": 2},
+            {"STEM_WORKERS": 2, "BATCH_SIZE": 5},
+        ):
+            with self.subTest(**batching), patch.multiple("etl.transform.stem", **batching):
+                with session_context(make_db_session(self.engine)) as session:
+                    session.execute(delete(OmopStem))
+
+                    stem_transformation(session)
+                    result = select(self.expected_cols).subquery()
+                    result_df = enforce_dtypes(
+                        self.expected_df,
+                        pd.DataFrame(session.query(result).all())
+                    )
+
+                # the same rows as in a single pass, or through staging tables
+                assert_dataframe_equality(result_df, self.expected_df, index_cols=['stem_id', 'source_concept_id', 'value_source_value'])
+
+    def test_transform_parallel(self):
+        memory_engine = self.engine
+        with tempfile.TemporaryDirectory() as db_dir:
+            # an in memory database runs the inserts one after another
+            self.engine = make_engine(
+                ConnectionDetails(
+                    host="duckdb",
+                    dbms="duckdb",
+                    dbname=os.path.join(db_dir, "stem.duckdb"),
+                ),
+                EngineOptions.for_workers(2),
+            )
+            try:
+                self._create_tables()
+                with session_context(make_db_session(self.engine)) as session:
+                    self._insert_test_data(session)
+
+                with patch("etl.transform.stem.STEM_WORKERS", 2), self.assertNoLogs("ETL.Stem", level="WARNING"), \
+                        patch("etl.transform.stem.get_stem_append_insert", wraps=get_stem_append_insert) as append:
+                    with session_context(make_db_session(self.engine)) as session:
+                        stem_transformation(session)
+                        # the inserts ran concurrently into the staging tables
+                        append.assert_called_once()
+                        result = select(self.expected_cols).subquery()
+                        result_df = enforce_dtypes(
+                            self.expected_df,
+                            pd.DataFrame(session.query(result).all())
+                        )
+            finally:
+                self.engine.dispose()
+                self.engine = memory_engine
+
+        assert_dataframe_equality(result_df, self.expected_df, index_cols=['stem_id', 'source_concept_id', 'value_source_value'])
+
+    def test_transform_incremental(self):
+        with session_context(make_db_session(self.engine)) as session:
+            self._insert_test_data(session)
+            session.execute(
+                insert(DeltaPerson).from_select(
+                    [DeltaPerson.person_source_value],
+                    select(OmopPerson.person_source_value),
+                )
+            )
+
+            stem_transformation(session, incremental=True)
+            result = select(self.expected_cols).subquery()
+            result_df = enforce_dtypes(
+                self.expected_df,
+                pd.DataFrame(session.query(result).all())
+            )
+
+        # all persons are new, so the result is the same as a full run
+        assert_dataframe_equality(result_df, self.expected_df, index_cols=['stem_id', 'source_concept_id', 'value_source_value'])
+
+    def test_join_key_indexes(self):
+        statements = get_join_key_index_statements([SourceObservations])
+        self.assertEqual(
+            statements[0],
+            "CREATE INDEX IF NOT EXISTS ix_observations_variable_key ON source.observations ((lower(variable)));",
+        )
+        # in the schema of the sources of a site
+        self.assertIn(
+            "ON source_site1.observations",
+            get_join_key_index_statements([SourceObservations], "source_site1")[0],
+        )
+        # the source tables are not indexed on DuckDB
+        with session_context(make_db_session(self.engine)) as session:
+            with patch.object(session, "execute") as execute:
+                prepare_join_keys(session)
+        execute.assert_not_called()
+
+    def test_split_batches_by_column_names(self):
+        with session_context(make_db_session(self.engine)) as session:
+            self._insert_test_data(session)
+            uids = session.scalars(
+                select(ConceptLookupStem.uid).where(ConceptLookupStem.datasource == SourceObservations.__tablename__).order_by(ConceptLookupStem.uid)
+            ).all()
+            # a single name for each column, the batches are kept
+            self.assertEqual(split_batches_by_column_names(SourceObservations, session, [uids]), [uids])
+
+            session.execute(
+                update(ConceptLookupStem)
+                .where(ConceptLookupStem.uid == uids[0])
+                .values(start_date="other_timestamp")
+                .execution_options(synchronize_session=False)
+            )
+            batches = split_batches_by_column_names(SourceObservations, session, [uids])
+
+        # the rows naming another start_date column are a batch of their own
+        self.assertIn([uids[0]], batches)
+        self.assertEqual(sorted(chain(*batches)), uids)
+
 
 __all__ = ['StemTransformationTest']
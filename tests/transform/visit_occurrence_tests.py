@@ -3,6 +3,7 @@
 import pandas as pd
 from sqlalchemy import select
 
+from etl.models.omopcdm54 import PersonMap, VisitMap
 from etl.models.omopcdm54.clinical import (
     CareSite as OmopCareSite,
     Person as OmopPerson,
@@ -13,6 +14,7 @@ from etl.models.source import (
     CourseMetadata as SourceCourseMetadata,
 )
 from etl.models.tempmodels import ConceptLookup
+from etl.sql.id_maps import refresh_person_map
 from etl.sql.visit_occurrence import get_visit_occurrence_insert
 from etl.util.db import make_db_session, session_context
 from tests.testutils import (
@@ -56,7 +58,7 @@ class VisitOccurrenceTransformationTest(DuckDBBaseTest):
         super().tearDown()
         self._drop_tables_and_schemas(self.LOOKUPS)
         self._drop_tables_and_schemas(self.SOURCE_MODELS)
-        self._drop_tables_and_schemas(self.TARGET_MODEL)
+        self._drop_tables_and_schemas(self.TARGET_MODEL + [PersonMap, VisitMap])
 
     def _insert_test_data(self, session):
 
@@ -65,6 +67,7 @@ class VisitOccurrenceTransformationTest(DuckDBBaseTest):
         write_to_db(session, self.source_courseid_cpr_mapping, SourceCourseIdCprMapping.__tablename__, schema=SourceCourseIdCprMapping.metadata.schema)
         write_to_db(session, self.source_course_metadata, SourceCourseMetadata.__tablename__, schema=SourceCourseMetadata.metadata.schema)
         write_to_db(session, self.omop_person, OmopPerson.__tablename__, schema=OmopPerson.metadata.schema)
+        refresh_person_map(session)
         write_to_db(session, self.omop_caresite, OmopCareSite.__tablename__, schema=OmopCareSite.metadata.schema)
 
     def test_transform(self):
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import text
+
+from etl.util.async_session import AsyncSession, gather_scalars
+from etl.util.connection import ConnectionDetails
+from etl.util.db import (
+    EngineOptions,
+    FakeSession,
+    make_db_session,
+    make_engine,
+    session_context,
+)
+from tests.testutils import DuckDBBaseTest
+
+
+class AsyncSessionUnitTests(unittest.TestCase):
+    def test_fake_session(self):
+        session = FakeSession()
+        async_session = AsyncSession(session)
+        self.assertFalse(async_session.is_concurrent)
+
+        self.assertEqual(
+            gather_scalars(session, ["SELECT 1;", "SELECT 2;"]), [None, None]
+        )
+        self.assertEqual(session.get_sql_log(), ["SELECT 1;", "SELECT 2;"])
+
+
+class AsyncSessionDuckDBTests(DuckDBBaseTest):
+    def test_in_memory(self):
+        # every thread would get a database of its own
+        with session_context(make_db_session(self.engine)) as session:
+            self.assertFalse(AsyncSession(session).is_concurrent)
+            self.assertEqual(
+                gather_scalars(session, [text("SELECT 1"), text("SELECT 2")]),
+                [1, 2],
+            )
+
+    def test_concurrent(self):
+        with tempfile.TemporaryDirectory() as db_dir:
+            engine = make_engine(
+                ConnectionDetails(
+                    host="duckdb",
+                    dbms="duckdb",
+                    dbname=os.path.join(db_dir, "async.duckdb"),
+                ),
+                EngineOptions.for_workers(2),
+            )
+            with session_context(make_db_session(engine)) as session:
+                session.execute("CREATE TABLE numbers (n INTEGER);")
+                session.commit()
+
+                async def _run():
+                    async with AsyncSession(session, 2) as async_session:
+                        self.assertTrue(async_session.is_concurrent)
+                        inserted = await asyncio.gather(
+                            *(
+                                async_session.execute(
+                                    text("INSERT INTO numbers VALUES (:n)"),
+                                    {"n": n},
+                                )
+                                for n in range(4)
+                            )
+                        )
+                        self.assertEqual([r.inserted for r in inserted], [1] * 4)
+                        return await asyncio.gather(
+                            async_session.scalar(
+                                text("SELECT sum(n) FROM numbers")
+                            ),
+                            async_session.all(
+                                text("SELECT n FROM numbers ORDER BY n")
+                            ),
+                        )
+
+                total, rows = asyncio.run(_run())
+                self.assertEqual(total, 6)
+                self.assertEqual([row.n for row in rows], [0, 1, 2, 3])
+
+                # the inserts were committed on sessions of their own
+                self.assertEqual(
+                    session.execute("SELECT count(*) FROM numbers").scalar(), 4
+                )
+            engine.dispose()
+
+
+__all__ = ["AsyncSessionUnitTests", "AsyncSessionDuckDBTests"]
@@ -1,10 +1,15 @@
 import json
 import math
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
 from typing import Any, Final
 
 import pandas as pd
+from sqlalchemy import event
 from sqlalchemy.orm import Session
-from sqlalchemy.sql import select
+from sqlalchemy.sql import delete, insert, select
 
 from etl.models.modelutils import (
     CharField,
@@ -13,15 +18,99 @@ from etl.models.modelutils import (
     PKIntField,
     make_model_base,
 )
+from etl.util.connection import ConnectionDetails
 from etl.util.db import (
     DataBaseWriterBuilder,
+    EngineOptions,
+    FakeSession,
+    FrameDataBaseWriter,
     WriteMode,
+    is_db_connected,
     make_db_session,
+    make_engine,
     session_context,
 )
+from etl.util.exceptions import DBConnectionException
 from tests.testutils import DuckDBBaseTest
 
 
+class FakeCopySession(FakeSession):
+    """A fake Postgres session recording the data streamed with COPY"""
+
+    def __init__(self):
+        super().__init__()
+        self.copies = []
+        session = self
+
+        class _Cursor:
+            def copy_expert(self, sql, buffer):
+                session.copies.append((sql, buffer.read()))
+
+            def close(self):
+                pass
+
+        self._dbapi_connection = SimpleNamespace(cursor=_Cursor)
+
+    def connection(self):
+        return SimpleNamespace(
+            dialect=SimpleNamespace(name="postgresql"),
+            connection=self._dbapi_connection,
+        )
+
+
+class FakeSessionUnitTests(unittest.TestCase):
+    def test_fake_session_stream(self):
+        session = FakeSession()
+        session.stream_rows = [(1,), (2,), (3,)]
+        chunks = list(session.stream("SELECT a FROM dummy", chunk_size=2))
+        self.assertEqual(chunks, [[(1,), (2,)], [(3,)]])
+        self.assertEqual(session.get_sql_log(), ["SELECT a FROM dummy"])
+
+
+class DataBaseWriterUnitTests(unittest.TestCase):
+    TestModelBase: Final[Any] = make_model_base(schema="dummy")
+
+    class DummyTable(TestModelBase):
+        __tablename__: Final = "dummy_table"
+        __table_args__: Final = {"schema": "dummy"}
+
+        a: Final = PKIntField("dummy_dummy_table_id_seq")
+        b: Final = CharField(10)
+        json_field: Final = JSONField()
+
+    def test_postgres_copy(self):
+        df = pd.DataFrame(
+            {
+                "a": [1, 2, 3],
+                "b": ["x;y", None, "z"],
+                "json_field": [{"a": 1}, None, {"c": "d"}],
+            }
+        )
+        session = FakeCopySession()
+        writer = (
+            DataBaseWriterBuilder(FrameDataBaseWriter)
+            .set_chunk_size(2)
+            .build()
+            .set_source(self.DummyTable, df)
+        )
+        writer.write(session)
+
+        self.assertEqual(session.get_sql_log(), ["DELETE FROM dummy.dummy_table;"])
+        self.assertEqual(len(session.copies), 2)
+        sql = session.copies[0][0]
+        self.assertEqual(
+            sql,
+            "COPY dummy.dummy_table (a, b, json_field) FROM STDIN WITH "
+            "(FORMAT CSV, DELIMITER E';', HEADER FALSE, QUOTE E'\"')",
+        )
+        self.assertEqual(
+            "".join(data for _, data in session.copies),
+            '1;"x;y";"{""a"":1}"\n2;;\n3;z;"{""c"":""d""}"\n',
+        )
+        # the source is not changed
+        self.assertEqual(df["json_field"][0], {"a": 1})
+
+
 class DBDuckDBTests(DuckDBBaseTest):
     TestModelBase: Final[Any] = make_model_base(schema="dummy")
 
@@ -255,5 +344,164 @@ class DBDuckDBTests(DuckDBBaseTest):
             self._assert_col_null(session, "camelCase")
             self._assert_json_col(session, "json_field")
 
+    def test_database_writer_in_chunks(self):
+        source = self.dummy_df.copy()
+        writer = (
+            DataBaseWriterBuilder()
+            .set_chunk_size(2)
+            .build()
+            .set_source(self.DummyTable, source)
+        )
+        with session_context(self._session) as session:
+            writer.write(session, columns=["a", "b", "json_field"])
+            count = session.query(self.DummyTable).count()
+            self.assertEqual(3, count, "assert dummy table")
+            self._assert_col(session, "a")
+            self._assert_col(session, "b")
+            self._assert_json_col(session, "json_field")
+        # the source is not changed
+        pd.testing.assert_frame_equal(source, self.dummy_df)
+
+
+    def test_frame_writer_all_columns(self):
+        writer = (
+            DataBaseWriterBuilder(FrameDataBaseWriter)
+            .build()
+            .set_source(self.DummyTable, self.dummy_df)
+        )
+        with session_context(self._session) as session:
+            writer.write(session)
+            writer.write(session)
+            count = session.query(self.DummyTable).count()
+            self.assertEqual(3, count, "assert dummy table")
+            self._assert_col(session, "a")
+            self._assert_col(session, "b")
+            self._assert_col(session, "camelCase")
+            self._assert_json_col(session, "json_field")
+        # the source is not changed
+        self.assertEqual(self.dummy_df["json_field"][0], {"a": 1, "b": 2})
+
+    def test_frame_writer_not_all_columns_append(self):
+        writer = (
+            DataBaseWriterBuilder(FrameDataBaseWriter)
+            .set_write_mode(WriteMode.APPEND)
+            .build()
+            .set_source(self.DummyTable, self.dummy_df)
+        )
+        with session_context(self._session) as session:
+            writer.write(session, columns=["b"])
+            writer.write(session, columns=["b", "camelCase"])
+            count = session.query(self.DummyTable).count()
+            self.assertEqual(6, count, "assert dummy table")
+            self.assertEqual(
+                session.scalars(select(self.DummyTable.a)).all(),
+                [1, 2, 3, 4, 5, 6],
+            )
+
+    def test_execute_result_rowcount(self):
+        with session_context(self._session) as session:
+            result = session.execute(
+                "INSERT INTO dummy.dummy_table (a, b) VALUES (1, 'x'), (2, 'y')"
+            )
+            self.assertEqual(result.inserted, 2)
+            self.assertEqual(result.deleted, 0)
+
+            result = session.execute(
+                insert(self.DummyTable).from_select(
+                    [self.DummyTable.a, self.DummyTable.b],
+                    select(self.DummyTable.a + 2, self.DummyTable.b),
+                )
+            )
+            self.assertEqual(result.inserted, 2)
+
+            result = session.execute(
+                delete(self.DummyTable).where(self.DummyTable.a > 1)
+            )
+            self.assertEqual(result.deleted, 3)
+            self.assertEqual(result.inserted, 0)
+
+            result = session.execute(select(self.DummyTable.a))
+            self.assertEqual(result.inserted, 0)
+            self.assertEqual(result.scalars().all(), [1])
+
+    def test_stream(self):
+        with session_context(self._session) as session:
+            session.execute(
+                "INSERT INTO dummy.dummy_table (a, b) "
+                "SELECT range, 'x' FROM range(1, 8)"
+            )
+            chunks = list(
+                session.stream(
+                    select(self.DummyTable.a).order_by(self.DummyTable.a),
+                    chunk_size=3,
+                )
+            )
+        self.assertEqual(
+            [[a for a, in chunk] for chunk in chunks],
+            [[1, 2, 3], [4, 5, 6], [7]],
+        )
+
+    def test_make_engine(self):
+        options = EngineOptions.for_workers(
+            4, memory_limit="1gb", threads=2, preserve_insertion_order=False
+        )
+        self.assertEqual(options.pool_size, 6)
+        self.assertEqual(
+            options.duckdb_config(),
+            {
+                "memory_limit": "1gb",
+                "threads": 2,
+                "preserve_insertion_order": False,
+            },
+        )
+
+        with tempfile.TemporaryDirectory() as db_dir:
+            engine = make_engine(
+                ConnectionDetails(
+                    host="duckdb",
+                    dbms="duckdb",
+                    dbname=os.path.join(db_dir, "engine.duckdb"),
+                ),
+                options,
+            )
+            self.assertEqual(engine.pool.size(), 6)
+            self.assertTrue(is_db_connected(engine))
+            # checking the connection does not keep it checked out
+            self.assertEqual(engine.pool.checkedout(), 0)
+            with session_context(make_db_session(engine)) as session:
+                self.assertEqual(
+                    session.execute(
+                        "SELECT current_setting('threads')"
+                    ).scalar(),
+                    2,
+                )
+            engine.dispose()
+
+        with self.assertRaises(DBConnectionException):
+            make_engine(ConnectionDetails(host="x", dbms="oracle"), options)
+
+    def test_duckdb_file_connections(self):
+        options = EngineOptions.for_workers(2, threads=2)
+        with tempfile.TemporaryDirectory() as db_dir:
+            engine = make_engine(
+                ConnectionDetails(
+                    host="duckdb",
+                    dbms="duckdb",
+                    dbname=os.path.join(db_dir, "connections.duckdb"),
+                ),
+                options,
+            )
+            configs = []
+            event.listen(engine, "do_connect", lambda dialect, rec, cargs, cparams: configs.append(cparams["config"]))
+
+            # two connections open at once to the same file
+            with engine.connect() as first, engine.connect() as second:
+                self.assertEqual(first.exec_driver_sql("SELECT 1").scalar(), 1)
+                self.assertEqual(second.exec_driver_sql("SELECT 2").scalar(), 2)
+
+            self.assertEqual(len(configs), 2)
+            self.assertIsNot(configs[0], configs[1])
+            engine.dispose()
+
 
 __all__ = ["DBDuckDBTests"]
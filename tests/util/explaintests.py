@@ -0,0 +1,102 @@
+import csv
+import tempfile
+from pathlib import Path
+
+from sqlalchemy import Integer, bindparam, column, func, select, table, text
+
+from etl.models.omopcdm54 import CDMSummary
+from etl.process import run_transformations
+from etl.transform.session_operation import SessionOperation
+from etl.util.db import make_db_session, session_context
+from etl.util.explain import SUMMARY_FILE, PlanCapture
+from tests.testutils import DuckDBBaseTest
+
+
+class ExplainDuckDBTests(DuckDBBaseTest):
+
+    def setUp(self):
+        super().setUp()
+        self._create_tables_and_schemas(models=[CDMSummary])
+        with session_context(make_db_session(self.engine)) as session:
+            session.execute("CREATE SCHEMA IF NOT EXISTS explain_test;")
+            session.execute(
+                "CREATE OR REPLACE TABLE explain_test.numbers (n INTEGER);"
+            )
+
+    def tearDown(self):
+        with session_context(make_db_session(self.engine)) as session:
+            session.execute("DROP SCHEMA IF EXISTS explain_test CASCADE;")
+        self._drop_tables_and_schemas(models=[CDMSummary])
+        super().tearDown()
+
+    def _run(self, analyze: bool, report_dir: str) -> int:
+        def _transform(session):
+            result = session.execute(
+                text(
+                    "INSERT INTO explain_test.numbers "
+                    "SELECT * FROM range(10) WHERE range > 2"
+                )
+            )
+            # a statement with parameters, which DuckDB cannot explain as is
+            numbers = table(
+                "numbers", column("n", Integer), schema="explain_test"
+            )
+            session.execute(
+                select(func.count()).select_from(numbers).where(numbers.c.n > 5)
+            )
+            # with the values of its parameters given when executing
+            session.execute(
+                select(func.count())
+                .select_from(numbers)
+                .where(numbers.c.n.in_(bindparam("ns", expanding=True))),
+                {"ns": [3, 4]},
+            )
+            return result.inserted
+
+        session = make_db_session(self.engine)
+        operation = SessionOperation(
+            key="explain_test.numbers", session=session, func=_transform
+        )
+        run_transformations(
+            session,
+            [(1, operation)],
+            plan_capture=PlanCapture(analyze=analyze, report_dir=report_dir),
+        )
+        session.close()
+        with session_context(make_db_session(self.engine)) as session:
+            return session.execute(
+                text("SELECT COUNT(*) FROM explain_test.numbers")
+            ).scalar()
+
+    def _summary(self, report_dir: str):
+        with open(Path(report_dir) / SUMMARY_FILE, newline="") as summary:
+            return list(csv.DictReader(summary))
+
+    def test_explain(self):
+        with tempfile.TemporaryDirectory() as report_dir:
+            self.assertEqual(self._run(False, report_dir), 7)
+            rows = self._summary(report_dir)
+            # the insert and select, then the write to the summary table
+            self.assertGreaterEqual(len(rows), 2)
+            self.assertEqual(rows[0]["transformation"], "explain_test.numbers")
+            self.assertEqual(rows[0]["rowcount"], "7")
+            plan = (Path(report_dir) / rows[0]["plan_file"]).read_text()
+            self.assertIn("INSERT", plan)
+            plan = (Path(report_dir) / rows[1]["plan_file"]).read_text()
+            self.assertIn("n>5", plan)
+            plan = (Path(report_dir) / rows[2]["plan_file"]).read_text()
+            self.assertIn("n<=4", plan)
+
+    def test_analyze(self):
+        with tempfile.TemporaryDirectory() as report_dir:
+            # the insert runs once, as EXPLAIN ANALYZE
+            self.assertEqual(self._run(True, report_dir), 7)
+            rows = self._summary(report_dir)
+            # the insert and select, then the write to the summary table
+            self.assertGreaterEqual(len(rows), 2)
+            self.assertEqual(rows[0]["rowcount"], "-1")
+            plan = (Path(report_dir) / rows[0]["plan_file"]).read_text()
+            self.assertIn("Total Time", plan)
+
+
+__all__ = ["ExplainDuckDBTests"]
@@ -0,0 +1,114 @@
+import unittest
+from datetime import date
+
+import pandas as pd
+from sqlalchemy import select
+
+from etl.models.omopcdm54 import Concept, LookupValidation
+from etl.models.tempmodels import ConceptLookup, ConceptLookupStem
+from etl.util.db import FakeSession, make_db_session, session_context
+from etl.util.preprocessing import (
+    invalid_era_lookback_intervals,
+    validate_lookup_tables,
+)
+from tests.testutils import DuckDBBaseTest, write_to_db
+
+
+class PreprocessingUnitTests(unittest.TestCase):
+    def test_invalid_era_lookback_intervals(self):
+        self.assertEqual(
+            invalid_era_lookback_intervals(["30 days", None, "month", "30 days"]),
+            ["month"],
+        )
+
+    def test_statements_per_lookup_table(self):
+        session = FakeSession()
+        report = validate_lookup_tables(session)
+        self.assertTrue(report.empty)
+        # create, clear the report, then a report and an update per rule
+        self.assertEqual(len(session.get_sql_log()), 2 + 2 * 4)
+
+
+class PreprocessingDuckDBTests(DuckDBBaseTest):
+    MODELS = [Concept, ConceptLookup, ConceptLookupStem]
+
+    def setUp(self):
+        super().setUp()
+        self._create_tables_and_schemas(models=self.MODELS)
+        concept = pd.DataFrame(
+            {
+                "concept_id": [1, 2, 3],
+                "concept_name": ["a", "b", "c"],
+                "domain_id": ["Drug", "Measurement", "Drug"],
+                "vocabulary_id": ["V", "V", "V"],
+                "concept_class_id": ["C", "C", "C"],
+                "standard_concept": ["S", "S", None],
+                "concept_code": ["1", "2", "3"],
+                "valid_start_date": [date(2000, 1, 1)] * 3,
+                "valid_end_date": [date(2099, 12, 31)] * 3,
+            }
+        )
+        concept_lookup = pd.DataFrame(
+            {"lookup_id": [1, 2, 3], "concept_string": ["x", "y", "z"], "concept_id": [1, 3, None]}
+        )
+        concept_lookup_stem = pd.DataFrame(
+            {
+                "uid": [1, 2, 3],
+                "mapped_standard_code": [1, 2, 4],
+                "std_code_domain": ["Drug", "Drug", "Drug"],
+                "timezone": ["Europe/Copenhagen", "Mars/Olympus", None],
+                "era_lookback_interval": ["30 days", "month", None],
+            }
+        )
+        with session_context(make_db_session(self.engine)) as session:
+            write_to_db(session, concept, Concept.__tablename__, schema=Concept.metadata.schema)
+            write_to_db(session, concept_lookup, ConceptLookup.__tablename__, schema=ConceptLookup.metadata.schema)
+            write_to_db(
+                session, concept_lookup_stem, ConceptLookupStem.__tablename__, schema=ConceptLookupStem.metadata.schema
+            )
+
+    def tearDown(self):
+        self._drop_tables_and_schemas(models=[LookupValidation])
+        self._drop_tables_and_schemas(models=self.MODELS)
+        super().tearDown()
+
+    def test_validate_lookup_tables(self):
+        with session_context(make_db_session(self.engine)) as session:
+            report = validate_lookup_tables(session)
+            concept_ids = session.execute(
+                select(ConceptLookup.concept_id).order_by(ConceptLookup.lookup_id)
+            ).scalars().all()
+            stem = session.execute(
+                select(
+                    ConceptLookupStem.mapped_standard_code,
+                    ConceptLookupStem.std_code_domain,
+                    ConceptLookupStem.timezone,
+                    ConceptLookupStem.era_lookback_interval,
+                ).order_by(ConceptLookupStem.uid)
+            ).all()
+            reported = session.execute(select(LookupValidation.lookup_id)).all()
+
+        self.assertEqual(concept_ids, [1, 0, 0])
+        self.assertEqual(
+            [tuple(row) for row in stem],
+            [
+                (1, "Drug", "Europe/Copenhagen", "30 days"),
+                (2, "Measurement", None, None),
+                (0, "Drug", None, None),
+            ],
+        )
+        self.assertEqual(
+            [tuple(row) for row in report.itertuples(index=False)],
+            [
+                ("concept_lookup", "concept_id", 2, "3", "0", "not a standard concept"),
+                ("concept_lookup", "concept_id", 3, None, "0", "not a standard concept"),
+                ("concept_lookup_stem", "era_lookback_interval", 2, "month", None, "not an interval"),
+                ("concept_lookup_stem", "mapped_standard_code", 3, "4", "0", "not a standard concept"),
+                ("concept_lookup_stem", "std_code_domain", 2, "Drug", "Measurement", "not the domain of the concept"),
+                ("concept_lookup_stem", "timezone", 2, "Mars/Olympus", None, "not a time zone"),
+            ],
+        )
+        self.assertEqual(len(reported), len(report))
+
+
+__all__ = ["PreprocessingUnitTests", "PreprocessingDuckDBTests"]
@@ -1,6 +1,6 @@
 import unittest
 
-from etl.util.sql import clean_sql
+from etl.util.sql import cached_statement, clean_sql
 
 
 class CleanSqlUnitTests(unittest.TestCase):
@@ -103,4 +103,23 @@ class CleanSqlUnitTests(unittest.TestCase):
         )
 
 
-__all__ = ["CleanSqlUnitTests"]
+class CachedStatementUnitTests(unittest.TestCase):
+    def test_built_once_per_arguments(self):
+        calls = []
+
+        @cached_statement
+        def _dummy(a: str, b: int = 0) -> str:
+            calls.append((a, b))
+            return f"SELECT {b} FROM {a};"
+
+        self.assertEqual(_dummy("mytable"), "SELECT 0 FROM mytable;")
+        self.assertEqual(_dummy("mytable"), "SELECT 0 FROM mytable;")
+        self.assertEqual(_dummy("mytable", b=1), "SELECT 1 FROM mytable;")
+        self.assertEqual(calls, [("mytable", 0), ("mytable", 1)])
+
+        _dummy.cache_clear()
+        _dummy("mytable")
+        self.assertEqual(len(calls), 3)
+
+
+__all__ = ["CleanSqlUnitTests", "CachedStatementUnitTests"]